@@ -0,0 +1,153 @@
+from config import settings
+from metrics import ADMISSION_QUEUE_WAIT, ADMISSION_REJECTED, ADMISSION_IN_FLIGHT
+import asyncio
+import json
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+API_PREFIX = "/api/v1"
+
+# First match wins: (path prefix under /api/v1, route class)
+ROUTE_CLASS_RULES = [
+    ("/login", "auth"),
+    ("/register", "auth"),
+    ("/admin/sop/report", "export"),
+    ("/admin/users/import", "export"),
+    ("/admin/users/export", "export"),
+    ("/admin/sop/stream", "stream"),
+    ("/admin/sop/", "analytics"),
+]
+
+def route_class(path: str):
+    """Route class for a request path; None for paths outside the API"""
+    if not path.startswith(API_PREFIX):
+        return None
+    path = path[len(API_PREFIX):]
+    for prefix, name in ROUTE_CLASS_RULES:
+        if path.startswith(prefix):
+            return name
+    return "interactive"
+
+class ClassLimiter:
+    """Concurrency slots plus a bounded FIFO wait queue for one route class"""
+
+    def __init__(self, name: str, concurrency: int, queue_size: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    async def acquire(self, timeout: float) -> bool:
+        """Take a slot, waiting in the queue up to timeout; False to shed"""
+        if self._semaphore.locked() and self.waiting >= self.queue_size:
+            self._reject("queue_full")
+            return False
+        started = time.perf_counter()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=timeout)
+        except asyncio.TimeoutError:
+            self._reject("queue_timeout")
+            return False
+        finally:
+            self.waiting -= 1
+            ADMISSION_QUEUE_WAIT.labels(self.name).observe(time.perf_counter() - started)
+        self.active += 1
+        self.admitted += 1
+        ADMISSION_IN_FLIGHT.labels(self.name).inc()
+        return True
+
+    def release(self):
+        self.active -= 1
+        ADMISSION_IN_FLIGHT.labels(self.name).dec()
+        self._semaphore.release()
+
+    def _reject(self, reason: str):
+        self.rejected += 1
+        ADMISSION_REJECTED.labels(self.name, reason).inc()
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "queue_size": self.queue_size,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+def class_limiters() -> dict:
+    """One limiter per route class, sized from settings"""
+    return {
+        name: ClassLimiter(name, max(1, concurrency), max(0, queue_size))
+        for name, concurrency, queue_size in [
+            ("auth", settings.ADMISSION_AUTH_CONCURRENCY, settings.ADMISSION_AUTH_QUEUE),
+            ("interactive", settings.ADMISSION_INTERACTIVE_CONCURRENCY, settings.ADMISSION_INTERACTIVE_QUEUE),
+            ("analytics", settings.ADMISSION_ANALYTICS_CONCURRENCY, settings.ADMISSION_ANALYTICS_QUEUE),
+            ("export", settings.ADMISSION_EXPORT_CONCURRENCY, settings.ADMISSION_EXPORT_QUEUE),
+            # Streams never finish on their own, so there is nothing to queue for
+            ("stream", settings.ADMISSION_STREAM_CONCURRENCY, 0),
+        ]
+    }
+
+class AdmissionMiddleware:
+    """ASGI middleware that sheds load per route class with 503 + Retry-After
+
+    Each class gets its own slots and wait queue, so a few long analytics
+    queries or report downloads cannot take the capacity interactive
+    requests (ticking /sop/activity) need. A slot is held until the
+    response, including a streamed body, has been sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.limiters = class_limiters()
+
+    def stats(self) -> dict:
+        return {name: limiter.stats() for name, limiter in self.limiters.items()}
+
+    async def _shed(self, send):
+        body = json.dumps({"detail": "Server busy, please retry"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(settings.ADMISSION_RETRY_AFTER).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.ADMISSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        name = route_class(scope["path"])
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.limiters[name]
+        if not await limiter.acquire(settings.ADMISSION_QUEUE_TIMEOUT_MS / 1000):
+            await self._shed(send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
+
+def admission_stats(app) -> dict:
+    """Per-class counters of the app's AdmissionMiddleware, if installed"""
+    stack = getattr(app, "middleware_stack", None)
+    while stack is not None:
+        if isinstance(stack, AdmissionMiddleware):
+            return stack.stats()
+        stack = getattr(stack, "app", None)
+    return {}
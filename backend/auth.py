@@ -7,6 +7,9 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from config import settings
 from models import TokenData, User
 from database import get_user_collection
+from hashing import hashing_pool
+from cache import user_cache
+from metrics import PASSWORD_HASH_DURATION, time_histogram
 import logging
 
 logger = logging.getLogger(__name__)
@@ -25,6 +28,21 @@ def get_password_hash(password: str) -> str:
     """Hash a password"""
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password in the hashing pool"""
+    with time_histogram(PASSWORD_HASH_DURATION, "verify"):
+        return await hashing_pool.run(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password in the hashing pool"""
+    with time_histogram(PASSWORD_HASH_DURATION, "hash"):
+        return await hashing_pool.run(get_password_hash, password)
+
+async def get_password_hashes_async(passwords: list) -> list:
+    """Hash many passwords across the hashing pool (bulk import)"""
+    with time_histogram(PASSWORD_HASH_DURATION, "bulk_hash"):
+        return await hashing_pool.map(get_password_hash, passwords)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
     to_encode = data.copy()
@@ -37,7 +55,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Verify JWT token"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -55,11 +73,17 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
         logger.error("JWT token verification failed")
         raise credentials_exception
     
+    await user_cache.check_version()
+    user = user_cache.get(token_data.username)
+    if user is not None:
+        return user
+    
     user_collection = get_user_collection()
-    user = user_collection.find_one({"username": token_data.username})
+    user = await user_collection.find_one({"username": token_data.username})
     if user is None:
         raise credentials_exception
     
+    user_cache.set(user)
     return user
 
 def get_current_user(current_user: dict = Depends(verify_token)):
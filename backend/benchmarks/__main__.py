@@ -0,0 +1,89 @@
+"""Run the API benchmark suite and print JSON results.
+
+From the backend directory, against a local mongod (MONGO_* settings):
+
+    python -m benchmarks --activities 10000,100000,1000000 --output bench.json
+
+or without a database server, using mongomock-motor:
+
+    python -m benchmarks --backend memory --activities 10000
+
+Compare two JSON files from the same machine to judge a change.
+"""
+import argparse
+import asyncio
+import json
+import logging
+
+from benchmarks.harness import (
+    environment, fast_password_hash, login, running_app, seed_activities, seed_users
+)
+from benchmarks.scenarios import SCENARIOS
+
+# Order matters: read-only scenarios run before the ones that write
+DEFAULT_SCENARIOS = ["login_burst", "login_flood", "admin_summary", "admin_report", "tick_storm", "mixed"]
+
+async def run_scale(args, activities):
+    async with running_app(args.db, backend=args.backend) as (app, client):
+        from database import get_db
+        db = get_db()
+        users = await seed_users(db, args.users, fast_password_hash(args.bcrypt_rounds), seed=args.seed)
+        await seed_activities(db, users, activities, days=args.days, seed=args.seed)
+        if args.backend == "mongod":
+            from services.rollups import rebuild_rollups
+            await rebuild_rollups(db)
+
+        ctx = {"app": app, "client": client, "db": db, "users": users, "admin": await login(client, "sysadmin", "admin123")}
+        results = {}
+        for name in args.scenarios:
+            logging.info(f"[{activities} activities] running {name}")
+            results[name] = await SCENARIOS[name](ctx, args)
+        return results
+
+async def run(args):
+    report = {"environment": environment(), "backend": args.backend, "users": args.users, "scales": {}}
+    for activities in args.activities:
+        report["scales"][str(activities)] = await run_scale(args, activities)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=["mongod", "memory"], default="mongod")
+    parser.add_argument("--db", default="sop_bench")
+    parser.add_argument("--activities", default="10000,100000,1000000",
+                        type=lambda value: [int(v) for v in value.split(",")])
+    parser.add_argument("--scenarios", default=",".join(DEFAULT_SCENARIOS),
+                        type=lambda value: [v for v in value.split(",") if v])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--flood-logins", type=int, default=20, help="legitimate logins per login_flood phase")
+    parser.add_argument("--flood-concurrency", type=int, default=8, help="concurrent attackers in login_flood")
+    parser.add_argument("--flood-rate", type=float, default=200, help="login_flood attack requests per second")
+    parser.add_argument("--operators", type=int, default=50)
+    parser.add_argument("--ticks", type=int, default=5000)
+    parser.add_argument("--admins", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--formats", default="csv,ndjson,parquet",
+                        type=lambda value: [v for v in value.split(",") if v])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    logging.basicConfig(level=logging.WARNING)
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
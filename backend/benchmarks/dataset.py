@@ -0,0 +1,268 @@
+"""Generate a large synthetic users + sop_activities dataset.
+
+From the backend directory, against the configured MongoDB:
+
+    python -m benchmarks.dataset --users 200000 --activities 10000000 --workers 8 --drop
+
+Output is reproducible for a given --seed and --now regardless of
+--workers: users are generated in fixed chunks of USERS_PER_CHUNK, every
+chunk draws from its own RNG seeded by (seed, chunk index), and document
+_ids and timestamps come from that RNG and --now. --now defaults to a fixed
+date (DEFAULT_NOW); pass --now today for data whose recent days line up
+with the admin endpoints' "last N days" windows.
+
+sop_activities keeps one row per (user_id, sop_type, task_id), so the key
+space is users x 9 gift_sop tasks x SOP types. Extra checklists named
+gift_sop_2, gift_sop_3, ... are added automatically when --activities needs
+them (or set --sop-types).
+"""
+import argparse
+import asyncio
+import logging
+import math
+import os
+import random
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+
+logger = logging.getLogger(__name__)
+
+# Tasks from frontend/gift_sop.html: (task_id, description, IST minute of day
+# the check is normally done, probability an operator ticks it)
+TASK_CATALOG = [
+    ("daily_run_315", "DAG: gift_daily_data_appends ran at 3:15 am on 192.168.0.121:8083", 6 * 60, 0.95),
+    ("daily_run_515", "DAG: gift_daily_data_appends ran at 5:15 am", 6 * 60, 0.95),
+    ("gift_init_alert", "GIFT Production Module initialized alert received on Google Space", 6 * 60, 0.90),
+    ("no_strategy_removal", "No unexpected strategy removal logs present on Google Space", 6 * 60 + 5, 0.85),
+    ("startdatasnap_nodes", "3 nodes of startDatasnap DAG running (Airflow: 192.168.30.15:18080)", 6 * 60 + 30, 0.90),
+    ("start_scripts_nodes", "2 nodes of start_scripts DAG running", 6 * 60 + 30, 0.90),
+    ("trader_login_630", "Alert: TraderID 398 logged in on 192.168.30.15 received on Teams", 6 * 60 + 35, 0.85),
+    ("grafana_check", "Check Grafana: Time difference from current should be ~3hrs", 6 * 60 + 40, 0.80),
+    ("trader_login_430", "Alert: TraderID 398 logged in on 192.168.30.15 received on Teams", 16 * 60 + 30, 0.60),
+]
+
+IST_OFFSET = timedelta(hours=5, minutes=30)
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 14_2) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2 Safari/605.1.15",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:121.0) Gecko/20100101 Firefox/121.0",
+]
+FIRST_NAMES = ["Aarav", "Diya", "Ishaan", "Kavya", "Rohan", "Ananya", "Vikram", "Meera", "Arjun", "Priya"]
+LAST_NAMES = ["Sharma", "Iyer", "Patel", "Reddy", "Nair", "Gupta", "Singh", "Das", "Rao", "Mehta"]
+
+# Unit of parallel work; fixed so output does not depend on --workers
+USERS_PER_CHUNK = 1000
+
+# Reference "now" for timestamps and ObjectIds unless --now says otherwise
+DEFAULT_NOW = datetime(2026, 1, 1)
+
+def sop_type_names(count: int) -> list:
+    return ["gift_sop"] + [f"gift_sop_{index}" for index in range(2, count + 1)]
+
+def sop_types_needed(users: int, activities: int) -> int:
+    """Smallest number of SOP types whose key space fits the activities"""
+    return max(1, math.ceil(activities / max(1, users * len(TASK_CATALOG))))
+
+def object_id(rng, timestamp: int) -> ObjectId:
+    """Deterministic ObjectId: real timestamp prefix, RNG-derived tail"""
+    return ObjectId(struct.pack(">I", timestamp) + rng.randbytes(8))
+
+def activities_for_user(index: int, users: int, activities: int) -> int:
+    base, remainder = divmod(activities, users)
+    return base + (1 if index < remainder else 0)
+
+def generate_users(rng, start: int, count: int, password_hash: str, now: datetime,
+                   inactive_ratio: float = 0.03) -> list:
+    timestamp = int((now - timedelta(days=365)).timestamp())
+    users = []
+    for index in range(start, start + count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        users.append({
+            "_id": object_id(rng, timestamp + index),
+            "username": f"user_{index:07d}",
+            "name": f"{first} {last}",
+            "email": f"user_{index:07d}@example.com",
+            "password": password_hash,
+            "role": "user",
+            "is_active": rng.random() >= inactive_ratio,
+        })
+    return users
+
+def completion_time(rng, days_ago: int, minute_of_day: int, now: datetime) -> datetime:
+    """Scheduled IST check time plus a log-normal delay, as naive UTC"""
+    today_ist = (now + IST_OFFSET).replace(hour=0, minute=0, second=0, microsecond=0)
+    delay_minutes = min(rng.lognormvariate(2.0, 0.9), 12 * 60)
+    moment = today_ist - timedelta(days=days_ago) + timedelta(minutes=minute_of_day + delay_minutes)
+    moment -= IST_OFFSET
+    return min(moment, now)
+
+def last_active_days_ago(rng, days: int, now: datetime) -> int:
+    """Most operators were active in the last couple of days; a tail churned"""
+    while True:
+        offset = int(rng.expovariate(1 / 2.0)) if rng.random() < 0.85 else rng.randrange(days)
+        offset = min(offset, days - 1)
+        # Weekday checks dominate; keep only ~20% of weekend days
+        weekday = ((now + IST_OFFSET) - timedelta(days=offset)).weekday()
+        if weekday < 5 or rng.random() < 0.2:
+            return offset
+
+def generate_activities(rng, users: list, counts: list, sop_types: list, days: int, now: datetime):
+    """Yield activity documents following the SOPActivity model"""
+    keys = [(sop_type, task) for sop_type in sop_types for task in TASK_CATALOG]
+    # gift_sop is the main checklist; extra checklists are ticked less often
+    key_weights = [task[3] * (1.0 if sop_type == "gift_sop" else 0.5) for sop_type, task in keys]
+    timestamp = int((now - timedelta(days=days)).timestamp())
+
+    for user, count in zip(users, counts):
+        if count <= 0:
+            continue
+        if count > len(keys):
+            raise ValueError(f"{count} activities for one user exceeds {len(keys)} (sop_type, task_id) keys")
+        # Weighted sampling without replacement (Efraimidis-Spirakis)
+        chosen = sorted(
+            range(len(keys)),
+            key=lambda i: rng.random() ** (1.0 / key_weights[i]),
+            reverse=True
+        )[:count]
+        last_active = last_active_days_ago(rng, days, now)
+        ip_address = f"192.168.{rng.randrange(1, 255)}.{rng.randrange(1, 255)}"
+        user_agent = rng.choice(USER_AGENTS)
+        session_id = rng.randbytes(8).hex()
+        for key_index in chosen:
+            sop_type, (task_id, description, minute_of_day, _) = keys[key_index]
+            days_ago = min(days - 1, last_active + int(rng.expovariate(1.0)))
+            yield {
+                "_id": object_id(rng, timestamp),
+                "user_id": user["_id"],
+                "username": user["username"],
+                "sop_type": sop_type,
+                "task_id": task_id,
+                "task_description": description,
+                "completed_at": completion_time(rng, days_ago, minute_of_day, now),
+                "ip_address": ip_address,
+                "user_agent": user_agent,
+                "session_id": session_id,
+            }
+
+def generate_chunk(seed, chunk_index, start, count, total_users, total_activities,
+                   password_hash, sop_types, days, now):
+    """Users [start, start + count) and their activities for one chunk"""
+    rng = random.Random(f"{seed}:{chunk_index}")
+    users = generate_users(rng, start, count, password_hash, now)
+    counts = [activities_for_user(index, total_users, total_activities) for index in range(start, start + count)]
+    return users, generate_activities(rng, users, counts, sop_types, days, now)
+
+def insert_chunk(mongo_url, db_name, batch_size, *chunk_args):
+    """Worker entry point: generate one chunk and insert it with insert_many"""
+    from pymongo import MongoClient
+
+    client = MongoClient(mongo_url)
+    try:
+        db = client[db_name]
+        users, activities = generate_chunk(*chunk_args)
+        db["users"].insert_many(users, ordered=False)
+        inserted = 0
+        batch = []
+        for activity in activities:
+            batch.append(activity)
+            if len(batch) >= batch_size:
+                db["sop_activities"].insert_many(batch, ordered=False)
+                inserted += len(batch)
+                batch = []
+        if batch:
+            db["sop_activities"].insert_many(batch, ordered=False)
+            inserted += len(batch)
+        return len(users), inserted
+    finally:
+        client.close()
+
+def parse_now(value: str) -> datetime:
+    """--now: an ISO date/datetime (naive UTC), or "today" for UTC midnight today"""
+    if value == "today":
+        today = datetime.utcnow()
+        return datetime(today.year, today.month, today.day)
+    return datetime.fromisoformat(value)
+
+def low_cost_hash(password: str, rounds: int) -> str:
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds).hash(password)
+
+async def prepare_database(db_name, drop):
+    from database import db_instance
+    from migrations import run_migrations
+
+    db_instance._create_client()
+    if drop:
+        await db_instance._client.drop_database(db_name)
+    await run_migrations(db_instance._client[db_name])
+
+async def finish_database(db_name):
+    from database import db_instance
+    from services.rollups import rebuild_rollups
+
+    await rebuild_rollups(db_instance._client[db_name])
+    db_instance.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--activities", type=int, default=1000000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--sop-types", type=int, default=None, help="default: as many as the activities need")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--now", type=parse_now, default=DEFAULT_NOW,
+                        help=f"reference time, ISO date or 'today' (default: {DEFAULT_NOW.date()})")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--password", default="password123", help="shared password for every generated user")
+    parser.add_argument("--bcrypt-rounds", type=int, default=4)
+    parser.add_argument("--db", default=None, help="default: MONGO_DB_NAME")
+    parser.add_argument("--drop", action="store_true", help="drop the database first")
+    parser.add_argument("--skip-rollups", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from config import settings
+    db_name = args.db or settings.MONGO_DB_NAME
+    sop_types = sop_type_names(args.sop_types or sop_types_needed(args.users, args.activities))
+    if args.activities > args.users * len(TASK_CATALOG) * len(sop_types):
+        parser.error("--activities exceeds users x tasks x sop types; raise --users or --sop-types")
+
+    started = time.perf_counter()
+    asyncio.run(prepare_database(db_name, args.drop))
+    password_hash = low_cost_hash(args.password, args.bcrypt_rounds)
+    now = args.now
+
+    chunks = [
+        (args.seed, chunk_index, start, min(USERS_PER_CHUNK, args.users - start),
+         args.users, args.activities, password_hash, sop_types, args.days, now)
+        for chunk_index, start in enumerate(range(0, args.users, USERS_PER_CHUNK))
+    ]
+    users_done = activities_done = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(insert_chunk, settings.mongo_url, db_name, args.batch_size, *chunk) for chunk in chunks]
+        for future in as_completed(futures):
+            users, activities = future.result()
+            users_done += users
+            activities_done += activities
+            logger.info(f"{users_done}/{args.users} users, {activities_done}/{args.activities} activities")
+
+    if not args.skip_rollups:
+        asyncio.run(finish_database(db_name))
+
+    elapsed = time.perf_counter() - started
+    logger.info(
+        f"Generated {users_done} users and {activities_done} activities "
+        f"({', '.join(sop_types)}) in {elapsed:.1f}s ({activities_done / elapsed:,.0f} activities/s)"
+    )
+
+if __name__ == "__main__":
+    main()
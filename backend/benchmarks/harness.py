@@ -0,0 +1,190 @@
+"""Shared plumbing for the benchmark scenarios.
+
+The app is driven in-process through httpx's ASGI transport, with the
+FastAPI lifespan run by hand so migrations, the hashing pool and the ingest
+queue behave as they do under uvicorn.
+"""
+import asyncio
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from passlib.context import CryptContext
+
+from benchmarks import dataset
+
+BENCH_PASSWORD = "benchpass"
+API = "/api/v1"
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of floats"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+class Recorder:
+    """Collects per-request latencies and failures for one scenario"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.started = None
+        self.finished = None
+
+    async def call(self, label, request):
+        """Await an httpx request coroutine, timing it under label"""
+        started = time.perf_counter()
+        try:
+            response = await request
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            response, ok = None, False
+        elapsed = (time.perf_counter() - started) * 1000
+        self.latencies.setdefault(label, []).append(elapsed)
+        if not ok:
+            self.errors[label] = self.errors.get(label, 0) + 1
+        return response
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.finished = time.perf_counter()
+
+    def summary(self) -> dict:
+        duration = (self.finished or time.perf_counter()) - self.started
+        result = {"duration_s": round(duration, 3), "endpoints": {}}
+        total = 0
+        for label, samples in self.latencies.items():
+            total += len(samples)
+            result["endpoints"][label] = {
+                "requests": len(samples),
+                "errors": self.errors.get(label, 0),
+                "throughput_rps": round(len(samples) / duration, 2) if duration else None,
+                "mean_ms": round(statistics.fmean(samples), 2),
+                "p50_ms": round(percentile(samples, 50), 2),
+                "p95_ms": round(percentile(samples, 95), 2),
+                "p99_ms": round(percentile(samples, 99), 2),
+            }
+        result["requests"] = total
+        result["throughput_rps"] = round(total / duration, 2) if duration else None
+        return result
+
+async def gather_limited(concurrency, coroutines):
+    """Run coroutines with at most `concurrency` in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(coroutine):
+        async with semaphore:
+            return await coroutine
+
+    return await asyncio.gather(*(limited(c) for c in coroutines))
+
+def use_memory_backend():
+    """Swap the Mongo client for mongomock-motor (no mongod needed).
+
+    The stand-in lacks some server features ($lookup sub-pipelines, $merge),
+    so summary numbers are only meaningful against a real mongod.
+    """
+    try:
+        import mongomock_motor
+    except ImportError:
+        raise SystemExit("--backend memory requires the mongomock-motor package")
+    import database
+    import migrations
+
+    def create_client(self):
+        from config import settings
+        self._client = mongomock_motor.AsyncMongoMockClient()
+        self._db = self._client[settings.MONGO_DB_NAME]
+
+    async def connect(self):
+        self._create_client()
+
+    async def skip_rebuild(db=None):
+        pass
+
+    def analytics_database(self):
+        # mongomock's with_options() returns an unwrapped, synchronous handle
+        return self.get_database()
+
+    database.Database._create_client = create_client
+    database.Database.connect = connect
+    database.Database.get_analytics_database = analytics_database
+    migrations.rebuild_rollups = skip_rebuild
+
+@asynccontextmanager
+async def running_app(db_name, backend="mongod"):
+    """Start the app against a fresh database and yield (app, client)"""
+    from config import settings
+    settings.MONGO_DB_NAME = db_name
+    if backend == "memory":
+        use_memory_backend()
+
+    import main
+    from cache import user_cache
+    from database import db_instance
+
+    # Seeded usernames repeat across runs with new _ids
+    user_cache.clear()
+
+    db_instance._create_client()
+    await db_instance._client.drop_database(db_name)
+    db_instance.close()
+
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+            yield main.app, client
+
+def fast_password_hash(rounds):
+    """One bcrypt hash of BENCH_PASSWORD shared by every seeded user"""
+    return CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds).hash(BENCH_PASSWORD)
+
+async def seed_users(db, count, password_hash, seed=42):
+    """Insert `count` synthetic users sharing one password hash"""
+    users = dataset.generate_users(
+        random.Random(seed), 0, count, password_hash, datetime.utcnow(), inactive_ratio=0
+    )
+    for start in range(0, len(users), 10000):
+        await db["users"].insert_many(users[start:start + 10000], ordered=False)
+    return users
+
+async def seed_activities(db, users, count, days=90, seed=42):
+    """Insert `count` unique (user, sop_type, task) activities spread over `days`"""
+    sop_types = dataset.sop_type_names(dataset.sop_types_needed(len(users), count))
+    counts = [dataset.activities_for_user(i, len(users), count) for i in range(len(users))]
+    batch = []
+    for activity in dataset.generate_activities(
+        random.Random(seed), users, counts, sop_types, days, datetime.utcnow()
+    ):
+        batch.append(activity)
+        if len(batch) >= 10000:
+            await db["sop_activities"].insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await db["sop_activities"].insert_many(batch, ordered=False)
+
+async def login(client, username, password):
+    response = await client.post(f"{API}/login", json={"username": username, "password": password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+    }
@@ -0,0 +1,83 @@
+"""Measure /profile latency while heavy admin reports run concurrently.
+
+Run against a live API (e.g. the docker-compose stack):
+
+    python benchmarks/profile_latency.py --base-url http://localhost:8000 \
+        --user alice --password secret --admin sysadmin --admin-password admin123
+
+Before the async data layer a single slow /admin/sop/summary froze the event
+loop, so p99 of /profile tracked the summary duration. With Motor the two
+should be largely independent.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.harness import API, login, percentile
+
+async def admin_load(client, headers, stop, days):
+    """Hammer the summary endpoint until told to stop"""
+    count = 0
+    while not stop.is_set():
+        await client.get(f"{API}/admin/sop/summary", params={"days": days}, headers=headers)
+        count += 1
+    return count
+
+async def profile_probe(client, headers, requests, interval):
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = await client.get(f"{API}/profile", headers=headers)
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(interval)
+    return latencies
+
+async def run(args):
+    timeout = httpx.Timeout(300.0)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=timeout) as client:
+        user_headers = await login(client, args.user, args.password)
+        admin_headers = await login(client, args.admin, args.admin_password)
+
+        stop = asyncio.Event()
+        loaders = [
+            asyncio.create_task(admin_load(client, admin_headers, stop, args.days))
+            for _ in range(args.admin_concurrency)
+        ]
+        latencies = await profile_probe(client, user_headers, args.requests, args.interval)
+        stop.set()
+        reports = sum(await asyncio.gather(*loaders))
+
+    return {
+        "profile_requests": len(latencies),
+        "admin_reports_completed": reports,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "mean_ms": statistics.fmean(latencies),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--user", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--admin", default="sysadmin")
+    parser.add_argument("--admin-password", default="admin123")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--interval", type=float, default=0.01)
+    parser.add_argument("--admin-concurrency", type=int, default=2)
+    parser.add_argument("--days", type=int, default=365)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
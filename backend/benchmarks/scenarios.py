@@ -0,0 +1,185 @@
+"""Scripted load scenarios for the API's hot paths.
+
+Each scenario receives the shared context (httpx client, database handle,
+admin headers and seeded users) and returns a Recorder summary dict.
+"""
+import asyncio
+import random
+import time
+
+import httpx
+
+from benchmarks.harness import API, BENCH_PASSWORD, Recorder, gather_limited, login
+
+async def login_burst(ctx, args):
+    """Every seeded user logs in at once (bcrypt-bound)"""
+    users = ctx["users"][:args.logins]
+    recorder = Recorder()
+    with recorder:
+        await gather_limited(args.concurrency, [
+            recorder.call("POST /login", ctx["client"].post(
+                f"{API}/login", json={"username": user["username"], "password": BENCH_PASSWORD}
+            ))
+            for user in users
+        ])
+    return recorder.summary()
+
+async def login_flood(ctx, args):
+    """Legitimate login latency while another IP floods wrong passwords
+
+    Three phases of sequential legitimate logins: no flood, a flood with the
+    login limiter on, and the same flood with it off. The flood targets real
+    usernames so every unthrottled attempt costs a bcrypt verification, and
+    is paced at --flood-rate because an in-process attacker is otherwise
+    limited only by the event loop it shares with the app. Targets come
+    from the end of the user list, away from the users later scenarios log
+    in, and the limiter's buckets are emptied afterwards.
+    """
+    from config import settings
+    from ratelimit import RATE_LIMIT_COLLECTION, bucket_store, login_limiter
+
+    legit = ctx["users"][:args.flood_logins]
+    targets = ctx["users"][max(args.flood_logins, len(ctx["users"]) - 50):] or legit
+    attacker = httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=ctx["app"], client=("203.0.113.7", 40000)),
+        base_url="http://bench", timeout=600
+    )
+    recorder = Recorder()
+    flood_statuses = {}
+
+    async def legitimate(label):
+        for user in legit:
+            await recorder.call(label, ctx["client"].post(
+                f"{API}/login", json={"username": user["username"], "password": BENCH_PASSWORD}
+            ))
+
+    async def flood(stop):
+        # Each attacker paces itself so together they send --flood-rate req/s
+        interval = args.flood_concurrency / args.flood_rate
+        attempt = 0
+        while not stop.is_set():
+            target = targets[attempt % len(targets)]
+            attempt += 1
+            started = time.perf_counter()
+            response = await attacker.post(
+                f"{API}/login", json={"username": target["username"], "password": "wrong-password"}
+            )
+            phase = "limiter_on" if settings.LOGIN_RATE_LIMIT_ENABLED else "limiter_off"
+            statuses = flood_statuses.setdefault(phase, {})
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+    async def under_flood(label):
+        stop = asyncio.Event()
+        flooders = [asyncio.create_task(flood(stop)) for _ in range(args.flood_concurrency)]
+        await legitimate(label)
+        stop.set()
+        await asyncio.gather(*flooders)
+
+    enabled = settings.LOGIN_RATE_LIMIT_ENABLED
+    try:
+        with recorder:
+            await legitimate("POST /login (no flood)")
+            settings.LOGIN_RATE_LIMIT_ENABLED = True
+            await under_flood("POST /login (flood, limiter on)")
+            settings.LOGIN_RATE_LIMIT_ENABLED = False
+            await under_flood("POST /login (flood, limiter off)")
+    finally:
+        settings.LOGIN_RATE_LIMIT_ENABLED = enabled
+        await attacker.aclose()
+        # Locked-out targets must not leak into the next scenario
+        login_limiter.store = bucket_store()
+        await ctx["db"][RATE_LIMIT_COLLECTION].delete_many({})
+
+    result = recorder.summary()
+    result["flood_statuses"] = {
+        phase: {str(code): count for code, count in sorted(statuses.items())}
+        for phase, statuses in flood_statuses.items()
+    }
+    return result
+
+async def tick_storm(ctx, args):
+    """Operators tick checklist items as fast as the API accepts them"""
+    rng = random.Random(args.seed)
+    operators = ctx["users"][:args.operators]
+    headers = await asyncio.gather(*(login(ctx["client"], user["username"], BENCH_PASSWORD) for user in operators))
+    recorder = Recorder()
+    calls = []
+    for _ in range(args.ticks):
+        operator_headers = rng.choice(headers)
+        task_id = f"storm_task_{rng.randrange(40)}"
+        calls.append(recorder.call("POST /sop/activity", ctx["client"].post(
+            f"{API}/sop/activity",
+            json={"sop_type": "gift_sop", "task_id": task_id, "task_description": task_id},
+            headers=operator_headers
+        )))
+    with recorder:
+        await gather_limited(args.concurrency, calls)
+    return recorder.summary()
+
+async def admin_summary(ctx, args):
+    """Repeated /admin/sop/summary over the seeded history"""
+    recorder = Recorder()
+    with recorder:
+        for _ in range(args.repeat):
+            await recorder.call("GET /admin/sop/summary", ctx["client"].get(
+                f"{API}/admin/sop/summary", params={"days": args.days}, headers=ctx["admin"]
+            ))
+    return recorder.summary()
+
+async def admin_report(ctx, args):
+    """Repeated full /admin/sop/report downloads in each requested format"""
+    recorder = Recorder()
+    with recorder:
+        for _ in range(args.repeat):
+            for export_format in args.formats:
+                await recorder.call(f"GET /admin/sop/report?format={export_format}", ctx["client"].get(
+                    f"{API}/admin/sop/report",
+                    params={"days": args.days, "format": export_format},
+                    headers=ctx["admin"]
+                ))
+    return recorder.summary()
+
+async def mixed(ctx, args):
+    """Operators tick and read their profile while admins run reports"""
+    rng = random.Random(args.seed)
+    client = ctx["client"]
+    operators = ctx["users"][:args.operators]
+    headers = await asyncio.gather(*(login(client, user["username"], BENCH_PASSWORD) for user in operators))
+    recorder = Recorder()
+    stop = asyncio.Event()
+
+    async def operator(operator_headers):
+        for _ in range(args.ticks // max(1, len(headers))):
+            task_id = f"mixed_task_{rng.randrange(40)}"
+            await recorder.call("POST /sop/activity", client.post(
+                f"{API}/sop/activity",
+                json={"sop_type": "gift_sop", "task_id": task_id, "task_description": task_id},
+                headers=operator_headers
+            ))
+            await recorder.call("GET /profile", client.get(f"{API}/profile", headers=operator_headers))
+
+    async def admin():
+        while not stop.is_set():
+            await recorder.call("GET /admin/sop/summary", client.get(
+                f"{API}/admin/sop/summary", params={"days": args.days}, headers=ctx["admin"]
+            ))
+            await recorder.call("GET /admin/sop/report", client.get(
+                f"{API}/admin/sop/report", params={"days": args.days}, headers=ctx["admin"]
+            ))
+
+    with recorder:
+        admins = [asyncio.create_task(admin()) for _ in range(args.admins)]
+        await gather_limited(args.concurrency, [operator(h) for h in headers])
+        stop.set()
+        await asyncio.gather(*admins)
+    return recorder.summary()
+
+SCENARIOS = {
+    "login_burst": login_burst,
+    "login_flood": login_flood,
+    "tick_storm": tick_storm,
+    "admin_summary": admin_summary,
+    "admin_report": admin_report,
+    "mixed": mixed,
+}
@@ -0,0 +1,100 @@
+"""Time the admin user search index on synthetic users.
+
+No database needed; users come from the synthetic dataset generator. Each
+query is run against the in-process index (what /admin/users/search does
+before fetching the matched documents by _id) and against a linear scan of
+the same lowercased fields, and both must agree on the set of matches.
+
+    python benchmarks/search_benchmark.py --users 100000 --repeat 20
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import dataset
+from services.user_search import SEARCH_FIELDS, UserSearchIndex, normalize
+
+def sample_queries(users, rng):
+    user = rng.choice(users)
+    first, last = user["name"].split(" ", 1)
+    return [
+        user["username"],             # exact
+        user["username"][:9],         # long prefix shared by many
+        user["username"][-4:],        # digits substring
+        "us",                         # short prefix
+        first[:3].lower(),            # name prefix
+        last.lower(),                 # name word
+        user["email"].split("@")[0],  # email local part
+        "example.com",                # matches everyone
+        "zzzz",                       # matches nobody
+    ]
+
+def scan(users, query):
+    """Every match: prefix of a field or name word, or (3+ chars) any substring"""
+    query = normalize(query)
+    matches = set()
+    for user in users:
+        values = [normalize(user.get(field)) for field in SEARCH_FIELDS]
+        words = values[2].split()
+        if len(query) >= 3:
+            matched = any(query in value for value in values)
+        else:
+            matched = any(value.startswith(query) for value in values + words)
+        if matched:
+            matches.add(user["_id"])
+    return matches
+
+def timed(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        samples.append((time.perf_counter() - started) * 1000)
+    return result, samples
+
+def main(args):
+    rng = random.Random(args.seed)
+    users = dataset.generate_users(rng, 0, args.users, "x", datetime.utcnow())
+
+    started = time.perf_counter()
+    index = UserSearchIndex.build(users)
+    build_ms = (time.perf_counter() - started) * 1000
+    print(json.dumps({"users": args.users, "build_ms": round(build_ms), "grams": index.stats()["grams"]}))
+
+    results = []
+    for query in sample_queries(users, rng):
+        ids, samples = timed(lambda: index.search_ids(query, args.limit), args.repeat)
+        expected, scan_samples = timed(lambda: scan(users, query), 1)
+        if not set(ids) <= expected or (len(ids) < args.limit and set(ids) != expected):
+            raise SystemExit(f"{query!r}: index results differ from a full scan")
+        results.append({
+            "query": query,
+            "matches": len(expected),
+            "returned": len(ids),
+            "p50_ms": round(statistics.median(samples), 3),
+            "max_ms": round(max(samples), 3),
+            "scan_ms": round(scan_samples[0], 1),
+        })
+        print(json.dumps(results[-1]))
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write results as JSON here")
+    args = parser.parse_args()
+
+    results = main(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
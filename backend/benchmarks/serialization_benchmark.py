@@ -0,0 +1,109 @@
+"""Compare list-response serialization: Pydantic models vs dicts + orjson.
+
+No database needed; documents come from the synthetic dataset generator.
+The legacy path is what the list routes did before: build a response model
+per document, let FastAPI validate the result against response_model, then
+render with the stdlib json encoder. The fast path is the one the routes use
+now (serialization.py). Both must produce the same JSON.
+
+    python benchmarks/serialization_benchmark.py --rows 1000 10000 --repeat 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime
+from typing import List, Union
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from benchmarks import dataset
+from models import SOPActivityPage, SOPActivityResponse, UserPage, UserResponse
+from routes.admin import user_serializer
+from serialization import activity_dict, fast_json, page_dict, user_dict
+
+def activity_serializer(activity: dict) -> SOPActivityResponse:
+    """The activity list routes' old per-document response model"""
+    return SOPActivityResponse(**activity_dict(activity))
+
+async def legacy_body(field, documents, serializer, page_model, paged):
+    items = [serializer(document) for document in documents]
+    content = page_model(items=items, next_cursor=None) if paged else items
+    content = await serialize_response(field=field, response_content=content)
+    return JSONResponse(content).body
+
+async def fast_body(field, documents, to_dict, page_model, paged):
+    items = [to_dict(document) for document in documents]
+    return fast_json(page_dict(items, None) if paged else items).body
+
+async def rows_per_second(render, field, documents, to_row, page_model, paged, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = await render(field, documents, to_row, page_model, paged)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return len(documents) / best, body
+
+def build_documents(rows, seed):
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    users = dataset.generate_users(rng, 0, max(1, rows // 9), "x", now)
+    counts = [dataset.activities_for_user(i, len(users), rows) for i in range(len(users))]
+    sop_types = dataset.sop_type_names(dataset.sop_types_needed(len(users), rows))
+    activities = list(dataset.generate_activities(rng, users, counts, sop_types, 90, now))
+    # Users as find() returns them: whole documents, password hash included
+    return (users * (rows // len(users) + 1))[:rows], activities
+
+async def main(args):
+    cases = [
+        ("users", UserResponse, UserPage, user_serializer, user_dict),
+        ("activities", SOPActivityResponse, SOPActivityPage, activity_serializer, activity_dict),
+    ]
+    results = []
+    for rows in args.rows:
+        users, activities = build_documents(rows, args.seed)
+        documents = {"users": users, "activities": activities}
+        for name, model, page_model, serializer, to_dict in cases:
+            field = create_response_field(
+                name=f"Response_{name}", type_=Union[page_model, List[model]], mode="serialization"
+            )
+            for paged in (False, True):
+                legacy_rate, legacy = await rows_per_second(
+                    legacy_body, field, documents[name], serializer, page_model, paged, args.repeat
+                )
+                fast_rate, fast = await rows_per_second(
+                    fast_body, field, documents[name], to_dict, page_model, paged, args.repeat
+                )
+                if json.loads(legacy) != json.loads(fast):
+                    raise SystemExit(f"{name}: fast path output differs from the legacy path")
+                results.append({
+                    "endpoint": name,
+                    "shape": "page" if paged else "list",
+                    "rows": rows,
+                    "legacy_rows_per_s": round(legacy_rate),
+                    "fast_rows_per_s": round(fast_rate),
+                    "speedup": round(fast_rate / legacy_rate, 2),
+                })
+                print(json.dumps(results[-1]))
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write results as JSON here")
+    args = parser.parse_args()
+
+    results = asyncio.run(main(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
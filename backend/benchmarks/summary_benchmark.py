@@ -0,0 +1,108 @@
+"""Compare the legacy per-user summary loop with the aggregation pipeline.
+
+Seeds a scratch database (default 1k users x 100k activities) on the
+configured MongoDB, rebuilds the daily rollups, then times both
+implementations of /admin/sop/summary's data access:
+
+    python benchmarks/summary_benchmark.py --db sop_bench --users 1000 --activities 100000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+from database import db_instance
+from migrations import run_migrations
+from services.sop import sop_summary_pipeline
+from services.rollups import rebuild_rollups
+
+async def seed(db, users, activities, seed_value):
+    rng = random.Random(seed_value)
+    now = datetime.utcnow()
+    user_docs = [
+        {"_id": ObjectId(), "username": f"user{i}", "email": f"user{i}@example.com",
+         "password": "x", "role": "user", "is_active": True}
+        for i in range(users)
+    ]
+    await db["users"].insert_many(user_docs)
+
+    seen = set()
+    batch = []
+    while len(seen) < activities:
+        user = rng.choice(user_docs)
+        task_id = f"task_{rng.randrange(max(1, activities // users * 2))}"
+        key = (user["_id"], task_id)
+        if key in seen:
+            continue
+        seen.add(key)
+        batch.append({
+            "user_id": user["_id"], "username": user["username"], "sop_type": "gift_sop",
+            "task_id": task_id, "task_description": task_id,
+            "completed_at": now - timedelta(seconds=rng.randrange(60 * 86400)),
+        })
+        if len(batch) >= 10000:
+            await db["sop_activities"].insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await db["sop_activities"].insert_many(batch, ordered=False)
+
+async def legacy_summary(db, days):
+    """The pre-aggregation implementation: one sorted find per user"""
+    start_date = datetime.utcnow() - timedelta(days=days)
+    rows = []
+    for user in await db["users"].find({}).to_list(length=None):
+        query = {"user_id": user["_id"], "completed_at": {"$gte": start_date}}
+        activities = await db["sop_activities"].find(query).sort("completed_at", -1).to_list(length=None)
+        rows.append((len({a["task_id"] for a in activities}), activities[0]["completed_at"] if activities else None))
+    return rows
+
+async def pipeline_summary(db, days):
+    return await db["users"].aggregate(sop_summary_pipeline(days=days)).to_list(length=None)
+
+async def timed(func, *args, repeat=3):
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await func(*args)
+        durations.append(time.perf_counter() - started)
+    return min(durations)
+
+async def run(args):
+    db_instance._create_client()
+    db = db_instance._client[args.db]
+    if not args.keep:
+        await db_instance._client.drop_database(args.db)
+        await run_migrations(db)
+        await seed(db, args.users, args.activities, args.seed)
+        await rebuild_rollups(db)
+
+    legacy = await timed(legacy_summary, db, args.days)
+    pipeline = await timed(pipeline_summary, db, args.days)
+    return {
+        "users": args.users,
+        "activities": args.activities,
+        "legacy_seconds": round(legacy, 4),
+        "pipeline_seconds": round(pipeline, 4),
+        "speedup": round(legacy / pipeline, 2) if pipeline else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default="sop_bench")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--activities", type=int, default=100000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="reuse existing data instead of reseeding")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
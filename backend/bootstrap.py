@@ -0,0 +1,87 @@
+from pymongo.errors import DuplicateKeyError
+from database import get_db
+from config import settings
+from migrations import run_migrations
+from services.admin import create_default_admin
+from datetime import datetime, timedelta
+import asyncio
+import os
+import socket
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+LOCKS_COLLECTION = "bootstrap_locks"
+BOOTSTRAP_LOCK = "startup"
+
+class BootstrapLease:
+    """Expiring lock document so only one worker runs startup work at a time
+
+    The holder renews it while working; if a worker dies mid-bootstrap the
+    lease expires and the next worker takes over. Every step it guards is
+    idempotent, so a takeover simply re-runs what was left.
+    """
+
+    def __init__(self, db, name: str = BOOTSTRAP_LOCK):
+        self.collection = db[LOCKS_COLLECTION]
+        self.name = name
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    async def acquire(self) -> bool:
+        """Take or renew the lease; False while another worker holds it"""
+        now = datetime.utcnow()
+        try:
+            await self.collection.update_one(
+                {"_id": self.name, "$or": [{"expires_at": {"$lt": now}}, {"owner": self.owner}]},
+                {"$set": {
+                    "owner": self.owner,
+                    "expires_at": now + timedelta(seconds=settings.BOOTSTRAP_LEASE_SECONDS)
+                }},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            # The lock document exists and is held by someone else
+            return False
+
+    async def release(self):
+        await self.collection.delete_one({"_id": self.name, "owner": self.owner})
+
+    async def _renew(self):
+        while True:
+            await asyncio.sleep(max(1, settings.BOOTSTRAP_LEASE_SECONDS / 3))
+            if not await self.acquire():
+                logger.warning("Bootstrap lease lost to another worker")
+
+    async def wait(self):
+        """Block until this worker holds the lease"""
+        deadline = asyncio.get_running_loop().time() + settings.BOOTSTRAP_WAIT_SECONDS
+        waiting_logged = False
+        while not await self.acquire():
+            if asyncio.get_running_loop().time() > deadline:
+                raise RuntimeError("Timed out waiting for another worker to finish startup bootstrap")
+            if not waiting_logged:
+                logger.info("Waiting for another worker to finish startup bootstrap")
+                waiting_logged = True
+            await asyncio.sleep(1)
+
+    async def __aenter__(self):
+        await self.wait()
+        self._renewer = asyncio.create_task(self._renew())
+        return self
+
+    async def __aexit__(self, *exc):
+        self._renewer.cancel()
+        await self.release()
+
+async def run_bootstrap(db=None):
+    """Apply migrations and create the default admin, one worker at a time
+
+    The first worker does the real work; the rest acquire the lease after it
+    and find nothing left to do.
+    """
+    db = db if db is not None else get_db()
+    async with BootstrapLease(db):
+        await run_migrations(db)
+        await create_default_admin()
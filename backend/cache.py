@@ -0,0 +1,110 @@
+from collections import OrderedDict
+from typing import Optional
+from config import settings
+from services.versions import USERS_SCOPE, current_version, user_changes
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Version gap above which clearing the cache beats replaying the change log
+MAX_REPLAY = 1000
+
+class UserCache:
+    """In-process TTL + LRU cache of user documents keyed by username"""
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # username -> (expires_at, user)
+        self._usernames = {}  # str(_id) -> username
+        self._version = None  # USERS_SCOPE version the entries are valid for
+        self._version_checked = 0.0
+
+    def get(self, username: str) -> Optional[dict]:
+        """Return a cached user, or None on miss/expiry"""
+        entry = self._entries.get(username)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self.invalidate(username)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(username)
+        self.hits += 1
+        return dict(entry[1])
+
+    def set(self, user: dict):
+        """Cache a user document"""
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+        username = user["username"]
+        self._entries[username] = (time.monotonic() + self.ttl, dict(user))
+        self._entries.move_to_end(username)
+        self._usernames[str(user["_id"])] = username
+        while len(self._entries) > self.max_size:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._usernames.pop(str(evicted["_id"]), None)
+
+    def invalidate(self, username: str):
+        """Drop a user by username"""
+        entry = self._entries.pop(username, None)
+        if entry is not None:
+            self._usernames.pop(str(entry[1]["_id"]), None)
+
+    def invalidate_id(self, user_id):
+        """Drop a user by _id (covers username changes)"""
+        username = self._usernames.get(str(user_id))
+        if username is not None:
+            self.invalidate(username)
+
+    async def check_version(self):
+        """Drop the users changed (in any worker) since USERS_SCOPE last moved
+
+        Reads the version at most every USER_CACHE_VERSION_CHECK_SECONDS, so
+        deactivations made through another worker apply within that window
+        instead of the TTL. The changed users come from the user_changes
+        log; when it cannot account for every version in the gap (too many,
+        expired or not yet written) the whole cache is dropped instead.
+        """
+        now = time.monotonic()
+        if now - self._version_checked < settings.USER_CACHE_VERSION_CHECK_SECONDS:
+            return
+        self._version_checked = now
+        try:
+            version = await current_version(USERS_SCOPE)
+            if version == self._version:
+                return
+            changes = []
+            if self._version is not None and 0 < version - self._version <= MAX_REPLAY:
+                changes = await user_changes(self._version, version)
+        except Exception as e:
+            logger.error(f"User cache version check failed: {e}")
+            return
+        if self._version is not None:
+            if len(changes) == version - self._version:
+                for _, user_ids in changes:
+                    for user_id in user_ids:
+                        self.invalidate_id(user_id)
+            else:
+                self.clear()
+        self._version = version
+
+    def clear(self):
+        self._entries.clear()
+        self._usernames.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+# Global user cache
+user_cache = UserCache(settings.USER_CACHE_TTL_SECONDS, settings.USER_CACHE_MAX_SIZE)
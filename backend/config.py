@@ -8,12 +8,128 @@ class Settings:
     MONGO_USERNAME: str = os.getenv("MONGO_USERNAME", "admin")
     MONGO_PASSWORD: str = os.getenv("MONGO_PASSWORD", "admin")
     MONGO_DB_NAME: str = os.getenv("MONGO_DB_NAME", "appdb")
+    # Optional replica set name; MONGO_HOST may then list several seeds "a,b,c"
+    MONGO_REPLICA_SET: str = os.getenv("MONGO_REPLICA_SET", "")
+
+    # Connection pool and timeouts (per worker process)
+    MONGO_MAX_POOL_SIZE: int = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+    MONGO_MIN_POOL_SIZE: int = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+    MONGO_MAX_IDLE_TIME_MS: int = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+    MONGO_CONNECT_TIMEOUT_MS: int = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: int = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000"))
+    # Wire compression, in preference order: "zstd,snappy,zlib" ("" = off).
+    # zstd needs the zstandard package and snappy python-snappy.
+    MONGO_COMPRESSORS: str = os.getenv("MONGO_COMPRESSORS", "")
+
+    # Read preference for user-facing reads and for admin analytics
+    # (/admin/sop/*); secondaryPreferred falls back to the primary when no
+    # secondary is available, e.g. on a standalone server
+    MONGO_READ_PREFERENCE: str = os.getenv("MONGO_READ_PREFERENCE", "primary")
+    MONGO_ANALYTICS_READ_PREFERENCE: str = os.getenv("MONGO_ANALYTICS_READ_PREFERENCE", "secondaryPreferred")
+    # -1 = no limit; otherwise at least 90 seconds
+    MONGO_ANALYTICS_MAX_STALENESS_SECONDS: int = int(os.getenv("MONGO_ANALYTICS_MAX_STALENESS_SECONDS", "-1"))
 
     # Security
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
 
+    # Server processes (gunicorn.conf.py, or python main.py)
+    SERVER_HOST: str = os.getenv("SERVER_HOST", "0.0.0.0")
+    SERVER_PORT: int = int(os.getenv("SERVER_PORT", "8000"))
+    SERVER_WORKERS: int = int(os.getenv("SERVER_WORKERS", "1"))
+
+    # Startup bootstrap (migrations + default admin), one worker at a time
+    BOOTSTRAP_LEASE_SECONDS: int = int(os.getenv("BOOTSTRAP_LEASE_SECONDS", "60"))
+    BOOTSTRAP_WAIT_SECONDS: int = int(os.getenv("BOOTSTRAP_WAIT_SECONDS", "600"))
+    # Cleared by gunicorn.conf.py once the master has bootstrapped
+    BOOTSTRAP_IN_WORKERS: bool = True
+
+    # Failed-login throttling (token buckets per username and client IP).
+    # LOGIN_RATE_LIMIT_STORE is "memory" (per worker), "mongo" (shared) or
+    # "auto" (mongo when SERVER_WORKERS > 1, else memory).
+    LOGIN_RATE_LIMIT_ENABLED: bool = os.getenv("LOGIN_RATE_LIMIT_ENABLED", "true").lower() == "true"
+    LOGIN_RATE_LIMIT_STORE: str = os.getenv("LOGIN_RATE_LIMIT_STORE", "auto")
+    LOGIN_RATE_LIMIT_MAX_KEYS: int = int(os.getenv("LOGIN_RATE_LIMIT_MAX_KEYS", "100000"))
+    LOGIN_USERNAME_BURST: float = float(os.getenv("LOGIN_USERNAME_BURST", "5"))
+    LOGIN_USERNAME_PER_MINUTE: float = float(os.getenv("LOGIN_USERNAME_PER_MINUTE", "5"))
+    LOGIN_IP_BURST: float = float(os.getenv("LOGIN_IP_BURST", "20"))
+    LOGIN_IP_PER_MINUTE: float = float(os.getenv("LOGIN_IP_PER_MINUTE", "30"))
+    LOGIN_RATE_LIMIT_DETAIL: str = os.getenv("LOGIN_RATE_LIMIT_DETAIL", "Too many failed login attempts, please retry later")
+    # Proxies whose X-Forwarded-For is trusted for the client IP
+    FORWARDED_ALLOW_IPS: str = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+    # Per-route-class admission control (per worker): concurrent requests
+    # and wait-queue length for auth, interactive, analytics, export and stream
+    ADMISSION_ENABLED: bool = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+    ADMISSION_AUTH_CONCURRENCY: int = int(os.getenv("ADMISSION_AUTH_CONCURRENCY", "16"))
+    ADMISSION_AUTH_QUEUE: int = int(os.getenv("ADMISSION_AUTH_QUEUE", "64"))
+    ADMISSION_INTERACTIVE_CONCURRENCY: int = int(os.getenv("ADMISSION_INTERACTIVE_CONCURRENCY", "256"))
+    ADMISSION_INTERACTIVE_QUEUE: int = int(os.getenv("ADMISSION_INTERACTIVE_QUEUE", "1024"))
+    ADMISSION_ANALYTICS_CONCURRENCY: int = int(os.getenv("ADMISSION_ANALYTICS_CONCURRENCY", "4"))
+    ADMISSION_ANALYTICS_QUEUE: int = int(os.getenv("ADMISSION_ANALYTICS_QUEUE", "16"))
+    ADMISSION_EXPORT_CONCURRENCY: int = int(os.getenv("ADMISSION_EXPORT_CONCURRENCY", "2"))
+    ADMISSION_EXPORT_QUEUE: int = int(os.getenv("ADMISSION_EXPORT_QUEUE", "4"))
+    # Open live-feed streams; each holds its slot while connected
+    ADMISSION_STREAM_CONCURRENCY: int = int(os.getenv("ADMISSION_STREAM_CONCURRENCY", "32"))
+    ADMISSION_QUEUE_TIMEOUT_MS: int = int(os.getenv("ADMISSION_QUEUE_TIMEOUT_MS", "5000"))
+    ADMISSION_RETRY_AFTER: int = int(os.getenv("ADMISSION_RETRY_AFTER", "2"))
+
+    # Password hashing pool ("process" or "thread")
+    PASSWORD_HASH_EXECUTOR: str = os.getenv("PASSWORD_HASH_EXECUTOR", "process")
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+    PASSWORD_HASH_QUEUE_DEPTH: int = int(os.getenv("PASSWORD_HASH_QUEUE_DEPTH", "64"))
+    PASSWORD_HASH_RETRY_AFTER: int = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", "1"))
+
+    # Authenticated user cache
+    USER_CACHE_TTL_SECONDS: float = float(os.getenv("USER_CACHE_TTL_SECONDS", "30"))
+    USER_CACHE_MAX_SIZE: int = int(os.getenv("USER_CACHE_MAX_SIZE", "1024"))
+    # How often a worker checks the users change version and drops its cache
+    # when another worker changed a user (bounds cross-worker staleness)
+    USER_CACHE_VERSION_CHECK_SECONDS: float = float(os.getenv("USER_CACHE_VERSION_CHECK_SECONDS", "1"))
+
+    # SOP activity batching
+    SOP_BATCH_MAX_SIZE: int = int(os.getenv("SOP_BATCH_MAX_SIZE", "200"))
+
+    # Write-behind activity ingestion
+    SOP_INGEST_QUEUE_ENABLED: bool = os.getenv("SOP_INGEST_QUEUE_ENABLED", "false").lower() == "true"
+    SOP_INGEST_QUEUE_MAX_SIZE: int = int(os.getenv("SOP_INGEST_QUEUE_MAX_SIZE", "10000"))
+    SOP_INGEST_FLUSH_SIZE: int = int(os.getenv("SOP_INGEST_FLUSH_SIZE", "500"))
+    SOP_INGEST_FLUSH_INTERVAL_MS: int = int(os.getenv("SOP_INGEST_FLUSH_INTERVAL_MS", "200"))
+    SOP_INGEST_RETRY_AFTER: int = int(os.getenv("SOP_INGEST_RETRY_AFTER", "1"))
+
+    # Live activity feed (/admin/sop/stream). SOP_STREAM_SOURCE is "memory"
+    # (this worker's writes), "change_stream" (replica set required), "poll"
+    # (every worker re-reads recent rows) or "auto" (change_stream when
+    # MONGO_REPLICA_SET is set, else poll with several workers, else memory)
+    SOP_STREAM_SOURCE: str = os.getenv("SOP_STREAM_SOURCE", "auto")
+    SOP_STREAM_REPLAY_SIZE: int = int(os.getenv("SOP_STREAM_REPLAY_SIZE", "1000"))
+    SOP_STREAM_SUBSCRIBER_BUFFER: int = int(os.getenv("SOP_STREAM_SUBSCRIBER_BUFFER", "500"))
+    SOP_STREAM_HEARTBEAT_SECONDS: float = float(os.getenv("SOP_STREAM_HEARTBEAT_SECONDS", "15"))
+    SOP_STREAM_RETRY_MS: int = int(os.getenv("SOP_STREAM_RETRY_MS", "3000"))
+    SOP_STREAM_POLL_INTERVAL_MS: int = int(os.getenv("SOP_STREAM_POLL_INTERVAL_MS", "1000"))
+    SOP_STREAM_POLL_LAG_MS: int = int(os.getenv("SOP_STREAM_POLL_LAG_MS", "3000"))
+    SOP_STREAM_POLL_BATCH: int = int(os.getenv("SOP_STREAM_POLL_BATCH", "1000"))
+
+    # Cold archive: activities completed more than SOP_ARCHIVE_HORIZON_DAYS
+    # ago move to monthly zstd NDJSON files in SOP_ARCHIVE_DIR (a volume
+    # shared by every worker that serves reports)
+    SOP_ARCHIVE_ENABLED: bool = os.getenv("SOP_ARCHIVE_ENABLED", "false").lower() == "true"
+    SOP_ARCHIVE_DIR: str = os.getenv("SOP_ARCHIVE_DIR", "sop_archive")
+    SOP_ARCHIVE_HORIZON_DAYS: int = int(os.getenv("SOP_ARCHIVE_HORIZON_DAYS", "180"))
+    SOP_ARCHIVE_INTERVAL_SECONDS: int = int(os.getenv("SOP_ARCHIVE_INTERVAL_SECONDS", "3600"))
+    SOP_ARCHIVE_BATCH_SIZE: int = int(os.getenv("SOP_ARCHIVE_BATCH_SIZE", "5000"))
+    SOP_ARCHIVE_ZSTD_LEVEL: int = int(os.getenv("SOP_ARCHIVE_ZSTD_LEVEL", "9"))
+
+    # Bulk user import: rows per upload (every row costs one bcrypt hash)
+    USER_IMPORT_MAX_ROWS: int = int(os.getenv("USER_IMPORT_MAX_ROWS", "1000"))
+    USER_IMPORT_MAX_BYTES: int = int(os.getenv("USER_IMPORT_MAX_BYTES", str(2 * 1024 * 1024)))
+
+    # Report exports
+    REPORT_BATCH_SIZE: int = int(os.getenv("REPORT_BATCH_SIZE", "1000"))
+    REPORT_PARQUET_ROW_GROUP_SIZE: int = int(os.getenv("REPORT_PARQUET_ROW_GROUP_SIZE", "50000"))
+
     # CORS
     @property
     def ALLOWED_ORIGINS(self) -> List[str]:
@@ -22,6 +138,10 @@ class Settings:
 
     @property
     def mongo_url(self) -> str:
-        return f"mongodb://{self.MONGO_USERNAME}:{self.MONGO_PASSWORD}@{self.MONGO_HOST}:{self.MONGO_PORT}/?authSource=admin"
+        hosts = ",".join(
+            host if ":" in host else f"{host}:{self.MONGO_PORT}"
+            for host in (host.strip() for host in self.MONGO_HOST.split(","))
+        )
+        return f"mongodb://{self.MONGO_USERNAME}:{self.MONGO_PASSWORD}@{hosts}/?authSource=admin"
 
 settings = Settings()
\ No newline at end of file
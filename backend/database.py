@@ -1,51 +1,113 @@
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo.errors import ConnectionFailure
+from pymongo.read_preferences import Primary, PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
 from config import settings
+from metrics import mongo_event_listeners
+import os
 import logging
 
 logger = logging.getLogger(__name__)
 
+READ_PREFERENCES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+def read_preference(name: str, max_staleness: int = -1):
+    """Build a read preference from its connection-string name"""
+    mode = READ_PREFERENCES.get(name)
+    if mode is None:
+        raise ValueError(f"Unknown read preference: {name}")
+    if mode is Primary:
+        return Primary()
+    return mode(max_staleness=max_staleness)
+
+def client_options() -> dict:
+    """Pool, timeout, compression and read settings for the client"""
+    options = {
+        "maxPoolSize": settings.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": settings.MONGO_MAX_IDLE_TIME_MS,
+        "serverSelectionTimeoutMS": settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": settings.MONGO_CONNECT_TIMEOUT_MS,
+        "waitQueueTimeoutMS": settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "read_preference": read_preference(settings.MONGO_READ_PREFERENCE),
+    }
+    if settings.MONGO_COMPRESSORS:
+        options["compressors"] = settings.MONGO_COMPRESSORS
+    if settings.MONGO_REPLICA_SET:
+        options["replicaSet"] = settings.MONGO_REPLICA_SET
+    return options
+
 class Database:
     _instance = None
     _client = None
     _db = None
-    
+
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(Database, cls).__new__(cls)
         return cls._instance
-    
-    def connect(self):
+
+    def _create_client(self):
+        """Create the async client (no I/O happens until the first operation)"""
+        self._client = AsyncIOMotorClient(
+            settings.mongo_url, event_listeners=mongo_event_listeners(), **client_options()
+        )
+        self._db = self._client[settings.MONGO_DB_NAME]
+
+    async def connect(self):
         """Initialize database connection"""
         try:
-            self._client = MongoClient(settings.mongo_url)
+            self._create_client()
             # Test connection
-            self._client.admin.command('ping')
-            self._db = self._client[settings.MONGO_DB_NAME]
+            await self._client.admin.command('ping')
             logger.info("Successfully connected to MongoDB")
         except ConnectionFailure as e:
             logger.error(f"Failed to connect to MongoDB: {e}")
             raise
-    
+
     def get_database(self):
         """Get database instance"""
         if self._db is None:
-            self.connect()
+            self._create_client()
         return self._db
-    
+
+    def get_analytics_database(self):
+        """Database handle whose reads follow the analytics read preference"""
+        return self.get_database().with_options(read_preference=read_preference(
+            settings.MONGO_ANALYTICS_READ_PREFERENCE,
+            settings.MONGO_ANALYTICS_MAX_STALENESS_SECONDS
+        ))
+
     def close(self):
         """Close database connection"""
         if self._client:
             self._client.close()
+            self._client = None
+            self._db = None
             logger.info("MongoDB connection closed")
 
+    def _forget_client(self):
+        """Drop a client inherited across fork; the child creates its own"""
+        self._client = None
+        self._db = None
+
 # Global database instance
 db_instance = Database()
+os.register_at_fork(after_in_child=db_instance._forget_client)
 
 def get_db():
     """Dependency to get database instance"""
     return db_instance.get_database()
 
+def get_analytics_db():
+    """Database for admin reporting reads, which may be served by secondaries"""
+    return db_instance.get_analytics_database()
+
 # Collections
 def get_user_collection():
     db = get_db()
@@ -53,4 +115,4 @@ def get_user_collection():
 
 def get_sop_activity_collection():
     db = get_db()
-    return db["sop_activities"]
\ No newline at end of file
+    return db["sop_activities"]
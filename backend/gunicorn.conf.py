@@ -0,0 +1,35 @@
+# gunicorn -c gunicorn.conf.py main:app
+#
+# The app is not preloaded: each worker imports it after fork and opens its
+# own Mongo client and hashing pool in the lifespan startup. Startup
+# bootstrap (migrations, default admin) runs once in the master before any
+# worker forks, still under the MongoDB lease so several hosts can start
+# together; workers then skip it and boot within the normal timeout.
+from config import settings
+
+bind = f"{settings.SERVER_HOST}:{settings.SERVER_PORT}"
+workers = settings.SERVER_WORKERS
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = False
+# Lets the login limiter see the real client IP behind nginx
+forwarded_allow_ips = settings.FORWARDED_ALLOW_IPS
+timeout = 120
+graceful_timeout = 30
+
+def on_starting(server):
+    """Run the startup bootstrap in the master, before workers are forked"""
+    import asyncio
+    from database import db_instance
+    from hashing import hashing_pool
+    from bootstrap import run_bootstrap
+
+    async def bootstrap():
+        try:
+            await run_bootstrap()
+        finally:
+            hashing_pool.shutdown()
+            db_instance.close()
+
+    asyncio.run(bootstrap())
+    # Forked workers inherit this and skip the bootstrap in their lifespan
+    settings.BOOTSTRAP_IN_WORKERS = False
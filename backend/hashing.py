@@ -0,0 +1,101 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from fastapi import HTTPException, status
+from config import settings
+import asyncio
+import multiprocessing
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+class HashingPool:
+    """Bounded worker pool that keeps bcrypt off the event loop"""
+    _instance = None
+    _executor = None
+    _pending = 0
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(HashingPool, cls).__new__(cls)
+        return cls._instance
+
+    @property
+    def capacity(self) -> int:
+        """Jobs allowed in flight: one per worker plus the waiting queue"""
+        return settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_QUEUE_DEPTH
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def start(self):
+        """Create the executor configured in settings"""
+        if self._executor is not None:
+            return
+        workers = max(1, settings.PASSWORD_HASH_WORKERS)
+        if settings.PASSWORD_HASH_EXECUTOR == "thread":
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        else:
+            # spawn avoids forking a parent that already runs driver threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        logger.info(f"Password hashing pool started: {settings.PASSWORD_HASH_EXECUTOR} x {workers}")
+
+    async def run(self, func, *args):
+        """Run func(*args) in the pool, failing fast with 503 when saturated"""
+        if self._pending >= self.capacity:
+            logger.warning("Password hashing queue saturated")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server busy, please retry",
+                headers={"Retry-After": str(settings.PASSWORD_HASH_RETRY_AFTER)}
+            )
+        if self._executor is None:
+            self.start()
+
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            self._pending -= 1
+
+    async def map(self, func, items: list, concurrency: int = None) -> list:
+        """[func(item) for item in items] in the pool, for bulk work
+
+        Keeps at most `concurrency` jobs (default: one per worker) in the
+        pool at a time and waits instead of failing fast, so logins arriving
+        meanwhile queue behind a handful of jobs, not the whole batch.
+        """
+        if self._executor is None:
+            self.start()
+        limit = asyncio.Semaphore(max(1, concurrency or settings.PASSWORD_HASH_WORKERS))
+        loop = asyncio.get_running_loop()
+
+        async def run_one(item):
+            async with limit:
+                self._pending += 1
+                try:
+                    return await loop.run_in_executor(self._executor, func, item)
+                finally:
+                    self._pending -= 1
+
+        return await asyncio.gather(*(run_one(item) for item in items))
+
+    def shutdown(self):
+        """Stop the workers"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+            logger.info("Password hashing pool stopped")
+
+    def _forget_executor(self):
+        """A forked child cannot use the parent's workers; start afresh"""
+        self._executor = None
+        self._pending = 0
+
+# Global hashing pool
+hashing_pool = HashingPool()
+os.register_at_fork(after_in_child=hashing_pool._forget_executor)
@@ -1,13 +1,20 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from contextlib import asynccontextmanager
+import asyncio
 import logging
 from config import settings
 from database import db_instance
+from hashing import hashing_pool
 from routes.user import user_router
 from routes.admin import admin_router
-from services.admin import create_default_admin
+from bootstrap import run_bootstrap
+from services.ingest import ingest_queue
+from services.events import activity_events
+from services.archive import activity_archiver
+from metrics import MetricsMiddleware, monitor_event_loop, render_metrics
+from admission import AdmissionMiddleware
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -17,8 +24,16 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     # Startup
     try:
-        db_instance.connect()
-        await create_default_admin()
+        await db_instance.connect()
+        hashing_pool.start()
+        # Migrations and the default admin, serialized across workers
+        # (already done by the gunicorn master when it sets this false)
+        if settings.BOOTSTRAP_IN_WORKERS:
+            await run_bootstrap()
+        ingest_queue.start()
+        activity_events.start()
+        activity_archiver.start()
+        loop_monitor = asyncio.create_task(monitor_event_loop())
         logger.info("Application startup completed")
     except Exception as e:
         logger.error(f"Startup failed: {e}")
@@ -27,6 +42,11 @@ async def lifespan(app: FastAPI):
     yield
     
     # Shutdown
+    loop_monitor.cancel()
+    await activity_events.stop()
+    await activity_archiver.stop()
+    await ingest_queue.drain()
+    hashing_pool.shutdown()
     db_instance.close()
     logger.info("Application shutdown completed")
 
@@ -37,6 +57,9 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Per-route-class concurrency limits; inside CORS so 503s carry CORS headers
+app.add_middleware(AdmissionMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -47,6 +70,9 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+# Per-route latency and status metrics
+app.add_middleware(MetricsMiddleware)
+
 # Global exception handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -61,10 +87,23 @@ async def global_exception_handler(request: Request, exc: Exception):
 async def health_check():
     return {"status": "healthy", "message": "API is running"}
 
+# Prometheus scrape endpoint
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 # Include routers
 app.include_router(user_router, prefix="/api/v1", tags=["users"])
 app.include_router(admin_router, prefix="/api/v1", tags=["admin"])
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Each worker imports the app and creates its own Mongo client
+    uvicorn.run(
+        "main:app",
+        host=settings.SERVER_HOST,
+        port=settings.SERVER_PORT,
+        workers=settings.SERVER_WORKERS,
+        forwarded_allow_ips=settings.FORWARDED_ALLOW_IPS
+    )
\ No newline at end of file
@@ -0,0 +1,251 @@
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+)
+from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily
+from pymongo import monitoring
+from contextlib import contextmanager
+import asyncio
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route",
+    ["method", "route"], buckets=LATENCY_BUCKETS
+)
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP responses by route and status",
+    ["method", "route", "status"]
+)
+MONGO_COMMAND_DURATION = Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency by collection and command",
+    ["collection", "command"], buckets=LATENCY_BUCKETS
+)
+MONGO_COMMANDS = Counter(
+    "mongo_commands_total", "MongoDB commands by collection, command and outcome",
+    ["collection", "command", "outcome"]
+)
+MONGO_POOL_CHECKED_OUT = Gauge(
+    "mongo_pool_checked_out_connections", "Connections currently checked out of the pool",
+    ["address"]
+)
+MONGO_POOL_OPEN = Gauge(
+    "mongo_pool_open_connections", "Connections currently open in the pool",
+    ["address"]
+)
+MONGO_POOL_CHECKOUT_FAILURES = Counter(
+    "mongo_pool_checkout_failures_total", "Connection check-outs that failed, by reason",
+    ["address", "reason"]
+)
+MONGO_POOL_CLEARED = Counter(
+    "mongo_pool_cleared_total", "Times the pool was cleared after a server or network error",
+    ["address"]
+)
+PASSWORD_HASH_DURATION = Histogram(
+    "password_hash_duration_seconds", "bcrypt latency including pool queueing",
+    ["operation"], buckets=LATENCY_BUCKETS
+)
+LOGIN_RATE_LIMITED = Counter(
+    "login_rate_limited_total", "Login attempts refused by the limiter before password verification",
+    ["scope"]
+)
+ADMISSION_QUEUE_WAIT = Histogram(
+    "admission_queue_wait_seconds", "Time requests waited for a slot in their route class",
+    ["route_class"], buckets=LATENCY_BUCKETS
+)
+ADMISSION_REJECTED = Counter(
+    "admission_rejected_total", "Requests shed with 503 by route class and reason",
+    ["route_class", "reason"]
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    "admission_in_flight_requests", "Requests holding a slot in their route class",
+    ["route_class"]
+)
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "Delay between a scheduled wakeup and when the loop ran it",
+    buckets=LATENCY_BUCKETS
+)
+
+@contextmanager
+def time_histogram(histogram, *labels):
+    """Observe the duration of the with-block"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(*labels).observe(time.perf_counter() - started)
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Per-collection, per-command timings from the driver's command events"""
+
+    def __init__(self):
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = "-"
+        with self._lock:
+            self._collections[(event.connection_id, event.request_id)] = collection
+
+    def _finish(self, event, outcome):
+        with self._lock:
+            collection = self._collections.pop((event.connection_id, event.request_id), "-")
+        MONGO_COMMAND_DURATION.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+        MONGO_COMMANDS.labels(collection, event.command_name, outcome).inc()
+
+    def succeeded(self, event):
+        self._finish(event, "ok")
+
+    def failed(self, event):
+        self._finish(event, "error")
+
+class MongoPoolListener(monitoring.ConnectionPoolListener):
+    """Per-server pool counters, exported as metrics and via stats()"""
+
+    def __init__(self):
+        self._servers = {}
+        self._lock = threading.Lock()
+
+    def _address(self, event):
+        host, port = event.address
+        return f"{host}:{port}"
+
+    def _update(self, event, field, delta):
+        address = self._address(event)
+        with self._lock:
+            server = self._servers.setdefault(address, {
+                "open": 0, "checked_out": 0, "created": 0, "checkout_failures": 0, "cleared": 0
+            })
+            server[field] += delta
+        return address
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {address: dict(server) for address, server in self._servers.items()}
+
+    def connection_created(self, event):
+        MONGO_POOL_OPEN.labels(self._update(event, "open", 1)).inc()
+        self._update(event, "created", 1)
+
+    def connection_closed(self, event):
+        MONGO_POOL_OPEN.labels(self._update(event, "open", -1)).dec()
+
+    def connection_checked_out(self, event):
+        MONGO_POOL_CHECKED_OUT.labels(self._update(event, "checked_out", 1)).inc()
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_CHECKED_OUT.labels(self._update(event, "checked_out", -1)).dec()
+
+    def connection_check_out_failed(self, event):
+        address = self._update(event, "checkout_failures", 1)
+        MONGO_POOL_CHECKOUT_FAILURES.labels(address, str(event.reason)).inc()
+
+    def pool_cleared(self, event):
+        MONGO_POOL_CLEARED.labels(self._update(event, "cleared", 1)).inc()
+
+    # Remaining pool events are not tracked
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+# Shared by every client this process creates
+mongo_pool_listener = MongoPoolListener()
+
+def mongo_event_listeners() -> list:
+    """Listeners to pass to the Mongo client"""
+    return [MongoCommandListener(), mongo_pool_listener]
+
+class AppStatsCollector:
+    """Exposes in-process counters (user cache, ingest queue, live feed) at scrape time"""
+
+    def _families(self, cache_stats: dict, ingest_stats: dict, stream_stats: dict):
+        yield CounterMetricFamily("user_cache_hits", "Authenticated user cache hits", value=cache_stats["hits"])
+        yield CounterMetricFamily("user_cache_misses", "Authenticated user cache misses", value=cache_stats["misses"])
+        yield GaugeMetricFamily("user_cache_size", "Users currently cached", value=cache_stats["size"])
+        yield GaugeMetricFamily("sop_ingest_queue_depth", "SOP activities waiting to be flushed", value=ingest_stats["depth"])
+        yield CounterMetricFamily("sop_ingest_written", "SOP activity writes flushed", value=ingest_stats["written"])
+        yield CounterMetricFamily("sop_ingest_rejected", "SOP activities rejected with 429", value=ingest_stats["rejected"])
+        yield GaugeMetricFamily("sop_stream_subscribers", "Open live activity feed streams", value=stream_stats["subscribers"])
+        yield CounterMetricFamily("sop_stream_published", "Activity events fanned out to the live feed", value=stream_stats["published"])
+
+    def describe(self):
+        # Called at registration, before the modules below can be imported
+        empty = {"hits": 0, "misses": 0, "size": 0, "depth": 0, "written": 0, "rejected": 0, "subscribers": 0, "published": 0}
+        return list(self._families(empty, empty, empty))
+
+    def collect(self):
+        from cache import user_cache
+        from services.ingest import ingest_queue
+        from services.events import activity_events
+
+        yield from self._families(user_cache.stats(), ingest_queue.stats(), activity_events.stats())
+
+REGISTRY.register(AppStatsCollector())
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and status per route template"""
+
+    def __init__(self, app):
+        self.app = app
+        self._routes = None
+
+    def _route_label(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if self._routes is None:
+            app = scope.get("app")
+            self._routes = {
+                getattr(route, "endpoint", None): route.path for route in getattr(app, "routes", [])
+            }
+        return self._routes.get(endpoint, "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = self._route_label(scope)
+            HTTP_REQUEST_DURATION.labels(scope["method"], route).observe(time.perf_counter() - started)
+            HTTP_REQUESTS.labels(scope["method"], route, str(status_code)).inc()
+
+async def monitor_event_loop(interval: float = 0.5):
+    """Sample event-loop lag until cancelled"""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - expected))
+
+def render_metrics() -> tuple:
+    """Body and content type for the /metrics endpoint"""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
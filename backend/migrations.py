@@ -0,0 +1,273 @@
+"""Versioned schema migrations, applied at startup from main.lifespan.
+
+Usage:
+    python migrations.py                          # apply pending migrations
+    python migrations.py --check                  # explain() every route query shape, fail on COLLSCAN
+    python migrations.py --set-aside-duplicates   # rename and deactivate duplicate users (see migration 1)
+"""
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import DuplicateKeyError
+from bson import ObjectId
+from datetime import datetime, timedelta
+from database import get_db
+from services.rollups import ROLLUP_COLLECTION, rebuild_rollups, rollup_window_start
+from services.sop import activity_key, activity_filter
+from pagination import (
+    ACTIVITY_SORT, USER_SORT, activity_keyset, activity_cursor, user_keyset, user_cursor, with_keyset
+)
+from ratelimit import RATE_LIMIT_COLLECTION
+from services.versions import USER_CHANGES_COLLECTION, bump_users_version, user_scope
+import asyncio
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_COLLECTION = "schema_migrations"
+
+async def duplicate_user_groups(users, field: str) -> list:
+    """[(value, [_id, ...] oldest first)] for every value of field held by several users"""
+    groups = users.aggregate([
+        {"$sort": {"_id": 1}},
+        {"$group": {"_id": f"${field}", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}, "_id": {"$ne": None}}}
+    ], allowDiskUse=True)
+    return [(group["_id"], group["ids"]) async for group in groups]
+
+async def duplicate_user_report(users) -> list:
+    """One line per username/email held by several users; empty when there are none"""
+    lines = []
+    for field in ("username", "email"):
+        for value, ids in await duplicate_user_groups(users, field):
+            lines.append(f"{field} {value!r}: {', '.join(str(user_id) for user_id in ids)}")
+    return lines
+
+async def set_aside_duplicate_users(users) -> list:
+    """Rename and deactivate users whose username or email is already taken
+
+    Run on purpose (python migrations.py --set-aside-duplicates), never from
+    a migration. The oldest account keeps the value. Later ones get their
+    _id appended (username_<id>, local+<id>@domain) and are deactivated,
+    so the unique indexes can be built without deleting anyone; an admin
+    can merge or reactivate them afterwards. Returns the changed _ids.
+    """
+    changed = []
+    for field in ("username", "email"):
+        for _, ids in await duplicate_user_groups(users, field):
+            for user_id in ids[1:]:
+                user = await users.find_one({"_id": user_id}, {field: 1})
+                value = user[field]
+                if field == "username":
+                    value = f"{value[:25]}_{user_id}"
+                else:
+                    local, _, domain = value.partition("@")
+                    value = f"{local}+{user_id}@{domain}"
+                await users.update_one({"_id": user_id}, {"$set": {field: value, "is_active": False}})
+                logger.warning(f"Duplicate {field} on user {user_id}: renamed to {value} and deactivated")
+                changed.append(user_id)
+    if changed:
+        await bump_users_version(changed, *(user_scope(user_id) for user_id in changed))
+        logger.warning(f"Set aside {len(changed)} duplicate user accounts")
+    return changed
+
+async def create_core_indexes(db):
+    """Indexes backing the login, auth and SOP activity query shapes
+
+    Fails, changing nothing, while usernames or emails are duplicated: the
+    report lists them for an operator to resolve (or to set aside with
+    --set-aside-duplicates) before the next start.
+    """
+    duplicates = await duplicate_user_report(db["users"])
+    if duplicates:
+        for line in duplicates:
+            logger.error(f"Duplicate user {line}")
+        raise RuntimeError(
+            f"{len(duplicates)} duplicated usernames/emails block the unique user indexes: "
+            f"{'; '.join(duplicates[:20])}{' ...' if len(duplicates) > 20 else ''}. "
+            "Resolve them, or run `python migrations.py --set-aside-duplicates` to rename "
+            "and deactivate the newer accounts, then restart"
+        )
+    await db["users"].create_indexes([
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("role", ASCENDING)], name="role"),
+    ])
+    await db["sop_activities"].create_indexes([
+        IndexModel(
+            [("user_id", ASCENDING), ("sop_type", ASCENDING), ("task_id", ASCENDING)],
+            name="user_sop_task"
+        ),
+        IndexModel([("user_id", ASCENDING), ("completed_at", DESCENDING)], name="user_completed_at"),
+        IndexModel([("sop_type", ASCENDING), ("completed_at", DESCENDING)], name="sop_type_completed_at"),
+        IndexModel([("completed_at", DESCENDING)], name="completed_at"),
+    ])
+
+async def unique_activity_key(db):
+    """Collapse duplicate (user_id, sop_type, task_id) rows and enforce uniqueness"""
+    sop_collection = db["sop_activities"]
+    duplicates = sop_collection.aggregate([
+        {"$sort": {"completed_at": -1}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "sop_type": "$sop_type", "task_id": "$task_id"},
+            "ids": {"$push": "$_id"},
+            "count": {"$sum": 1}
+        }},
+        {"$match": {"count": {"$gt": 1}}}
+    ], allowDiskUse=True)
+    removed = 0
+    async for group in duplicates:
+        # Keep the most recent completion, drop the rest
+        result = await sop_collection.delete_many({"_id": {"$in": group["ids"][1:]}})
+        removed += result.deleted_count
+    if removed:
+        logger.info(f"Removed {removed} duplicate SOP activity rows")
+
+    if "user_sop_task" in await sop_collection.index_information():
+        await sop_collection.drop_index("user_sop_task")
+    await sop_collection.create_index(
+        [("user_id", ASCENDING), ("sop_type", ASCENDING), ("task_id", ASCENDING)],
+        name="user_sop_task_unique",
+        unique=True
+    )
+
+async def keyset_activity_indexes(db):
+    """Append _id to the completed_at indexes so keyset pages sort from the index"""
+    sop_collection = db["sop_activities"]
+    await sop_collection.create_indexes([
+        IndexModel([("user_id", ASCENDING), ("completed_at", DESCENDING), ("_id", DESCENDING)], name="user_completed_at_id"),
+        IndexModel([("sop_type", ASCENDING), ("completed_at", DESCENDING), ("_id", DESCENDING)], name="sop_type_completed_at_id"),
+        IndexModel([("completed_at", DESCENDING), ("_id", DESCENDING)], name="completed_at_id"),
+    ])
+    existing = await sop_collection.index_information()
+    for name in ("user_completed_at", "sop_type_completed_at", "completed_at"):
+        if name in existing:
+            await sop_collection.drop_index(name)
+
+async def daily_rollups(db):
+    """Create sop_daily_rollups indexes and backfill it from sop_activities"""
+    await db[ROLLUP_COLLECTION].create_indexes([
+        IndexModel(
+            [("user_id", ASCENDING), ("date", ASCENDING), ("sop_type", ASCENDING)],
+            name="user_date_sop_type_unique",
+            unique=True
+        ),
+        IndexModel([("date", ASCENDING), ("sop_type", ASCENDING)], name="date_sop_type"),
+    ])
+    await rebuild_rollups(db)
+
+async def rate_limit_ttl(db):
+    """Expire idle login rate-limit buckets (used by the mongo store)"""
+    await db[RATE_LIMIT_COLLECTION].create_index(
+        [("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0
+    )
+
+async def user_changes_ttl(db):
+    """Expire the user change log after a day; older gaps are rebuilt, not replayed"""
+    await db[USER_CHANGES_COLLECTION].create_index(
+        [("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=86400
+    )
+
+# (version, description, coroutine(db)); append only, never renumber
+MIGRATIONS = [
+    (1, "create core user and sop_activities indexes", create_core_indexes),
+    (2, "make (user_id, sop_type, task_id) unique on sop_activities", unique_activity_key),
+    (3, "add _id tie-breaker to completed_at indexes for keyset pagination", keyset_activity_indexes),
+    (4, "create and backfill sop_daily_rollups", daily_rollups),
+    (5, "add TTL index to rate_limits", rate_limit_ttl),
+    (6, "add TTL index to user_changes", user_changes_ttl),
+]
+
+async def run_migrations(db=None):
+    """Apply every migration whose version has not been recorded yet"""
+    db = db if db is not None else get_db()
+    applied_collection = db[MIGRATIONS_COLLECTION]
+    applied = {doc["_id"] async for doc in applied_collection.find({}, {"_id": 1})}
+
+    for version, description, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        logger.info(f"Applying migration {version}: {description}")
+        await migrate(db)
+        try:
+            await applied_collection.insert_one({
+                "_id": version,
+                "description": description,
+                "applied_at": datetime.utcnow()
+            })
+        except DuplicateKeyError:
+            # Another process recorded it first; migrations are idempotent
+            pass
+
+    logger.info("Schema migrations up to date")
+
+def query_shapes():
+    """Representative filters (and sorts) issued by the route handlers"""
+    user_id = ObjectId()
+    since = datetime.utcnow() - timedelta(days=30)
+    keyset = activity_keyset(activity_cursor({"completed_at": datetime.utcnow(), "_id": ObjectId()}))
+    day = rollup_window_start(30)
+    return [
+        ("users", "login / verify_token", {"username": "u"}, None),
+        ("users", "register duplicate check", {"$or": [{"email": "e@x.com"}, {"username": "u"}]}, None),
+        ("users", "email taken check", {"email": "e@x.com", "_id": {"$ne": user_id}}, None),
+        ("users", "default admin check", {"role": "admin"}, None),
+        ("users", "user list page", user_keyset(user_cursor({"_id": user_id})), USER_SORT),
+        ("sop_activities", "log activity lookup", activity_key(user_id, "gift_sop", "t"), None),
+        ("sop_activities", "user activities", {"user_id": user_id}, ACTIVITY_SORT),
+        ("sop_activities", "user activities by type", {"user_id": user_id, "sop_type": "gift_sop"}, ACTIVITY_SORT),
+        ("sop_activities", "user activities page", with_keyset({"user_id": user_id}, keyset), ACTIVITY_SORT),
+        ("sop_activities", "admin activities window", activity_filter(days=30), ACTIVITY_SORT),
+        ("sop_activities", "admin activities by type", activity_filter("gift_sop", days=30), ACTIVITY_SORT),
+        ("sop_activities", "admin activities by user", activity_filter(user_id=user_id, days=30), ACTIVITY_SORT),
+        ("sop_activities", "admin activities page", with_keyset(activity_filter(days=30), keyset), ACTIVITY_SORT),
+        ("sop_activities", "admin type page", with_keyset(activity_filter("gift_sop", days=30), keyset), ACTIVITY_SORT),
+        ("sop_activities", "archive batch", {"completed_at": {"$lt": since}}, [("completed_at", 1), ("_id", 1)]),
+        (ROLLUP_COLLECTION, "rollup upsert", {"date": day, "sop_type": "gift_sop", "user_id": user_id}, None),
+        (ROLLUP_COLLECTION, "summary lookup", {"user_id": user_id, "date": {"$gte": day}}, None),
+        (ROLLUP_COLLECTION, "summary lookup by type", {"user_id": user_id, "date": {"$gte": day}, "sop_type": "gift_sop"}, None),
+        (ROLLUP_COLLECTION, "daily totals", {"date": {"$gte": day}, "sop_type": "gift_sop"}, None),
+    ]
+
+def _plan_stages(plan):
+    """Yield every stage name in an explain() plan tree"""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _plan_stages(item)
+
+async def check_query_plans(db=None) -> list:
+    """Return the query shapes whose winning plan contains a COLLSCAN"""
+    db = db if db is not None else get_db()
+    failures = []
+    for collection, label, query, sort in query_shapes():
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.explain()
+        stages = set(_plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {})))
+        status = "COLLSCAN" if "COLLSCAN" in stages else "ok"
+        logger.info(f"{collection:<17} {label:<28} {status} {sorted(stages)}")
+        if status == "COLLSCAN":
+            failures.append((collection, label))
+    return failures
+
+async def _main(argv):
+    if "--check" in argv:
+        failures = await check_query_plans()
+        for collection, label in failures:
+            logger.error(f"COLLSCAN: {collection} / {label}")
+        return 1 if failures else 0
+    if "--set-aside-duplicates" in argv:
+        changed = await set_aside_duplicate_users(get_db()["users"])
+        logger.info(f"{len(changed)} duplicate users set aside")
+        return 0
+    await run_migrations()
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
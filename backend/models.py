@@ -81,6 +81,10 @@ class UserResponse(BaseModel):
     role: str
     is_active: bool
 
+class UserPage(BaseModel):
+    items: List[UserResponse]
+    next_cursor: Optional[str] = None
+
 class LoginUser(BaseModel):
     username: str
     password: str
@@ -131,6 +135,10 @@ class SOPActivityResponse(BaseModel):
     ip_address: Optional[str]
     user_agent: Optional[str]
 
+class SOPActivityPage(BaseModel):
+    items: List[SOPActivityResponse]
+    next_cursor: Optional[str] = None
+
 class SOPReport(BaseModel):
     user_id: str
     username: str
@@ -139,4 +147,4 @@ class SOPReport(BaseModel):
     completed_tasks: int
     completion_percentage: float
     last_activity: Optional[datetime]
-    activities: List[SOPActivityResponse]
\ No newline at end of file
+    activities: List[SOPActivityResponse] = []
\ No newline at end of file
@@ -0,0 +1,83 @@
+from fastapi import HTTPException, status
+from bson import ObjectId
+from datetime import datetime
+from typing import Optional
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Sort orders the cursors below are keyed on
+ACTIVITY_SORT = [("completed_at", -1), ("_id", -1)]
+USER_SORT = [("_id", 1)]
+
+def encode_cursor(values: dict) -> str:
+    """Opaque, URL-safe cursor for the given key values"""
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> dict:
+    """Inverse of encode_cursor; 400 on anything malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, dict) or not ObjectId.is_valid(values.get("id")):
+            raise ValueError("missing id")
+        return values
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def with_keyset(query: dict, keyset: Optional[dict]) -> dict:
+    """AND a keyset condition onto a base filter"""
+    if not keyset:
+        return query
+    if not query:
+        return keyset
+    return {"$and": [query, keyset]}
+
+def activity_keyset(cursor: Optional[str]) -> Optional[dict]:
+    """Filter for activities strictly after the cursor in ACTIVITY_SORT order"""
+    if not cursor:
+        return None
+    values = decode_cursor(cursor)
+    try:
+        completed_at = datetime.fromisoformat(values["t"])
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    last_id = ObjectId(values["id"])
+    return {"$or": [
+        {"completed_at": {"$lt": completed_at}},
+        {"completed_at": completed_at, "_id": {"$lt": last_id}}
+    ]}
+
+def activity_cursor(activity: dict) -> str:
+    return encode_cursor({"t": activity["completed_at"].isoformat(), "id": str(activity["_id"])})
+
+def user_keyset(cursor: Optional[str]) -> Optional[dict]:
+    """Filter for users strictly after the cursor in USER_SORT order"""
+    if not cursor:
+        return None
+    return {"_id": {"$gt": ObjectId(decode_cursor(cursor)["id"])}}
+
+def user_cursor(user: dict) -> str:
+    return encode_cursor({"id": str(user["_id"])})
+
+async def fetch_page(collection, query: dict, sort: list, limit: int, make_cursor,
+                     projection: dict = None) -> tuple:
+    """Fetch one page; returns (documents, next_cursor or None)
+
+    A projection must keep the sort keys, which make_cursor reads.
+    """
+    documents = await collection.find(query, projection).sort(sort).limit(limit + 1).to_list(length=limit + 1)
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = make_cursor(documents[-1])
+    return documents, next_cursor
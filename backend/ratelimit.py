@@ -0,0 +1,183 @@
+from collections import OrderedDict
+from fastapi import HTTPException, status
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from database import get_db
+from config import settings
+from metrics import LOGIN_RATE_LIMITED
+from datetime import datetime, timedelta
+import math
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_COLLECTION = "rate_limits"
+
+def refill_seconds(capacity: float, rate: float) -> float:
+    """Time for an empty bucket to refill; a day when it never refills"""
+    return capacity / rate if rate > 0 else 86400
+
+class MemoryBucketStore:
+    """Token buckets in this process (LRU-bounded); limits are per worker"""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+
+    def _refill(self, key: str, capacity: float, rate: float, now: float) -> float:
+        tokens, updated_at = self._buckets.get(key, (capacity, now))
+        return min(capacity, tokens + (now - updated_at) * rate)
+
+    def _store(self, key: str, tokens: float, now: float):
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+    async def take(self, key: str, capacity: float, rate: float, cost: float = 1) -> tuple:
+        """Debit cost if the bucket holds it; returns (taken, tokens left)"""
+        # No await between the read and the write, so this is atomic per worker
+        now = time.monotonic()
+        tokens = self._refill(key, capacity, rate, now)
+        taken = tokens >= cost
+        if taken:
+            tokens -= cost
+        self._store(key, tokens, now)
+        return taken, tokens
+
+    async def give_back(self, key: str, capacity: float, rate: float, cost: float = 1):
+        now = time.monotonic()
+        self._store(key, min(capacity, self._refill(key, capacity, rate, now) + cost), now)
+
+class MongoBucketStore:
+    """Token buckets in MongoDB, shared by every worker and host
+
+    take() refills and debits in one atomic pipeline update; idle buckets
+    are removed by the TTL index on expires_at.
+    """
+
+    def _collection(self):
+        return get_db()[RATE_LIMIT_COLLECTION]
+
+    @staticmethod
+    def _refilled(capacity: float, rate: float, now: float) -> dict:
+        return {"$min": [capacity, {"$add": [
+            {"$ifNull": ["$tokens", capacity]},
+            {"$multiply": [{"$subtract": [now, {"$ifNull": ["$updated_at", now]}]}, rate]}
+        ]}]}
+
+    async def _update(self, key: str, capacity: float, rate: float, tokens: dict, extra: dict = None) -> dict:
+        update = [{"$set": {
+            "tokens": tokens,
+            **(extra or {}),
+            "updated_at": time.time(),
+            # Long enough for an empty bucket to refill completely
+            "expires_at": datetime.utcnow() + timedelta(seconds=refill_seconds(capacity, rate))
+        }}]
+        try:
+            return await self._collection().find_one_and_update(
+                {"_id": key}, update, upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Lost the race to create the bucket; it exists now
+            return await self._collection().find_one_and_update(
+                {"_id": key}, update, return_document=ReturnDocument.AFTER
+            )
+
+    async def take(self, key: str, capacity: float, rate: float, cost: float = 1) -> tuple:
+        """Debit cost if the bucket holds it; returns (taken, tokens left)"""
+        refilled = self._refilled(capacity, rate, time.time())
+        taken = {"$gte": [refilled, cost]}
+        bucket = await self._update(
+            key, capacity, rate,
+            {"$cond": [taken, {"$subtract": [refilled, cost]}, refilled]},
+            {"taken": taken}
+        )
+        return bucket["taken"], bucket["tokens"]
+
+    async def give_back(self, key: str, capacity: float, rate: float, cost: float = 1):
+        refilled = self._refilled(capacity, rate, time.time())
+        await self._update(key, capacity, rate, {"$min": [capacity, {"$add": [refilled, cost]}]})
+
+def store_name() -> str:
+    """LOGIN_RATE_LIMIT_STORE with auto resolved"""
+    store = settings.LOGIN_RATE_LIMIT_STORE
+    if store == "auto":
+        return "mongo" if settings.SERVER_WORKERS > 1 else "memory"
+    return store
+
+def bucket_store():
+    """Store selected by LOGIN_RATE_LIMIT_STORE"""
+    if store_name() == "mongo":
+        return MongoBucketStore()
+    if settings.SERVER_WORKERS > 1:
+        logger.warning(
+            f"LOGIN_RATE_LIMIT_STORE=memory with {settings.SERVER_WORKERS} workers: each worker "
+            "keeps its own buckets, so the effective limits are multiplied; use mongo"
+        )
+    return MemoryBucketStore(settings.LOGIN_RATE_LIMIT_MAX_KEYS)
+
+class LoginRateLimiter:
+    """Throttles failed logins per username and per client IP
+
+    reserve() takes a token from both buckets before the password is
+    verified, so concurrent attempts cannot all pass a check while the
+    first ones are still hashing: at most `burst` attempts reach bcrypt.
+    A successful login gives its tokens back (release()), so only failures
+    drain the buckets.
+    """
+
+    def __init__(self, store=None):
+        self._store = store
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = bucket_store()
+        return self._store
+
+    @store.setter
+    def store(self, store):
+        self._store = store
+
+    def _buckets(self, username: str, ip_address: str) -> list:
+        """(scope, key, capacity, refill per second) for one attempt"""
+        buckets = [(
+            "username", f"login:user:{username.lower()}",
+            settings.LOGIN_USERNAME_BURST, settings.LOGIN_USERNAME_PER_MINUTE / 60
+        )]
+        if ip_address:
+            buckets.append((
+                "ip", f"login:ip:{ip_address}",
+                settings.LOGIN_IP_BURST, settings.LOGIN_IP_PER_MINUTE / 60
+            ))
+        return buckets
+
+    async def reserve(self, username: str, ip_address: str) -> list:
+        """Take one attempt from each bucket, or raise 429 (taking nothing)"""
+        if not settings.LOGIN_RATE_LIMIT_ENABLED:
+            return []
+        reserved = []
+        for scope, key, capacity, rate in self._buckets(username, ip_address):
+            taken, tokens = await self.store.take(key, capacity, rate)
+            if not taken:
+                await self.release(reserved)
+                # Counted, not logged: a flood would otherwise flood the logs
+                LOGIN_RATE_LIMITED.labels(scope).inc()
+                retry_after = math.ceil((1 - tokens) / rate) if rate > 0 else refill_seconds(capacity, rate)
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail=settings.LOGIN_RATE_LIMIT_DETAIL,
+                    headers={"Retry-After": str(max(1, int(retry_after)))}
+                )
+            reserved.append((key, capacity, rate))
+        return reserved
+
+    async def release(self, reserved: list):
+        """Return reserved attempts (the login succeeded or never ran)"""
+        for key, capacity, rate in reserved:
+            await self.store.give_back(key, capacity, rate)
+
+# Global login limiter
+login_limiter = LoginRateLimiter()
@@ -1,16 +1,34 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Request, UploadFile, File
+from typing import List, Union
 from bson import ObjectId
 from models import (
-    UserCreate, UserUpdate, UserResponse,
-    SOPActivityResponse, SOPReport
+    UserCreate, UserUpdate, UserResponse, UserPage,
+    SOPActivityResponse, SOPActivityPage, SOPReport
+)
+from database import get_user_collection, get_analytics_db, client_options
+from config import settings
+from auth import require_admin, get_password_hash_async
+from cache import user_cache
+from services.ingest import ingest_queue
+from metrics import mongo_pool_listener
+from admission import admission_stats
+from services.versions import USERS_SCOPE, user_scope, conditional_get, with_etag
+from services.sop import activity_filter, sop_summary_pipeline
+from services.events import activity_events, event_stream
+from services.user_search import user_search
+from services.user_bulk import USER_EXPORT_FORMATS, import_format, read_upload, import_users, export_cursor
+from services.reports import EXPORT_FORMATS, report_rows, gzip_stream, parquet_available
+from services.archive import archive_stats
+from serialization import (
+    USER_PROJECTION, ACTIVITY_PROJECTION, user_dict, activity_dict, page_dict, fast_json
+)
+from pagination import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, ACTIVITY_SORT, USER_SORT,
+    activity_keyset, activity_cursor, user_keyset, user_cursor,
+    with_keyset, fetch_page
 )
-from database import get_user_collection, get_sop_activity_collection
-from auth import require_admin, get_password_hash
 from fastapi.responses import StreamingResponse
-from datetime import datetime, timedelta
-import csv
-import io
+from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,22 +36,39 @@ admin_router = APIRouter()
 
 def user_serializer(user: dict) -> UserResponse:
     """Convert MongoDB document to UserResponse"""
-    return UserResponse(
-        id=str(user["_id"]),
-        username=user["username"],
-        name=user.get("name"),
-        email=user["email"],
-        role=user.get("role", "user"),
-        is_active=user.get("is_active", True)
-    )
+    return UserResponse(**user_dict(user))
 
-@admin_router.get("/admin/users", response_model=List[UserResponse])
-async def get_all_users(current_user: dict = Depends(require_admin)):
-    """Get all users (admin only)"""
+@admin_router.get("/admin/users", response_model=Union[UserPage, List[UserResponse]])
+async def get_all_users(
+    request: Request,
+    cursor: str = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    unbounded: bool = False,
+    current_user: dict = Depends(require_admin)
+):
+    """Get users, one page at a time (admin only)
+
+    unbounded=true returns the legacy full list and will be removed once the
+    frontend pages through results. Honours If-None-Match.
+    """
     try:
+        tag, not_modified = await conditional_get(request, USERS_SCOPE)
+        if not_modified:
+            return not_modified
+        
         user_collection = get_user_collection()
-        users = list(user_collection.find({}))
-        return [user_serializer(user) for user in users]
+        
+        if unbounded:
+            users = await user_collection.find({}, USER_PROJECTION).to_list(length=None)
+            return with_etag(fast_json([user_dict(user) for user in users]), tag)
+        
+        users, next_cursor = await fetch_page(
+            user_collection, with_keyset({}, user_keyset(cursor)), USER_SORT, limit, user_cursor,
+            projection=USER_PROJECTION
+        )
+        return with_etag(fast_json(page_dict([user_dict(user) for user in users], next_cursor)), tag)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Get users error: {e}")
         raise HTTPException(
@@ -51,7 +86,7 @@ async def create_user(
         user_collection = get_user_collection()
         
         # Check if user already exists
-        if user_collection.find_one({"$or": [{"email": user_data.email}, {"username": user_data.username}]}):
+        if await user_collection.find_one({"$or": [{"email": user_data.email}, {"username": user_data.username}]}):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="User with this email or username already exists"
@@ -62,12 +97,14 @@ async def create_user(
             "username": user_data.username,
             "name": user_data.name,
             "email": user_data.email,
-            "password": get_password_hash(user_data.password),
+            "password": await get_password_hash_async(user_data.password),
             "role": user_data.role,
             "is_active": True
         }
         
-        result = user_collection.insert_one(new_user)
+        result = await user_collection.insert_one(new_user)
+        await user_search.changed([result.inserted_id])
+        user_search.upsert(new_user)
         logger.info(f"User created by admin: {user_data.username}")
         
         return {"message": "User created successfully", "user_id": str(result.inserted_id)}
@@ -101,7 +138,7 @@ async def update_user(
         update_data = {}
         if user_data.username is not None:
             # Check if username is already taken
-            existing_user = user_collection.find_one({
+            existing_user = await user_collection.find_one({
                 "username": user_data.username,
                 "_id": {"$ne": ObjectId(user_id)}
             })
@@ -117,7 +154,7 @@ async def update_user(
         
         if user_data.email is not None:
             # Check if email is already taken
-            existing_user = user_collection.find_one({
+            existing_user = await user_collection.find_one({
                 "email": user_data.email,
                 "_id": {"$ne": ObjectId(user_id)}
             })
@@ -129,7 +166,7 @@ async def update_user(
             update_data["email"] = user_data.email
         
         if user_data.password is not None:
-            update_data["password"] = get_password_hash(user_data.password)
+            update_data["password"] = await get_password_hash_async(user_data.password)
         
         if user_data.role is not None:
             update_data["role"] = user_data.role
@@ -143,7 +180,7 @@ async def update_user(
                 detail="No fields provided for update"
             )
         
-        result = user_collection.update_one(
+        result = await user_collection.update_one(
             {"_id": ObjectId(user_id)},
             {"$set": update_data}
         )
@@ -154,6 +191,12 @@ async def update_user(
                 detail="User not found"
             )
         
+        # Same values as stored: nothing for other workers to pick up
+        if result.modified_count:
+            user_cache.invalidate_id(user_id)
+            await user_search.changed([ObjectId(user_id)], user_scope(user_id))
+            user_search.update(ObjectId(user_id), update_data)
+        
         logger.info(f"User updated by admin: {user_id}")
         return {"message": "User updated successfully"}
     
@@ -187,14 +230,17 @@ async def delete_user(
             )
         
         user_collection = get_user_collection()
-        result = user_collection.delete_one({"_id": ObjectId(user_id)})
-        
+        result = await user_collection.delete_one({"_id": ObjectId(user_id)})
         if result.deleted_count == 0:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User not found"
             )
         
+        user_cache.invalidate_id(user_id)
+        await user_search.changed([ObjectId(user_id)], user_scope(user_id))
+        user_search.remove(ObjectId(user_id))
+        
         logger.info(f"User deleted by admin: {user_id}")
         return {"message": "User deleted successfully"}
     
@@ -207,6 +253,116 @@ async def delete_user(
             detail="Failed to delete user"
         )
 
+@admin_router.post("/admin/users/import", response_model=dict)
+async def import_users_file(
+    file: UploadFile = File(...),
+    format: str = Query(None, pattern="^(csv|ndjson)$"),
+    current_user: dict = Depends(require_admin)
+):
+    """Create or update users from a CSV or NDJSON upload (admin only)
+
+    Columns/keys: username, email, password, name, role. Rows with an id
+    (as /admin/users/export writes them) update that user and may also set
+    is_active; the password is only required for new users. Valid rows are
+    applied even when others fail; the response lists each failed row.
+    format defaults to the file extension.
+    """
+    try:
+        format = import_format(format, file.filename, file.content_type)
+        data = await read_upload(file, settings.USER_IMPORT_MAX_BYTES)
+        report, created, updated = await import_users(data, format)
+        
+        for user in updated:
+            user_cache.invalidate_id(user["_id"])
+        if created or updated:
+            await user_search.changed(
+                [user["_id"] for user in created + updated],
+                *(user_scope(user["_id"]) for user in updated)
+            )
+            for user in created:
+                user_search.upsert(user)
+            for user in updated:
+                user_search.update(user["_id"], user)
+        logger.info(
+            f"Users imported by admin: {report['created']} created, {report['updated']} updated, "
+            f"{report['failed']} failed"
+        )
+        
+        return report
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Import users error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to import users"
+        )
+
+@admin_router.get("/admin/users/export")
+async def export_users(
+    format: str = "csv",
+    gzip: bool = False,
+    current_user: dict = Depends(require_admin)
+):
+    """Download every user (no password hashes), streamed from the database (admin only)"""
+    try:
+        export = USER_EXPORT_FORMATS.get(format.lower())
+        if export is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unsupported format. Use one of: {', '.join(USER_EXPORT_FORMATS)}"
+            )
+        stream_format, media_type = export
+        
+        body = stream_format(export_cursor())
+        filename = f"users_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{format.lower()}"
+        
+        if gzip:
+            body = gzip_stream(body)
+            media_type = "application/gzip"
+            filename += ".gz"
+        
+        return StreamingResponse(
+            body,
+            media_type=media_type,
+            headers={"Content-Disposition": f"attachment; filename={filename}"}
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Export users error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to export users"
+        )
+
+@admin_router.get("/admin/users/search", response_model=List[UserResponse])
+async def search_users(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(require_admin)
+):
+    """Search users by username, email or name, best matches first (admin only)
+
+    Prefix and substring matches from the in-process index; queries shorter
+    than three characters match prefixes only.
+    """
+    try:
+        return fast_json(await user_search.search(q, limit))
+    except Exception as e:
+        logger.error(f"Search users error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to search users"
+        )
+
+@admin_router.get("/admin/search/stats", response_model=dict)
+async def get_search_stats(current_user: dict = Depends(require_admin)):
+    """Get this worker's user search index size and rebuilds (admin only)"""
+    return {"user_search": user_search.stats()}
+
 @admin_router.get("/admin/users/{user_id}", response_model=UserResponse)
 async def get_user_by_id(
     user_id: str,
@@ -221,7 +377,7 @@ async def get_user_by_id(
             )
         
         user_collection = get_user_collection()
-        user = user_collection.find_one({"_id": ObjectId(user_id)})
+        user = await user_collection.find_one({"_id": ObjectId(user_id)})
         
         if not user:
             raise HTTPException(
@@ -239,46 +395,70 @@ async def get_user_by_id(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to retrieve user")
 
-@admin_router.get("/admin/sop/activities", response_model=List[SOPActivityResponse])
+@admin_router.get("/admin/cache/stats", response_model=dict)
+async def get_cache_stats(current_user: dict = Depends(require_admin)):
+    """Get authenticated-user cache counters (admin only)"""
+    return {"user_cache": user_cache.stats()}
+
+@admin_router.get("/admin/ingest/stats", response_model=dict)
+async def get_ingest_stats(current_user: dict = Depends(require_admin)):
+    """Get write-behind activity queue depth and flush latency (admin only)"""
+    return {"ingest_queue": ingest_queue.stats()}
+
+@admin_router.get("/admin/admission/stats", response_model=dict)
+async def get_admission_stats(request: Request, current_user: dict = Depends(require_admin)):
+    """Get this worker's per-route-class slots, queues and shed counts (admin only)"""
+    return {"route_classes": admission_stats(request.app)}
+
+@admin_router.get("/admin/archive/stats", response_model=dict)
+async def get_archive_stats(current_user: dict = Depends(require_admin)):
+    """Get the SOP activity archive horizon and archived months (admin only)"""
+    return {"sop_archive": archive_stats()}
+
+@admin_router.get("/admin/db/pool", response_model=dict)
+async def get_db_pool_stats(current_user: dict = Depends(require_admin)):
+    """Get this worker's Mongo connection pool settings and counters (admin only)"""
+    options = client_options()
+    options["read_preference"] = options["read_preference"].mongos_mode
+    options["analytics_read_preference"] = settings.MONGO_ANALYTICS_READ_PREFERENCE
+    return {"settings": options, "servers": mongo_pool_listener.stats()}
+
+@admin_router.get("/admin/sop/activities", response_model=Union[SOPActivityPage, List[SOPActivityResponse]])
 async def get_all_sop_activities(
     sop_type: str = None,
     user_id: str = None,
     days: int = 30,
+    cursor: str = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    unbounded: bool = False,
     current_user: dict = Depends(require_admin)
 ):
-    """Get all SOP activities (admin only)"""
+    """Get SOP activities, newest first, one page at a time (admin only)
+
+    unbounded=true returns the legacy full list and will be removed once the
+    frontend pages through results.
+    """
     try:
-        sop_collection = get_sop_activity_collection()
-        
-        # Build query
-        query = {}
-        if sop_type:
-            query["sop_type"] = sop_type
-        if user_id and ObjectId.is_valid(user_id):
-            query["user_id"] = ObjectId(user_id)
-        
-        # Filter by date range
-        if days > 0:
-            start_date = datetime.utcnow() - timedelta(days=days)
-            query["completed_at"] = {"$gte": start_date}
-        
-        activities = list(sop_collection.find(query).sort("completed_at", -1))
-        
-        return [
-            SOPActivityResponse(
-                id=str(activity["_id"]),
-                user_id=str(activity["user_id"]),
-                username=activity["username"],
-                sop_type=activity["sop_type"],
-                task_id=activity["task_id"],
-                task_description=activity["task_description"],
-                completed_at=activity["completed_at"],
-                ip_address=activity.get("ip_address"),
-                user_agent=activity.get("user_agent")
-            )
-            for activity in activities
-        ]
+        sop_collection = get_analytics_db()["sop_activities"]
+        
+        query = activity_filter(
+            sop_type=sop_type,
+            user_id=ObjectId(user_id) if user_id and ObjectId.is_valid(user_id) else None,
+            days=days
+        )
+        
+        if unbounded:
+            activities = await sop_collection.find(query, ACTIVITY_PROJECTION).sort("completed_at", -1).to_list(length=None)
+            return fast_json([activity_dict(activity) for activity in activities])
+        
+        activities, next_cursor = await fetch_page(
+            sop_collection, with_keyset(query, activity_keyset(cursor)), ACTIVITY_SORT, limit, activity_cursor,
+            projection=ACTIVITY_PROJECTION
+        )
+        return fast_json(page_dict([activity_dict(activity) for activity in activities], next_cursor))
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Get all SOP activities error: {e}")
         raise HTTPException(
@@ -292,68 +472,51 @@ async def download_sop_report(
     user_id: str = None,
     days: int = 30,
     format: str = "csv",
+    gzip: bool = False,
     current_user: dict = Depends(require_admin)
 ):
-    """Download SOP activity report (admin only)"""
+    """Download SOP activity report, streamed from the database (admin only)
+
+    format is csv, ndjson or parquet; gzip=true compresses csv/ndjson on the
+    fly (parquet is already zstd-compressed per column chunk). Windows that
+    reach past the archive horizon include archived rows after the live ones.
+    """
     try:
-        sop_collection = get_sop_activity_collection()
-        user_collection = get_user_collection()
+        export = EXPORT_FORMATS.get(format.lower())
+        if export is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unsupported format. Use one of: {', '.join(EXPORT_FORMATS)}"
+            )
+        stream_format, media_type, extension, compressible = export
+        if extension == "parquet" and not parquet_available():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Parquet export is not available on this server"
+            )
         
-        # Build query
-        query = {}
-        if sop_type:
-            query["sop_type"] = sop_type
-        if user_id and ObjectId.is_valid(user_id):
-            query["user_id"] = ObjectId(user_id)
+        query = activity_filter(
+            sop_type=sop_type,
+            user_id=ObjectId(user_id) if user_id and ObjectId.is_valid(user_id) else None,
+            days=days
+        )
         
-        # Filter by date range
-        if days > 0:
-            start_date = datetime.utcnow() - timedelta(days=days)
-            query["completed_at"] = {"$gte": start_date}
+        body = stream_format(report_rows(query))
         
-        activities = list(sop_collection.find(query).sort("completed_at", -1))
+        # Generate filename
+        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+        filename = f"sop_report_{timestamp}.{extension}"
         
-        if format.lower() == "csv":
-            # Create CSV report
-            output = io.StringIO()
-            writer = csv.writer(output)
-            
-            # Write header
-            writer.writerow([
-                "User ID", "Username", "SOP Type", "Task ID", 
-                "Task Description", "Completed At", "IP Address", "User Agent"
-            ])
-            
-            # Write data
-            for activity in activities:
-                writer.writerow([
-                    str(activity["user_id"]),
-                    activity["username"],
-                    activity["sop_type"],
-                    activity["task_id"],
-                    activity["task_description"],
-                    activity["completed_at"].strftime("%Y-%m-%d %H:%M:%S"),
-                    activity.get("ip_address", ""),
-                    activity.get("user_agent", "")
-                ])
-            
-            output.seek(0)
-            
-            # Generate filename
-            timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-            filename = f"sop_report_{timestamp}.csv"
-            
-            return StreamingResponse(
-                io.BytesIO(output.getvalue().encode()),
-                media_type="text/csv",
-                headers={"Content-Disposition": f"attachment; filename={filename}"}
-            )
+        if gzip and compressible:
+            body = gzip_stream(body)
+            media_type = "application/gzip"
+            filename += ".gz"
         
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Unsupported format. Use 'csv'"
-            )
+        return StreamingResponse(
+            body,
+            media_type=media_type,
+            headers={"Content-Disposition": f"attachment; filename={filename}"}
+        )
     
     except HTTPException:
         raise
@@ -364,75 +527,76 @@ async def download_sop_report(
             detail="Failed to generate report"
         )
 
+@admin_router.get("/admin/sop/stream")
+async def stream_sop_activities(
+    request: Request,
+    sop_type: str = None,
+    current_user: dict = Depends(require_admin)
+):
+    """Live feed of recorded SOP activities as Server-Sent Events (admin only)
+
+    Sends an "activity" event per write; a client reconnecting with
+    Last-Event-ID gets the events it missed, or a "reset" event when it
+    should reload the summary instead.
+    """
+    subscription = activity_events.subscribe(
+        sop_type=sop_type,
+        last_event_id=request.headers.get("last-event-id")
+    )
+    return StreamingResponse(
+        event_stream(activity_events, subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@admin_router.get("/admin/stream/stats", response_model=dict)
+async def get_sop_stream_stats(current_user: dict = Depends(require_admin)):
+    """Get this worker's live-feed source, subscribers and replay buffer (admin only)"""
+    return {"sop_stream": activity_events.stats()}
+
 @admin_router.get("/admin/sop/summary", response_model=List[SOPReport])
 async def get_sop_summary(
     sop_type: str = None,
     days: int = 30,
+    include_activities: bool = False,
+    activities_limit: int = Query(50, ge=1, le=1000),
     current_user: dict = Depends(require_admin)
 ):
     """Get SOP completion summary by user (admin only)"""
     try:
-        sop_collection = get_sop_activity_collection()
-        user_collection = get_user_collection()
-        
-        # Get all users
-        users = list(user_collection.find({}))
+        user_collection = get_analytics_db()["users"]
         
-        # Build date filter
-        date_filter = {}
-        if days > 0:
-            start_date = datetime.utcnow() - timedelta(days=days)
-            date_filter = {"completed_at": {"$gte": start_date}}
+        pipeline = sop_summary_pipeline(
+            sop_type=sop_type,
+            days=days,
+            include_activities=include_activities,
+            activities_limit=activities_limit
+        )
         
         reports = []
-        
-        for user in users:
-            query = {"user_id": user["_id"]}
-            if sop_type:
-                query["sop_type"] = sop_type
-            query.update(date_filter)
-            
-            activities = list(sop_collection.find(query).sort("completed_at", -1))
-            
-            # Calculate statistics
-            total_tasks = len(set(activity["task_id"] for activity in activities))
-            last_activity = activities[0]["completed_at"] if activities else None
+        async for row in user_collection.aggregate(pipeline):
+            total_tasks = row["total_tasks"]
             
             # For now, assume 100% completion if any tasks are done
             # In a real scenario, you'd define the total expected tasks per SOP
             completion_percentage = 100.0 if total_tasks > 0 else 0.0
             
-            activity_responses = [
-                SOPActivityResponse(
-                    id=str(activity["_id"]),
-                    user_id=str(activity["user_id"]),
-                    username=activity["username"],
-                    sop_type=activity["sop_type"],
-                    task_id=activity["task_id"],
-                    task_description=activity["task_description"],
-                    completed_at=activity["completed_at"],
-                    ip_address=activity.get("ip_address"),
-                    user_agent=activity.get("user_agent")
-                )
-                for activity in activities
-            ]
-            
-            reports.append(SOPReport(
-                user_id=str(user["_id"]),
-                username=user["username"],
-                sop_type=sop_type or "all",
-                total_tasks=total_tasks,
-                completed_tasks=total_tasks,
-                completion_percentage=completion_percentage,
-                last_activity=last_activity,
-                activities=activity_responses
-            ))
-        
-        return reports
+            reports.append({
+                "user_id": str(row["_id"]),
+                "username": row["username"],
+                "sop_type": sop_type or "all",
+                "total_tasks": total_tasks,
+                "completed_tasks": total_tasks,
+                "completion_percentage": completion_percentage,
+                "last_activity": row.get("last_activity"),
+                "activities": [activity_dict(activity) for activity in row.get("activities", [])]
+            })
+        
+        return fast_json(reports)
     
     except Exception as e:
         logger.error(f"Get SOP summary error: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to generate SOP summary"
-        )
\ No newline at end of file
+        )
@@ -1,19 +1,32 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Form , Request
+from fastapi import APIRouter, HTTPException, status, Depends, Form , Request, Query
 from datetime import timedelta , datetime
 from models import (
     UserCreate, UserResponse, LoginUser, LoginResponse, Token,
-    SOPActivityCreate, SOPActivityResponse
+    SOPActivityCreate, SOPActivityResponse, SOPActivityPage
 )
 from database import get_user_collection, get_sop_activity_collection
 from auth import (
-    verify_password, 
-    get_password_hash, 
+    verify_password_async,
+    get_password_hash_async,
     create_access_token,
     get_current_active_user
 )
 from config import settings
+from cache import user_cache
+from services.sop import record_activity, record_activities, request_client_info, activity_upsert
+from services.ingest import ingest_queue
+from ratelimit import login_limiter
+from services.user_search import user_search
+from serialization import USER_PROJECTION, ACTIVITY_PROJECTION, user_dict, activity_dict, page_dict, fast_json
+from services.versions import (
+    user_scope, user_activity_scope, conditional_get, with_etag
+)
+from pagination import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, ACTIVITY_SORT,
+    activity_keyset, activity_cursor, with_keyset, fetch_page
+)
 from bson import ObjectId
-from typing import Optional, Annotated, List
+from typing import Optional, Annotated, List, Union
 import logging
 
 logger = logging.getLogger(__name__)
@@ -31,7 +44,7 @@ async def register_user(
         user_collection = get_user_collection()
         
         # Check if user already exists
-        if user_collection.find_one({"$or": [{"email": email}, {"username": username}]}):
+        if await user_collection.find_one({"$or": [{"email": email}, {"username": username}]}):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="User with this email or username already exists"
@@ -42,12 +55,14 @@ async def register_user(
             "username": username,
             "email": email,
             "name": name,
-            "password": get_password_hash(password),
+            "password": await get_password_hash_async(password),
             "role": "user",
             "is_active": True
         }
         
-        result = user_collection.insert_one(user_data)
+        result = await user_collection.insert_one(user_data)
+        await user_search.changed([result.inserted_id])
+        user_search.upsert(user_data)
         logger.info(f"User registered: {username}")
         
         return {"message": "User registered successfully", "user_id": str(result.inserted_id)}
@@ -62,19 +77,30 @@ async def register_user(
         )
 
 @user_router.post("/login", response_model=LoginResponse)
-async def login(user_data: LoginUser):
+async def login(user_data: LoginUser, request: Request):
     """Authenticate user and return JWT token"""
     try:
         logger.info(f"Login attempt for user: {user_data.username}")
-        user_collection = get_user_collection()
-        user = user_collection.find_one({"username": user_data.username})
+        ip_address = request.client.host if request.client else None
+        # Take an attempt before any bcrypt work; refused once the buckets are empty
+        reserved = await login_limiter.reserve(user_data.username, ip_address)
         
-        if not user or not verify_password(user_data.password, user["password"]):
+        try:
+            user_collection = get_user_collection()
+            user = await user_collection.find_one({"username": user_data.username})
+            verified = bool(user) and await verify_password_async(user_data.password, user["password"])
+        except Exception:
+            # Not a failed password; don't charge the attempt
+            await login_limiter.release(reserved)
+            raise
+        
+        if not verified:
             logger.warning(f"Failed login attempt for user: {user_data.username}")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid username or password"
             )
+        await login_limiter.release(reserved)
         
         if not user.get("is_active", True):
             raise HTTPException(
@@ -116,16 +142,16 @@ async def login(user_data: LoginUser):
         )
 
 @user_router.get("/profile", response_model=UserResponse)
-async def get_profile(current_user: dict = Depends(get_current_active_user)):
-    """Get current user profile"""
-    return UserResponse(
-        id=str(current_user["_id"]),
-        username=current_user["username"],
-        name=current_user.get("name"),
-        email=current_user["email"],
-        role=current_user.get("role", "user"),
-        is_active=current_user.get("is_active", True)
-    )
+async def get_profile(request: Request, current_user: dict = Depends(get_current_active_user)):
+    """Get current user profile; honours If-None-Match"""
+    tag, not_modified = await conditional_get(request, user_scope(current_user["_id"]))
+    if not_modified:
+        return not_modified
+    
+    # Read the stored document rather than the auth cache so the body
+    # matches the version in the ETag
+    user = await get_user_collection().find_one({"_id": current_user["_id"]}, USER_PROJECTION)
+    return with_etag(fast_json(user_dict(user or current_user)), tag)
 
 @user_router.put("/profile", response_model=dict)
 async def update_profile(
@@ -142,7 +168,7 @@ async def update_profile(
             update_data["name"] = name
         if email is not None:
             # Check if email is already taken by another user
-            existing_user = user_collection.find_one({
+            existing_user = await user_collection.find_one({
                 "email": email,
                 "_id": {"$ne": current_user["_id"]}
             })
@@ -154,10 +180,14 @@ async def update_profile(
             update_data["email"] = email
         
         if update_data:
-            user_collection.update_one(
+            result = await user_collection.update_one(
                 {"_id": current_user["_id"]},
                 {"$set": update_data}
             )
+            if result.modified_count:
+                user_cache.invalidate(current_user["username"])
+                await user_search.changed([current_user["_id"]], user_scope(current_user["_id"]))
+                user_search.update(current_user["_id"], update_data)
             logger.info(f"Profile updated: {current_user['username']}")
         
         return {"message": "Profile updated successfully"}
@@ -178,47 +208,25 @@ async def log_sop_activity(
 ):
     """Log SOP activity completion"""
     try:
-        sop_collection = get_sop_activity_collection()
+        client = request_client_info(request)
         
-        # Check if this task was already completed by this user
-        existing_activity = sop_collection.find_one({
-            "user_id": current_user["_id"],
-            "sop_type": activity_data.sop_type,
-            "task_id": activity_data.task_id
-        })
+        if ingest_queue.enabled:
+            # Acknowledged once queued; the write-behind flusher persists it
+            ingest_queue.enqueue([activity_upsert(current_user, activity_data, client)])
+            logger.info(f"Queued SOP activity: {activity_data.task_id} for user: {current_user['username']}")
+            return {"message": "SOP activity logged successfully"}
         
-        if existing_activity:
-            # Update existing activity with new timestamp
-            sop_collection.update_one(
-                {"_id": existing_activity["_id"]},
-                {
-                    "$set": {
-                        "completed_at": datetime.utcnow(),
-                        "ip_address": request.client.host,
-                        "user_agent": request.headers.get("user-agent")
-                    }
-                }
-            )
-            logger.info(f"Updated SOP activity: {activity_data.task_id} for user: {current_user['username']}")
-        else:
-            # Create new activity record
-            activity_record = {
-                "user_id": current_user["_id"],
-                "username": current_user["username"],
-                "sop_type": activity_data.sop_type,
-                "task_id": activity_data.task_id,
-                "task_description": activity_data.task_description,
-                "completed_at": datetime.utcnow(),
-                "ip_address": request.client.host,
-                "user_agent": request.headers.get("user-agent"),
-                "session_id": request.headers.get("x-session-id")
-            }
-            
-            result = sop_collection.insert_one(activity_record)
+        created = await record_activity(current_user, activity_data, client)
+        
+        if created:
             logger.info(f"Logged SOP activity: {activity_data.task_id} for user: {current_user['username']}")
+        else:
+            logger.info(f"Updated SOP activity: {activity_data.task_id} for user: {current_user['username']}")
         
         return {"message": "SOP activity logged successfully"}
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"SOP activity logging error: {e}")
         raise HTTPException(
@@ -226,39 +234,100 @@ async def log_sop_activity(
             detail="Failed to log SOP activity"
         )
 
-@user_router.get("/sop/activities", response_model=List[SOPActivityResponse])
+@user_router.post("/sop/activities:batch", response_model=dict)
+async def log_sop_activities_batch(
+    activities: List[SOPActivityCreate],
+    request: Request,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """Log a batch of SOP activity completions in one bulk write"""
+    if not activities:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No activities provided"
+        )
+    if len(activities) > settings.SOP_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch too large (max {settings.SOP_BATCH_MAX_SIZE})"
+        )
+    
+    try:
+        client = request_client_info(request)
+        
+        if ingest_queue.enabled:
+            ingest_queue.enqueue([activity_upsert(current_user, item, client) for item in activities])
+            logger.info(f"Queued {len(activities)} SOP activities for user: {current_user['username']}")
+            return {
+                "message": "SOP activities logged",
+                "results": [
+                    {"index": index, "sop_type": item.sop_type, "task_id": item.task_id, "status": "queued"}
+                    for index, item in enumerate(activities)
+                ]
+            }
+        
+        results = await record_activities(current_user, activities, client)
+        failed = sum(1 for item in results if item["status"] == "error")
+        logger.info(f"Logged {len(results) - failed}/{len(results)} SOP activities for user: {current_user['username']}")
+        
+        return {
+            "message": "SOP activities logged" if not failed else "Some SOP activities failed",
+            "results": results
+        }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"SOP activity batch logging error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to log SOP activities"
+        )
+
+@user_router.get("/sop/activities", response_model=Union[SOPActivityPage, List[SOPActivityResponse]])
 async def get_user_sop_activities(
+    request: Request,
     sop_type: str = None,
+    cursor: str = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    unbounded: bool = False,
     current_user: dict = Depends(get_current_active_user)
 ):
-    """Get current user's SOP activities"""
+    """Get current user's SOP activities, newest first, one page at a time
+
+    unbounded=true returns the legacy full list and will be removed once the
+    frontend pages through results. Honours If-None-Match.
+    """
     try:
+        tag, not_modified = await conditional_get(request, user_activity_scope(current_user["_id"]))
+        if not_modified:
+            return not_modified
+        
         sop_collection = get_sop_activity_collection()
         
         query = {"user_id": current_user["_id"]}
         if sop_type:
             query["sop_type"] = sop_type
         
-        activities = list(sop_collection.find(query).sort("completed_at", -1))
-        
-        return [
-            SOPActivityResponse(
-                id=str(activity["_id"]),
-                user_id=str(activity["user_id"]),
-                username=activity["username"],
-                sop_type=activity["sop_type"],
-                task_id=activity["task_id"],
-                task_description=activity["task_description"],
-                completed_at=activity["completed_at"],
-                ip_address=activity.get("ip_address"),
-                user_agent=activity.get("user_agent")
+        if unbounded:
+            activities = await sop_collection.find(query, ACTIVITY_PROJECTION).sort("completed_at", -1).to_list(length=None)
+        else:
+            activities, next_cursor = await fetch_page(
+                sop_collection, with_keyset(query, activity_keyset(cursor)), ACTIVITY_SORT, limit, activity_cursor,
+                projection=ACTIVITY_PROJECTION
             )
-            for activity in activities
-        ]
+        
+        items = [activity_dict(activity) for activity in activities]
+        
+        if unbounded:
+            return with_etag(fast_json(items), tag)
+        return with_etag(fast_json(page_dict(items, next_cursor)), tag)
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Get SOP activities error: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to retrieve SOP activities"
-        )
\ No newline at end of file
+        )
@@ -0,0 +1,58 @@
+from fastapi.responses import ORJSONResponse
+
+# Only the fields UserResponse / SOPActivityResponse expose
+USER_PROJECTION = {
+    "username": 1,
+    "name": 1,
+    "email": 1,
+    "role": 1,
+    "is_active": 1
+}
+
+ACTIVITY_PROJECTION = {
+    "user_id": 1,
+    "username": 1,
+    "sop_type": 1,
+    "task_id": 1,
+    "task_description": 1,
+    "completed_at": 1,
+    "ip_address": 1,
+    "user_agent": 1
+}
+
+def user_dict(user: dict) -> dict:
+    """MongoDB user document as a UserResponse-shaped dict"""
+    return {
+        "id": str(user["_id"]),
+        "username": user["username"],
+        "name": user.get("name"),
+        "email": user["email"],
+        "role": user.get("role", "user"),
+        "is_active": user.get("is_active", True)
+    }
+
+def activity_dict(activity: dict) -> dict:
+    """MongoDB activity document as an SOPActivityResponse-shaped dict"""
+    return {
+        "id": str(activity["_id"]),
+        "user_id": str(activity["user_id"]),
+        "username": activity["username"],
+        "sop_type": activity["sop_type"],
+        "task_id": activity["task_id"],
+        "task_description": activity["task_description"],
+        "completed_at": activity["completed_at"],
+        "ip_address": activity.get("ip_address"),
+        "user_agent": activity.get("user_agent")
+    }
+
+def page_dict(items: list, next_cursor) -> dict:
+    return {"items": items, "next_cursor": next_cursor}
+
+def fast_json(content) -> ORJSONResponse:
+    """Serialize already-shaped dicts with orjson, skipping response_model
+
+    Returning a Response makes FastAPI bypass response_model validation, so
+    callers must build content with the *_dict helpers above; response_model
+    stays on the route for the OpenAPI schema.
+    """
+    return ORJSONResponse(content)
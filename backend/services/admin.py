@@ -1,5 +1,7 @@
+from pymongo.errors import DuplicateKeyError
 from database import get_user_collection
-from auth import get_password_hash
+from auth import get_password_hash_async
+from services.versions import bump_users_version
 import logging
 
 logger = logging.getLogger(__name__)
@@ -10,23 +12,36 @@ async def create_default_admin():
         user_collection = get_user_collection()
         
         # Check if admin already exists
-        existing_admin = user_collection.find_one({"role": "admin"})
+        existing_admin = await user_collection.find_one({"role": "admin"})
         if existing_admin:
             logger.info("Admin user already exists")
             return
         
-        # Create default admin
+        # Create default admin; the upsert on the unique username keeps
+        # concurrently starting workers from inserting it twice
         admin_user = {
-            "username": "sysadmin",
             "name": "System Administrator",
             "email": "admin@example.com",
-            "password": get_password_hash("admin123"),  # Change this in production!
+            "password": await get_password_hash_async("admin123"),  # Change this in production!
             "role": "admin",
             "is_active": True
         }
         
-        result = user_collection.insert_one(admin_user)
-        logger.info(f"Default admin created with ID: {result.inserted_id}")
+        try:
+            result = await user_collection.update_one(
+                {"username": "sysadmin"},
+                {"$setOnInsert": admin_user},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            logger.info("Admin user already exists")
+            return
+        if result.upserted_id is None:
+            logger.info("Admin user already exists")
+            return
+        
+        await bump_users_version([result.upserted_id])
+        logger.info(f"Default admin created with ID: {result.upserted_id}")
         logger.warning("Default admin password is 'admin123' - CHANGE THIS IN PRODUCTION!")
         
     except Exception as e:
@@ -0,0 +1,353 @@
+"""Cold archive for SOP activities older than SOP_ARCHIVE_HORIZON_DAYS.
+
+Old rows are moved out of sop_activities into one file per month under
+SOP_ARCHIVE_DIR:
+
+    sop_activities-2026-03.ndjson.zst   MongoDB extended JSON, one row per line
+    manifest.json                       index of months and frames
+
+Every batch is appended to its month file as one zstd frame, newest row
+first, so the files are plain multi-frame zstd (zstdcat | mongoimport
+restores them). The manifest records each frame's offset, size and
+completed_at range; reports seek straight to the frames that overlap their
+window and read them newest first.
+
+A batch is committed in three steps: append the frame and fsync it, record
+it in the manifest together with the (_id, completed_at) pairs it holds,
+then delete the rows still carrying that completed_at. A row re-ticked in
+between keeps its live copy; its _id is listed under the month's
+"superseded" ids and reads skip the stale archived copy. A crash between
+the steps is repaired at the start of the next run: bytes past the
+committed length are cut off, and pending rows are deleted (or marked
+superseded). Daily rollups are left alone, so the summary still counts
+archived days (a rollup rebuild from sop_activities would not).
+
+Runs every SOP_ARCHIVE_INTERVAL_SECONDS in one worker at a time, or once
+with:
+
+    python -m services.archive
+"""
+from bson import ObjectId, json_util
+from database import get_db, get_sop_activity_collection
+from services.rollups import day_start
+from services.versions import user_activity_scope, bump_versions
+from bootstrap import BootstrapLease
+from config import settings
+from datetime import datetime, timedelta
+import asyncio
+import json
+import os
+import sys
+import logging
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_LOCK = "sop_archive"
+MANIFEST_FILE = "manifest.json"
+
+def month_start(moment: datetime) -> datetime:
+    return datetime(moment.year, moment.month, 1)
+
+def next_month(moment: datetime) -> datetime:
+    return datetime(moment.year + moment.month // 12, moment.month % 12 + 1, 1)
+
+def archive_cutoff(now: datetime = None) -> datetime:
+    """Rows completed before this (UTC midnight) belong in the archive"""
+    return day_start((now or datetime.utcnow()) - timedelta(days=settings.SOP_ARCHIVE_HORIZON_DAYS))
+
+def zstd_codec():
+    import pyarrow as pa
+    return pa.Codec("zstd", compression_level=settings.SOP_ARCHIVE_ZSTD_LEVEL)
+
+class ArchiveManifest:
+    """manifest.json: per-month file, row count and frame index"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path = os.path.join(directory, MANIFEST_FILE)
+        self.months = {}
+        self.pending = None
+        self.cutoff = None
+
+    @classmethod
+    def load(cls, directory: str) -> "ArchiveManifest":
+        manifest = cls(directory)
+        if os.path.exists(manifest.path):
+            with open(manifest.path) as f:
+                data = json.load(f)
+            manifest.months = data.get("months", {})
+            manifest.pending = data.get("pending")
+            manifest.cutoff = data.get("cutoff")
+        return manifest
+
+    def save(self):
+        """Replace manifest.json atomically"""
+        data = {
+            "collection": "sop_activities",
+            "format": "ndjson (MongoDB relaxed extended JSON), zstd frames",
+            "cutoff": self.cutoff,
+            "updated_at": datetime.utcnow().isoformat(),
+            "pending": self.pending,
+            "months": self.months
+        }
+        temporary = self.path + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump(data, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.path)
+
+    def month(self, name: str) -> dict:
+        return self.months.setdefault(name, {
+            "file": f"sop_activities-{name}.ndjson.zst",
+            "rows": 0,
+            "bytes": 0,
+            "min_completed_at": None,
+            "max_completed_at": None,
+            # [offset, size, raw size, rows, min completed_at, max completed_at]
+            "frames": [],
+            # _ids re-ticked while being archived: the live row wins
+            "superseded": []
+        })
+
+    def file_path(self, month: dict) -> str:
+        return os.path.join(self.directory, month["file"])
+
+def _append_frame(path: str, data: bytes) -> int:
+    """Append one compressed frame durably; returns its offset"""
+    with open(path, "ab") as f:
+        offset = f.tell()
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    return offset
+
+def _file_size(path: str) -> int:
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+def _truncate(path: str, length: int):
+    if os.path.exists(path) and os.path.getsize(path) > length:
+        with open(path, "r+b") as f:
+            f.truncate(length)
+
+async def _delete_rows(collection, keys: list, user_ids: list) -> list:
+    """Delete archived rows that still carry the completed_at they were read with
+
+    keys are (_id, completed_at) pairs. Returns the _ids left live because
+    they were re-ticked since. The owners' activity ETags are bumped
+    afterwards, so /sop/activities stops answering 304 for pages that held
+    the deleted rows.
+    """
+    deleted = 0
+    for start in range(0, len(keys), settings.SOP_ARCHIVE_BATCH_SIZE):
+        chunk = keys[start:start + settings.SOP_ARCHIVE_BATCH_SIZE]
+        result = await collection.delete_many({
+            "$or": [{"_id": oid, "completed_at": completed_at} for oid, completed_at in chunk]
+        })
+        deleted += result.deleted_count
+    superseded = []
+    if deleted < len(keys):
+        superseded = [
+            row["_id"] async for row in collection.find({"_id": {"$in": [oid for oid, _ in keys]}}, {"_id": 1})
+        ]
+    await bump_versions(*(user_activity_scope(user_id) for user_id in user_ids))
+    return superseded
+
+async def _finish_batch(manifest: ArchiveManifest, collection):
+    """Delete the pending batch's rows and record the re-ticked ones as superseded"""
+    pending = manifest.pending
+    keys = [
+        (ObjectId(oid), datetime.fromisoformat(completed_at))
+        for oid, completed_at in zip(pending["ids"], pending["completed_at"])
+    ]
+    superseded = await _delete_rows(collection, keys, [ObjectId(oid) for oid in pending["users"]])
+    if superseded:
+        month = manifest.months[pending["month"]]
+        month.setdefault("superseded", []).extend(str(oid) for oid in superseded)
+        month["rows"] -= len(superseded)
+        logger.info(f"{len(superseded)} SOP activities re-ticked while archiving; kept live")
+    manifest.pending = None
+    manifest.save()
+    return len(keys) - len(superseded)
+
+async def _recover(manifest: ArchiveManifest, collection):
+    """Finish or roll back a batch interrupted by a crash"""
+    for month in manifest.months.values():
+        _truncate(manifest.file_path(month), month["bytes"])
+    if manifest.pending:
+        deleted = await _finish_batch(manifest, collection)
+        logger.info(f"Archive recovery deleted {deleted} already archived SOP activities")
+
+async def _archive_batch(manifest: ArchiveManifest, collection, name: str, rows: list) -> int:
+    """Commit one batch (oldest first) to its month file, then delete it"""
+    month = manifest.month(name)
+    path = manifest.file_path(month)
+    # Checked before writing, so a mismatch leaves the file as it was
+    size = await asyncio.to_thread(_file_size, path)
+    if size != month["bytes"]:
+        raise RuntimeError(f"{path} is {size} bytes, manifest says {month['bytes']}")
+
+    rows.reverse()
+    raw = "".join(json_util.dumps(row) + "\n" for row in rows).encode()
+    compressed = await asyncio.to_thread(zstd_codec().compress, raw, asbytes=True)
+    offset = await asyncio.to_thread(_append_frame, path, compressed)
+
+    newest = rows[0]["completed_at"].isoformat()
+    oldest = rows[-1]["completed_at"].isoformat()
+    month["frames"].append([offset, len(compressed), len(raw), len(rows), oldest, newest])
+    month["bytes"] = offset + len(compressed)
+    month["rows"] += len(rows)
+    month["min_completed_at"] = min(filter(None, [month["min_completed_at"], oldest]))
+    month["max_completed_at"] = max(filter(None, [month["max_completed_at"], newest]))
+    manifest.pending = {
+        "month": name,
+        "ids": [str(row["_id"]) for row in rows],
+        "completed_at": [row["completed_at"].isoformat() for row in rows],
+        "users": [str(oid) for oid in {row["user_id"] for row in rows}]
+    }
+    manifest.save()
+
+    return await _finish_batch(manifest, collection)
+
+async def archive_activities(now: datetime = None) -> dict:
+    """Move every activity completed before the horizon into the archive"""
+    os.makedirs(settings.SOP_ARCHIVE_DIR, exist_ok=True)
+    collection = get_sop_activity_collection()
+    manifest = ArchiveManifest.load(settings.SOP_ARCHIVE_DIR)
+    await _recover(manifest, collection)
+
+    cutoff = archive_cutoff(now)
+    archived = {}
+    while True:
+        oldest = await collection.find_one(
+            {"completed_at": {"$lt": cutoff}}, {"completed_at": 1},
+            sort=[("completed_at", 1), ("_id", 1)]
+        )
+        if oldest is None:
+            break
+        start = month_start(oldest["completed_at"])
+        end = min(next_month(start), cutoff)
+        name = start.strftime("%Y-%m")
+
+        # Keyset over (completed_at, _id) so re-ticked rows cannot stall it
+        query = {"completed_at": {"$gte": start, "$lt": end}}
+        while True:
+            rows = await collection.find(query).sort(
+                [("completed_at", 1), ("_id", 1)]
+            ).limit(settings.SOP_ARCHIVE_BATCH_SIZE).to_list(length=None)
+            if not rows:
+                break
+            last = rows[-1]
+            archived[name] = archived.get(name, 0) + await _archive_batch(manifest, collection, name, rows)
+            query = {"completed_at": {"$lt": end}, "$or": [
+                {"completed_at": {"$gt": last["completed_at"]}},
+                {"completed_at": last["completed_at"], "_id": {"$gt": last["_id"]}}
+            ]}
+
+    manifest.cutoff = cutoff.isoformat()
+    manifest.save()
+    if archived:
+        logger.info(f"Archived SOP activities before {cutoff:%Y-%m-%d}: {archived}")
+    return {"cutoff": cutoff, "archived": archived}
+
+def _frame_rows(path: str, frame: list) -> list:
+    """Decode one frame; rows come back newest first"""
+    offset, size, raw_size = frame[:3]
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(size)
+    raw = zstd_codec().decompress(data, decompressed_size=raw_size, asbytes=True)
+    return [json_util.loads(line) for line in raw.splitlines()]
+
+def _matches(row: dict, query: dict) -> bool:
+    for field in ("sop_type", "user_id"):
+        if field in query and row.get(field) != query[field]:
+            return False
+    since = query.get("completed_at", {}).get("$gte")
+    return since is None or row["completed_at"] >= since
+
+async def archived_activities(query: dict):
+    """Archived rows matching an activity_filter() query, newest first
+
+    Only frames whose completed_at range overlaps the query window are read,
+    so a window inside the horizon costs one manifest read.
+    """
+    manifest = ArchiveManifest.load(settings.SOP_ARCHIVE_DIR)
+    since = query.get("completed_at", {}).get("$gte")
+    since = since.isoformat() if since else None
+    for name in sorted(manifest.months, reverse=True):
+        month = manifest.months[name]
+        if since and (month["max_completed_at"] or "") < since:
+            continue
+        path = manifest.file_path(month)
+        superseded = set(month.get("superseded", []))
+        for frame in reversed(month["frames"]):
+            if since and frame[5] < since:
+                continue
+            for row in await asyncio.to_thread(_frame_rows, path, frame):
+                if _matches(row, query) and str(row["_id"]) not in superseded:
+                    yield row
+
+def archive_stats() -> dict:
+    manifest = ArchiveManifest.load(settings.SOP_ARCHIVE_DIR)
+    return {
+        "enabled": settings.SOP_ARCHIVE_ENABLED,
+        "horizon_days": settings.SOP_ARCHIVE_HORIZON_DAYS,
+        "cutoff": manifest.cutoff,
+        "months": {
+            name: {key: month[key] for key in ("file", "rows", "bytes", "min_completed_at", "max_completed_at")}
+            for name, month in sorted(manifest.months.items())
+        }
+    }
+
+class ActivityArchiver:
+    """Runs archive_activities periodically in whichever worker holds the lease"""
+
+    def __init__(self):
+        self._task = None
+
+    def start(self):
+        if not settings.SOP_ARCHIVE_ENABLED or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info("SOP activity archiver started")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def run_once(self) -> dict:
+        """Archive now unless another worker is already doing it"""
+        lease = BootstrapLease(get_db(), ARCHIVE_LOCK)
+        if not await lease.acquire():
+            return None
+        async with lease:
+            return await archive_activities()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"SOP activity archiving failed: {e}")
+            await asyncio.sleep(settings.SOP_ARCHIVE_INTERVAL_SECONDS)
+
+# Global activity archiver
+activity_archiver = ActivityArchiver()
+
+async def _main(argv):
+    if await activity_archiver.run_once() is None:
+        logger.info("Another process is archiving; nothing done")
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
@@ -0,0 +1,280 @@
+"""Live SOP activity feed for the admin dashboard (Server-Sent Events).
+
+The broker keeps the last SOP_STREAM_REPLAY_SIZE events in a ring buffer
+and fans each one out to every connected stream. A reconnecting client
+sends Last-Event-ID and gets only the events it missed; when that id has
+left the buffer (or came from another source) it gets a reset event and
+reloads its snapshot instead.
+
+Events come from one of three sources:
+  memory        the write paths publish what they just wrote; each worker
+                only sees its own writes, so it only suits a single worker
+  change_stream one change stream per worker on sop_activities (replica set
+                required); every worker sees every write and event ids are
+                resume tokens, so Last-Event-ID works across workers
+  poll          each worker with subscribers re-reads the rows ticked in the
+                last SOP_STREAM_POLL_LAG_MS every SOP_STREAM_POLL_INTERVAL_MS
+                (completed_at index); every worker sees every write and event
+                ids come from the row, so Last-Event-ID works across workers
+auto picks change_stream with a replica set, poll with several workers and
+memory otherwise.
+"""
+from collections import deque
+from database import get_sop_activity_collection
+from serialization import ACTIVITY_PROJECTION
+from config import settings
+from datetime import datetime, timedelta
+import asyncio
+import orjson
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1)
+
+def activity_event(activity: dict) -> dict:
+    """Activity document (or merged upsert spec) as a feed event payload"""
+    return {
+        "id": str(activity["_id"]) if "_id" in activity else None,
+        "user_id": str(activity["user_id"]),
+        "username": activity.get("username"),
+        "sop_type": activity["sop_type"],
+        "task_id": activity["task_id"],
+        "task_description": activity.get("task_description"),
+        "completed_at": activity.get("completed_at"),
+        "ip_address": activity.get("ip_address"),
+        "user_agent": activity.get("user_agent")
+    }
+
+def spec_document(query: dict, update: dict) -> dict:
+    """The activity fields an upsert spec writes"""
+    return {**query, **update.get("$setOnInsert", {}), **update["$set"]}
+
+def sse_frame(event: str, data: bytes, event_id: str = None) -> bytes:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\n".encode() + b"data: " + data + b"\n\n"
+
+def poll_event_id(activity: dict) -> str:
+    """Event id every worker derives alike for one tick of a row"""
+    millis = (activity["completed_at"] - EPOCH) // timedelta(milliseconds=1)
+    return f"{millis}-{activity['_id']}"
+
+RESET_FRAME = sse_frame("reset", b"{}")
+KEEPALIVE_FRAME = b": keepalive\n\n"
+
+class Subscription:
+    """One connected stream: pending frames plus a wakeup flag"""
+
+    def __init__(self, sop_type: str = None):
+        self.sop_type = sop_type
+        self.pending = deque()
+        self.wakeup = asyncio.Event()
+
+    def push(self, frame: bytes):
+        if len(self.pending) >= settings.SOP_STREAM_SUBSCRIBER_BUFFER:
+            # Too slow to keep up: drop its backlog and have it reload
+            self.pending.clear()
+            frame = RESET_FRAME
+        self.pending.append(frame)
+        self.wakeup.set()
+
+    async def next_frames(self, timeout: float) -> list:
+        """Frames queued since the last call; empty after timeout"""
+        if not self.pending:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+        self.wakeup.clear()
+        frames = list(self.pending)
+        self.pending.clear()
+        return frames
+
+class ActivityEventBroker:
+    """In-process pub/sub for SOP activity events"""
+
+    def __init__(self):
+        self._subscribers = set()
+        self._recent = deque()  # (seq, event id, sop_type, frame)
+        self._seqs = {}  # event id -> seq, for the events in _recent
+        self._seq = 0
+        # Memory-source ids are only meaningful to this process
+        self._epoch = uuid.uuid4().hex[:8]
+        self._task = None
+        self.published = 0
+
+    @property
+    def source(self) -> str:
+        source = settings.SOP_STREAM_SOURCE
+        if source == "auto":
+            if settings.MONGO_REPLICA_SET:
+                return "change_stream"
+            return "poll" if settings.SERVER_WORKERS > 1 else "memory"
+        return source
+
+    def start(self):
+        """Start the change stream watcher or poller when that is the source"""
+        if self._task is not None:
+            return
+        source = self.source
+        if source == "memory" and settings.SERVER_WORKERS > 1:
+            logger.warning(
+                f"SOP_STREAM_SOURCE=memory with {settings.SERVER_WORKERS} workers: the live "
+                "feed only shows writes handled by the subscriber's own worker; use poll or change_stream"
+            )
+        if source == "change_stream":
+            self._task = asyncio.create_task(self._watch())
+        elif source == "poll":
+            self._task = asyncio.create_task(self._poll())
+        else:
+            return
+        logger.info(f"SOP activity {source} source started")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def publish_specs(self, specs: list):
+        """Publish upsert specs the caller has just written (memory source)"""
+        if self.source != "memory":
+            return
+        for query, update in specs:
+            self._publish(spec_document(query, update))
+
+    def _publish(self, activity: dict, event_id: str = None):
+        self._seq += 1
+        seq = self._seq
+        event_id = event_id or f"{self._epoch}-{seq}"
+        frame = sse_frame("activity", orjson.dumps(activity_event(activity)), event_id)
+        sop_type = activity["sop_type"]
+
+        self._recent.append((seq, event_id, sop_type, frame))
+        self._seqs[event_id] = seq
+        while len(self._recent) > settings.SOP_STREAM_REPLAY_SIZE:
+            _, evicted, _, _ = self._recent.popleft()
+            self._seqs.pop(evicted, None)
+        self.published += 1
+
+        for subscription in self._subscribers:
+            if subscription.sop_type in (None, sop_type):
+                subscription.push(frame)
+
+    def subscribe(self, sop_type: str = None, last_event_id: str = None) -> Subscription:
+        """Register a stream, queueing the events it missed since last_event_id"""
+        subscription = Subscription(sop_type)
+        if last_event_id:
+            seq = self._seqs.get(last_event_id)
+            if seq is None:
+                subscription.push(RESET_FRAME)
+            else:
+                for event_seq, _, event_sop_type, frame in self._recent:
+                    if event_seq > seq and sop_type in (None, event_sop_type):
+                        subscription.push(frame)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+
+    async def _watch(self):
+        """Feed the broker from a change stream, resuming after errors"""
+        pipeline = [
+            {"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}},
+            {"$project": {"operationType": 1, **{f"fullDocument.{field}": 1 for field in ["_id", *ACTIVITY_PROJECTION]}}}
+        ]
+        resume_token = None
+        while True:
+            try:
+                async with get_sop_activity_collection().watch(
+                    pipeline, full_document="updateLookup", resume_after=resume_token
+                ) as stream:
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        activity = change.get("fullDocument")
+                        if activity:
+                            self._publish(activity, change["_id"]["_data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"SOP activity change stream failed, reopening: {e}")
+                await asyncio.sleep(settings.SOP_STREAM_RETRY_MS / 1000)
+
+    async def _poll(self):
+        """Feed the broker by re-reading recently ticked rows, while anyone listens
+
+        Each poll reads rows after (since, after_id) in (completed_at, _id)
+        order, where since trails the newest row by SOP_STREAM_POLL_LAG_MS so
+        rows committed late by another worker are still picked up; rows
+        already published are skipped. A full batch pages on the last row's
+        (completed_at, _id), so a bulk write sharing one timestamp is read
+        to the end.
+        """
+        interval = settings.SOP_STREAM_POLL_INTERVAL_MS / 1000
+        lag = timedelta(milliseconds=settings.SOP_STREAM_POLL_LAG_MS)
+        since = None
+        after_id = None  # last _id read at exactly since, once paging
+        seen = {}  # (_id, completed_at) -> completed_at, for rows at or after since
+        while True:
+            try:
+                if not self._subscribers:
+                    since = after_id = None
+                    seen.clear()
+                else:
+                    if since is None:
+                        since = datetime.utcnow() - lag
+                    query = {"completed_at": {"$gt": since}}
+                    if after_id is not None:
+                        query = {"$or": [query, {"completed_at": since, "_id": {"$gt": after_id}}]}
+                    rows = await get_sop_activity_collection().find(query, ACTIVITY_PROJECTION).sort(
+                        [("completed_at", 1), ("_id", 1)]
+                    ).limit(settings.SOP_STREAM_POLL_BATCH).to_list(length=None)
+                    for row in rows:
+                        key = (row["_id"], row["completed_at"])
+                        if key not in seen:
+                            seen[key] = row["completed_at"]
+                            self._publish(row, poll_event_id(row))
+                    backlog = len(rows) >= settings.SOP_STREAM_POLL_BATCH
+                    if backlog:
+                        # Move past this batch and poll again at once
+                        since, after_id = rows[-1]["completed_at"], rows[-1]["_id"]
+                    else:
+                        newest = rows[-1]["completed_at"] if rows else since
+                        moved = max(since, min(newest, datetime.utcnow() - lag))
+                        if moved != since:
+                            since, after_id = moved, None
+                    seen = {key: moment for key, moment in seen.items() if moment >= since}
+                    if backlog:
+                        continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"SOP activity poll failed: {e}")
+            await asyncio.sleep(interval)
+
+    def stats(self) -> dict:
+        return {
+            "source": self.source,
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "buffered": len(self._recent)
+        }
+
+async def event_stream(broker: ActivityEventBroker, subscription: Subscription):
+    """text/event-stream body for one subscription, with keepalives"""
+    try:
+        yield f"retry: {settings.SOP_STREAM_RETRY_MS}\n\n".encode()
+        while True:
+            frames = await subscription.next_frames(settings.SOP_STREAM_HEARTBEAT_SECONDS)
+            yield b"".join(frames) if frames else KEEPALIVE_FRAME
+    finally:
+        broker.unsubscribe(subscription)
+
+# Global activity event broker
+activity_events = ActivityEventBroker()
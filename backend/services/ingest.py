@@ -0,0 +1,162 @@
+from collections import deque
+from fastapi import HTTPException, status
+from database import get_sop_activity_collection
+from services.sop import activity_rollup, bulk_upsert
+from services.rollups import record_rollups
+from services.versions import user_activity_scope, bump_versions
+from services.events import activity_events
+from config import settings
+import asyncio
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ActivityIngestQueue:
+    """Write-behind queue for SOP activity upserts.
+
+    Requests enqueue (filter, update) specs and return immediately; a
+    background task flushes them with bulk_write once FLUSH_SIZE specs are
+    waiting or FLUSH_INTERVAL has passed. drain() flushes everything left at
+    shutdown so acknowledged ticks survive a clean restart.
+    """
+
+    def __init__(self):
+        self._pending = deque()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._stopping = False
+        self.enqueued = 0
+        self.written = 0
+        self.failed = 0
+        self.rejected = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return settings.SOP_INGEST_QUEUE_ENABLED
+
+    @property
+    def depth(self) -> int:
+        return len(self._pending)
+
+    def enqueue(self, specs: list):
+        """Queue upsert specs, or reject with 429 when the queue is full"""
+        if self.depth + len(specs) > settings.SOP_INGEST_QUEUE_MAX_SIZE:
+            self.rejected += len(specs)
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Activity queue is full, please retry",
+                headers={"Retry-After": str(settings.SOP_INGEST_RETRY_AFTER)}
+            )
+        self._pending.extend(specs)
+        self.enqueued += len(specs)
+        if self.depth >= settings.SOP_INGEST_FLUSH_SIZE:
+            self._wakeup.set()
+
+    def start(self):
+        """Start the background flusher (no-op when the queue is disabled)"""
+        if not self.enabled or self._task is not None:
+            return
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+        logger.info("SOP activity ingest queue started")
+
+    async def drain(self):
+        """Stop the flusher and write out everything still queued"""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+        logger.info(f"SOP activity ingest queue drained ({self.written} written, {self.failed} failed)")
+
+    async def _run(self):
+        interval = settings.SOP_INGEST_FLUSH_INTERVAL_MS / 1000
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._pending:
+                if not await self._flush_batch():
+                    if self._stopping:
+                        break
+                    await asyncio.sleep(interval)
+                elif self.depth < settings.SOP_INGEST_FLUSH_SIZE:
+                    # Keep going through a backlog; a partial batch waits for
+                    # more ticks or the next interval
+                    break
+        # Final drain; give each remaining batch a few attempts
+        attempts = 0
+        while self._pending and attempts < 3:
+            if await self._flush_batch():
+                attempts = 0
+            else:
+                attempts += 1
+                await asyncio.sleep(interval)
+        if self._pending:
+            logger.error(f"Dropping {self.depth} queued SOP activities after failed drain")
+            self.failed += self.depth
+            self._pending.clear()
+
+    async def _flush_batch(self) -> bool:
+        """Write one batch; on failure it is put back at the head of the queue"""
+        batch = [self._pending.popleft() for _ in range(min(settings.SOP_INGEST_FLUSH_SIZE, self.depth))]
+
+        # Latest tick per task wins; rollups still see every tick
+        latest = {}
+        for query, update in batch:
+            latest[(query["user_id"], query["sop_type"], query["task_id"])] = (query, update)
+        specs = list(latest.values())
+
+        started = time.perf_counter()
+        try:
+            _, errors = await bulk_upsert(get_sop_activity_collection(), specs)
+        except Exception as e:
+            logger.error(f"SOP activity flush failed, will retry: {e}")
+            self._pending.extendleft(reversed(batch))
+            return False
+        # Only keys whose write landed count towards rollups, ETags and the feed
+        written = [spec for position, spec in enumerate(specs) if position not in errors]
+        failed_keys = {key for position, key in enumerate(latest) if position in errors}
+        await record_rollups([
+            activity_rollup(query, update) for query, update in batch
+            if (query["user_id"], query["sop_type"], query["task_id"]) not in failed_keys
+        ])
+        await bump_versions(*(user_activity_scope(query["user_id"]) for query, _ in written))
+        activity_events.publish_specs(written)
+
+        elapsed = (time.perf_counter() - started) * 1000
+        self.flushes += 1
+        self.last_flush_ms = elapsed
+        self.max_flush_ms = max(self.max_flush_ms, elapsed)
+        self.total_flush_ms += elapsed
+        self.failed += len(errors)
+        self.written += len(specs) - len(errors)
+        for position, error in errors.items():
+            logger.error(f"Dropped queued SOP activity {specs[position][0]}: {error}")
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "depth": self.depth,
+            "max_size": settings.SOP_INGEST_QUEUE_MAX_SIZE,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "flushes": self.flushes,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "max_flush_ms": round(self.max_flush_ms, 2),
+            "avg_flush_ms": round(self.total_flush_ms / self.flushes, 2) if self.flushes else 0.0
+        }
+
+# Global ingest queue
+ingest_queue = ActivityIngestQueue()
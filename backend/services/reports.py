@@ -0,0 +1,199 @@
+from database import get_analytics_db
+from services.archive import archived_activities
+from config import settings
+import asyncio
+import csv
+import io
+import json
+import zlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Only the fields the exports actually write
+REPORT_PROJECTION = {
+    "_id": 0,
+    "user_id": 1,
+    "username": 1,
+    "sop_type": 1,
+    "task_id": 1,
+    "task_description": 1,
+    "completed_at": 1,
+    "ip_address": 1,
+    "user_agent": 1
+}
+
+CSV_HEADER = [
+    "User ID", "Username", "SOP Type", "Task ID",
+    "Task Description", "Completed At", "IP Address", "User Agent"
+]
+
+# Flush to the client once this many bytes are buffered
+CHUNK_SIZE = 64 * 1024
+
+def report_cursor(query: dict):
+    """Live cursor over the report rows, newest first, fetched in batches"""
+    sop_collection = get_analytics_db()["sop_activities"]
+    return sop_collection.find(
+        query, REPORT_PROJECTION, batch_size=settings.REPORT_BATCH_SIZE
+    ).sort("completed_at", -1)
+
+async def report_rows(query: dict):
+    """Hot rows, then archived rows when the window reaches past the archive horizon"""
+    async for activity in report_cursor(query):
+        yield activity
+    async for activity in archived_activities(query):
+        yield activity
+
+def csv_row(activity: dict) -> list:
+    return [
+        str(activity["user_id"]),
+        activity["username"],
+        activity["sop_type"],
+        activity["task_id"],
+        activity["task_description"],
+        activity["completed_at"].strftime("%Y-%m-%d %H:%M:%S"),
+        activity.get("ip_address", ""),
+        activity.get("user_agent", "")
+    ]
+
+async def stream_csv(cursor):
+    """Yield encoded CSV chunks as rows arrive from the cursor"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    async for activity in cursor:
+        writer.writerow(csv_row(activity))
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+async def gzip_stream(chunks):
+    """Compress an async byte stream on the fly into a gzip member"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+def export_record(activity: dict) -> dict:
+    """JSON-ready row with the same columns as the CSV export"""
+    return {
+        "user_id": str(activity["user_id"]),
+        "username": activity["username"],
+        "sop_type": activity["sop_type"],
+        "task_id": activity["task_id"],
+        "task_description": activity["task_description"],
+        "completed_at": activity["completed_at"].isoformat(),
+        "ip_address": activity.get("ip_address"),
+        "user_agent": activity.get("user_agent")
+    }
+
+async def stream_ndjson(cursor):
+    """Yield newline-delimited JSON chunks as rows arrive from the cursor"""
+    lines = []
+    size = 0
+    async for activity in cursor:
+        line = json.dumps(export_record(activity), ensure_ascii=False) + "\n"
+        lines.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield "".join(lines).encode()
+            lines = []
+            size = 0
+    if lines:
+        yield "".join(lines).encode()
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands bytes back to the caller"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+async def stream_parquet(cursor):
+    """Yield a Parquet file one row group at a time.
+
+    username, sop_type and task_id are dictionary encoded; each row group is
+    serialised in a worker thread and its bytes are sent before the next one
+    is read from the cursor.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("user_id", pa.string()),
+        ("username", pa.string()),
+        ("sop_type", pa.string()),
+        ("task_id", pa.string()),
+        ("task_description", pa.string()),
+        ("completed_at", pa.timestamp("ms", tz="UTC")),
+        ("ip_address", pa.string()),
+        ("user_agent", pa.string()),
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(
+        sink, schema,
+        use_dictionary=["username", "sop_type", "task_id"],
+        compression="zstd"
+    )
+    columns = {name: [] for name in schema.names}
+
+    async def write_row_group():
+        table = pa.table(columns, schema=schema)
+        for values in columns.values():
+            values.clear()
+        await asyncio.to_thread(writer.write_table, table)
+        return sink.drain()
+
+    try:
+        async for activity in cursor:
+            columns["user_id"].append(str(activity["user_id"]))
+            columns["username"].append(activity["username"])
+            columns["sop_type"].append(activity["sop_type"])
+            columns["task_id"].append(activity["task_id"])
+            columns["task_description"].append(activity["task_description"])
+            columns["completed_at"].append(activity["completed_at"])
+            columns["ip_address"].append(activity.get("ip_address"))
+            columns["user_agent"].append(activity.get("user_agent"))
+            if len(columns["user_id"]) >= settings.REPORT_PARQUET_ROW_GROUP_SIZE:
+                yield await write_row_group()
+        if columns["user_id"]:
+            yield await write_row_group()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+# format -> (stream factory, media type, file extension, gzip applies)
+EXPORT_FORMATS = {
+    "csv": (stream_csv, "text/csv", "csv", True),
+    "ndjson": (stream_ndjson, "application/x-ndjson", "ndjson", True),
+    "parquet": (stream_parquet, "application/vnd.apache.parquet", "parquet", False),
+}
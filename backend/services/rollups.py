@@ -0,0 +1,162 @@
+"""Daily SOP rollups: one document per (date, sop_type, user_id).
+
+Kept up to date incrementally by the activity write paths; rebuild from raw
+sop_activities with:
+
+    python -m services.rollups --rebuild
+"""
+from pymongo import UpdateOne
+from datetime import datetime, timedelta
+from database import get_db
+import asyncio
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_COLLECTION = "sop_daily_rollups"
+
+def get_rollup_collection():
+    return get_db()[ROLLUP_COLLECTION]
+
+def day_start(moment: datetime) -> datetime:
+    """UTC midnight of the day containing moment"""
+    return datetime(moment.year, moment.month, moment.day)
+
+def rollup_upsert(user_id, username: str, sop_type: str, task_id: str, completed_at: datetime) -> UpdateOne:
+    """Fold one task completion into its daily rollup document"""
+    return UpdateOne(
+        {"date": day_start(completed_at), "sop_type": sop_type, "user_id": user_id},
+        {
+            "$addToSet": {"tasks": task_id},
+            "$inc": {"completions": 1},
+            "$min": {"first_completed_at": completed_at},
+            "$max": {"last_completed_at": completed_at},
+            "$setOnInsert": {"username": username}
+        },
+        upsert=True
+    )
+
+async def record_rollups(ops: list):
+    """Apply rollup updates; failures are logged, a rebuild repairs them"""
+    if not ops:
+        return
+    try:
+        await get_rollup_collection().bulk_write(ops, ordered=False)
+    except Exception as e:
+        logger.error(f"SOP rollup update failed: {e}")
+
+def rollup_window_start(days: int):
+    """First rollup date covered by a `days` window (whole days, UTC)"""
+    if days <= 0:
+        return None
+    return day_start(datetime.utcnow() - timedelta(days=days))
+
+def rollup_summary_lookup(sop_type: str = None, days: int = 30) -> list:
+    """Pipeline stages that add total_tasks/last_activity to user documents from rollups"""
+    match = {}
+    start = rollup_window_start(days)
+    if start is not None:
+        match["date"] = {"$gte": start}
+    if sop_type:
+        match["sop_type"] = sop_type
+    return [
+        {"$lookup": {
+            "from": ROLLUP_COLLECTION,
+            "localField": "_id",
+            "foreignField": "user_id",
+            "pipeline": [
+                {"$match": match},
+                {"$group": {
+                    "_id": None,
+                    "tasks": {"$push": "$tasks"},
+                    "last_activity": {"$max": "$last_completed_at"}
+                }},
+                {"$project": {
+                    "total_tasks": {"$size": {"$reduce": {
+                        "input": "$tasks",
+                        "initialValue": [],
+                        "in": {"$setUnion": ["$$value", "$$this"]}
+                    }}},
+                    "last_activity": 1
+                }}
+            ],
+            "as": "stats"
+        }},
+        {"$project": {
+            "username": 1,
+            "total_tasks": {"$ifNull": [{"$first": "$stats.total_tasks"}, 0]},
+            "last_activity": {"$first": "$stats.last_activity"}
+        }}
+    ]
+
+async def rebuild_rollups(db=None):
+    """Recompute every rollup from sop_activities, in place.
+
+    Raw activities keep only the latest completion per task, so rebuilt
+    documents count one completion per task and day. Rollups are replaced
+    key by key, so the summary stays readable (and incremental upserts keep
+    working) during the rebuild. Afterwards, rollups inside the range still
+    held by sop_activities that the rebuild did not produce are removed;
+    older days (moved to the archive) are kept.
+    """
+    db = db if db is not None else get_db()
+    rollups = db[ROLLUP_COLLECTION]
+    started = datetime.utcnow()
+    pipeline = [
+        {"$group": {
+            "_id": {
+                "date": {"$dateTrunc": {"date": "$completed_at", "unit": "day"}},
+                "sop_type": "$sop_type",
+                "user_id": "$user_id"
+            },
+            "username": {"$first": "$username"},
+            "tasks": {"$addToSet": "$task_id"},
+            "completions": {"$sum": 1},
+            "first_completed_at": {"$min": "$completed_at"},
+            "last_completed_at": {"$max": "$completed_at"}
+        }},
+        {"$project": {
+            "_id": 0,
+            "date": "$_id.date",
+            "sop_type": "$_id.sop_type",
+            "user_id": "$_id.user_id",
+            "username": 1,
+            "tasks": 1,
+            "completions": 1,
+            "first_completed_at": 1,
+            "last_completed_at": 1,
+            "rebuilt_at": {"$literal": started}
+        }},
+        {"$merge": {
+            "into": ROLLUP_COLLECTION,
+            "on": ["user_id", "date", "sop_type"],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert"
+        }}
+    ]
+    await db["sop_activities"].aggregate(pipeline, allowDiskUse=True).to_list(length=None)
+
+    oldest = await db["sop_activities"].find_one({}, {"completed_at": 1}, sort=[("completed_at", 1)])
+    if oldest is not None:
+        # Not rebuilt, and not written by a tick since the rebuild started
+        stale = await rollups.delete_many({
+            "date": {"$gte": day_start(oldest["completed_at"])},
+            "rebuilt_at": {"$ne": started},
+            "last_completed_at": {"$lt": started}
+        })
+        if stale.deleted_count:
+            logger.info(f"Removed {stale.deleted_count} stale SOP daily rollups")
+    count = await rollups.count_documents({})
+    logger.info(f"Rebuilt {count} SOP daily rollups")
+
+async def _main(argv):
+    if "--rebuild" not in argv:
+        print(__doc__)
+        return 2
+    await rebuild_rollups()
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
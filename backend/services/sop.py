@@ -0,0 +1,162 @@
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from database import get_sop_activity_collection
+from services.rollups import rollup_upsert, record_rollups, rollup_summary_lookup
+from serialization import ACTIVITY_PROJECTION
+from services.versions import user_activity_scope, bump_versions
+from services.events import activity_events
+from datetime import datetime, timedelta
+import logging
+
+logger = logging.getLogger(__name__)
+
+def activity_key(user_id, sop_type: str, task_id: str) -> dict:
+    """Filter identifying the single activity row for a user's task"""
+    return {"user_id": user_id, "sop_type": sop_type, "task_id": task_id}
+
+def activity_upsert(current_user: dict, activity_data, client: dict) -> tuple:
+    """Build the (filter, update) pair that records a task completion"""
+    update = {
+        "$set": {
+            "completed_at": datetime.utcnow(),
+            "ip_address": client.get("ip_address"),
+            "user_agent": client.get("user_agent")
+        },
+        "$setOnInsert": {
+            "username": current_user["username"],
+            "task_description": activity_data.task_description,
+            "session_id": client.get("session_id")
+        }
+    }
+    return activity_key(current_user["_id"], activity_data.sop_type, activity_data.task_id), update
+
+def request_client_info(request) -> dict:
+    """Client metadata stored alongside each activity"""
+    return {
+        "ip_address": request.client.host if request.client else None,
+        "user_agent": request.headers.get("user-agent"),
+        "session_id": request.headers.get("x-session-id")
+    }
+
+async def record_activity(current_user: dict, activity_data, client: dict) -> bool:
+    """Upsert one activity in a single round trip; returns True if it was new"""
+    sop_collection = get_sop_activity_collection()
+    query, update = activity_upsert(current_user, activity_data, client)
+    try:
+        result = await sop_collection.update_one(query, update, upsert=True)
+    except DuplicateKeyError:
+        # A concurrent upsert inserted the row first; this one now matches it
+        result = await sop_collection.update_one(query, update, upsert=True)
+    await record_rollups([activity_rollup(query, update)])
+    await bump_versions(user_activity_scope(current_user["_id"]))
+    activity_events.publish_specs([(query, update)])
+    return result.upserted_id is not None
+
+def activity_rollup(query: dict, update: dict):
+    """Daily rollup update matching an activity upsert"""
+    return rollup_upsert(
+        query["user_id"],
+        update["$setOnInsert"]["username"],
+        query["sop_type"],
+        query["task_id"],
+        update["$set"]["completed_at"]
+    )
+
+async def record_activities(current_user: dict, activities: list, client: dict) -> list:
+    """Upsert a batch of activities with one unordered bulk_write.
+
+    Returns one result dict per input item, in input order. Repeated ticks of
+    the same task inside a batch are collapsed into a single write.
+    """
+    sop_collection = get_sop_activity_collection()
+
+    # key -> position in specs; later ticks of the same task win
+    positions = {}
+    specs = []
+    for activity_data in activities:
+        spec = activity_upsert(current_user, activity_data, client)
+        key = (activity_data.sop_type, activity_data.task_id)
+        if key in positions:
+            specs[positions[key]] = spec
+        else:
+            positions[key] = len(specs)
+            specs.append(spec)
+
+    upserted, errors = await bulk_upsert(sop_collection, specs)
+    written = [spec for position, spec in enumerate(specs) if position not in errors]
+    await record_rollups([activity_rollup(*spec) for spec in written])
+    await bump_versions(user_activity_scope(current_user["_id"]))
+    activity_events.publish_specs(written)
+
+    results = []
+    for index, activity_data in enumerate(activities):
+        position = positions[(activity_data.sop_type, activity_data.task_id)]
+        item = {"index": index, "sop_type": activity_data.sop_type, "task_id": activity_data.task_id}
+        if position in errors:
+            item.update(status="error", detail=errors[position])
+        else:
+            item["status"] = "created" if position in upserted else "updated"
+        results.append(item)
+    return results
+
+async def bulk_upsert(sop_collection, specs: list) -> tuple:
+    """Run (filter, update) upserts unordered; returns (upserted positions, {position: error})"""
+    if not specs:
+        return set(), {}
+    ops = [UpdateOne(query, update, upsert=True) for query, update in specs]
+    try:
+        result = await sop_collection.bulk_write(ops, ordered=False)
+        return set(result.upserted_ids), {}
+    except BulkWriteError as e:
+        upserted = {item["index"] for item in e.details.get("upserted", [])}
+        errors = {}
+        retry = []
+        for error in e.details.get("writeErrors", []):
+            if error.get("code") == 11000:
+                # Lost an insert race with a concurrent tick; the retry will match
+                retry.append(error["index"])
+            else:
+                errors[error["index"]] = error.get("errmsg", "Write failed")
+        for position in retry:
+            try:
+                query, update = specs[position]
+                await sop_collection.update_one(query, update, upsert=True)
+            except Exception as retry_error:
+                errors[position] = str(retry_error)
+        return upserted, errors
+
+def activity_filter(sop_type: str = None, user_id=None, days: int = 0) -> dict:
+    """Filter shared by the admin activity listings and reports"""
+    query = {}
+    if sop_type:
+        query["sop_type"] = sop_type
+    if user_id is not None:
+        query["user_id"] = user_id
+    if days > 0:
+        query["completed_at"] = {"$gte": datetime.utcnow() - timedelta(days=days)}
+    return query
+
+def sop_summary_pipeline(sop_type: str = None, days: int = 30,
+                         include_activities: bool = False, activities_limit: int = 50) -> list:
+    """Per-user distinct task counts and last activity, read from daily rollups
+
+    Run against users. The counts come from sop_daily_rollups, so the window
+    is whole UTC days; raw activities are only read when include_activities
+    is set.
+    """
+    pipeline = [{"$project": {"username": 1}}] + rollup_summary_lookup(sop_type=sop_type, days=days)
+    if include_activities:
+        match = activity_filter(sop_type=sop_type, days=days)
+        pipeline.append({"$lookup": {
+            "from": "sop_activities",
+            "localField": "_id",
+            "foreignField": "user_id",
+            "pipeline": [
+                {"$match": match},
+                {"$sort": {"completed_at": -1}},
+                {"$limit": activities_limit},
+                {"$project": ACTIVITY_PROJECTION}
+            ],
+            "as": "activities"
+        }})
+    return pipeline
@@ -0,0 +1,273 @@
+"""Bulk user import (CSV or NDJSON upload) and streamed export.
+
+Rows without an id create users and are validated with UserCreate, so they
+need a password. Rows with an id (as the export writes them) update that
+user with UserUpdate: the password is optional and every other column is
+applied, so an edited export can be imported back. Usernames and emails
+may not repeat inside the file or belong to another user (checked against
+one prefetched lookup). Passwords are hashed across the hashing pool, new
+users go in with one unordered insert_many and updates with one unordered
+bulk_write. Rows that fail at any step are reported by number; the others
+are applied.
+"""
+from fastapi import HTTPException, status
+from pydantic import ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from bson import ObjectId
+from bson.errors import InvalidId
+from database import get_user_collection
+from models import UserCreate, UserUpdate
+from auth import get_password_hashes_async
+from serialization import USER_PROJECTION
+from services.reports import CHUNK_SIZE
+from config import settings
+import csv
+import io
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FIELDS = ("username", "email", "password", "name", "role")
+UPDATE_FIELDS = IMPORT_FIELDS + ("is_active",)
+EXPORT_FIELDS = ("id", "username", "email", "name", "role", "is_active")
+
+def import_format(format: str, filename: str, content_type: str) -> str:
+    """csv or ndjson, from the explicit format, file extension or content type"""
+    if format:
+        return format.lower()
+    name = (filename or "").lower()
+    if name.endswith((".ndjson", ".jsonl")) or "ndjson" in (content_type or ""):
+        return "ndjson"
+    return "csv"
+
+async def read_upload(file, limit: int) -> bytes:
+    """The upload's bytes, read in chunks; 413 once it passes limit"""
+    chunks = []
+    size = 0
+    while chunk := await file.read(CHUNK_SIZE):
+        size += len(chunk)
+        if size > limit:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Import files are limited to {limit} bytes"
+            )
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+def parse_rows(data: bytes, format: str) -> list:
+    """(row number, raw dict or error message) for each data row"""
+    text = data.decode("utf-8-sig")
+    rows = []
+    if format == "ndjson":
+        for number, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                rows.append((number, f"Invalid JSON: {e}"))
+                continue
+            rows.append((number, row if isinstance(row, dict) else "Expected a JSON object"))
+    else:
+        # Row numbers count the header as row 1, as spreadsheets do
+        for number, row in enumerate(csv.DictReader(io.StringIO(text)), start=2):
+            rows.append((number, {key.strip(): value for key, value in row.items() if key and value not in (None, "")}))
+    return rows
+
+def validation_messages(error: ValidationError) -> list:
+    return [f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" for item in error.errors()]
+
+def parse_user(row: dict) -> tuple:
+    """(ObjectId or None, UserCreate or UserUpdate); raises ValueError or ValidationError"""
+    if row.get("id") in (None, ""):
+        return None, UserCreate(**{key: row[key] for key in IMPORT_FIELDS if key in row})
+    try:
+        user_id = ObjectId(str(row["id"]))
+    except InvalidId:
+        raise ValueError("id: not a valid user id")
+    return user_id, UserUpdate(**{key: row[key] for key in UPDATE_FIELDS if key in row})
+
+async def import_users(data: bytes, format: str) -> tuple:
+    """Create or update the valid rows
+
+    Returns (report, created user documents, updated {_id, changed fields}
+    dicts without the password hash).
+    """
+    try:
+        rows = parse_rows(data, format)
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unreadable {format} file: {e}")
+    if len(rows) > settings.USER_IMPORT_MAX_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.USER_IMPORT_MAX_ROWS} rows per import"
+        )
+    errors = []
+    valid = []  # (row number, ObjectId or None, UserCreate or UserUpdate)
+    for number, row in rows:
+        if isinstance(row, str):
+            errors.append({"row": number, "errors": [row]})
+            continue
+        try:
+            valid.append((number, *parse_user(row)))
+        except ValidationError as e:
+            errors.append({"row": number, "username": row.get("username"), "errors": validation_messages(e)})
+        except ValueError as e:
+            errors.append({"row": number, "username": row.get("username"), "errors": [str(e)]})
+
+    # One round trip for every user the rows update and every username/email they claim
+    usernames = {}  # username -> owner _id
+    emails = {}  # email -> owner _id
+    known_ids = set()
+    if valid:
+        async for user in get_user_collection().find(
+            {"$or": [
+                {"_id": {"$in": [user_id for _, user_id, _ in valid if user_id is not None]}},
+                {"username": {"$in": [user.username for _, _, user in valid if user.username]}},
+                {"email": {"$in": [user.email for _, _, user in valid if user.email]}}
+            ]},
+            {"username": 1, "email": 1}
+        ):
+            known_ids.add(user["_id"])
+            usernames[user["username"]] = user["_id"]
+            emails[user["email"]] = user["_id"]
+
+    accepted = []
+    seen_ids = set()
+    for number, user_id, user in valid:
+        problems = []
+        if user_id is not None:
+            if user_id not in known_ids:
+                problems.append("id: user not found")
+            elif user_id in seen_ids:
+                problems.append("id: repeated in this file")
+        if user.username and usernames.get(user.username, user_id) != user_id:
+            problems.append("username: already exists")
+        if user.email and emails.get(user.email, user_id) != user_id:
+            problems.append("email: already exists")
+        if user_id is not None and not user.model_dump(exclude_none=True):
+            problems.append("No fields provided for update")
+        if problems:
+            errors.append({"row": number, "username": user.username, "errors": problems})
+            continue
+        # Later rows repeating a username/email in the file are rejected too;
+        # a new user claims them under a placeholder owner no id can match
+        owner = user_id if user_id is not None else object()
+        seen_ids.add(user_id)
+        if user.username:
+            usernames[user.username] = owner
+        if user.email:
+            emails[user.email] = owner
+        accepted.append((number, user_id, user))
+
+    hashes = iter(await get_password_hashes_async([user.password for _, _, user in accepted if user.password]))
+    new_users = []  # (row number, username, document)
+    changes = []  # (row number, username, _id, {field: value})
+    for number, user_id, user in accepted:
+        password_hash = next(hashes) if user.password else None
+        if user_id is None:
+            new_users.append((number, user.username, {
+                "username": user.username,
+                "name": user.name,
+                "email": user.email,
+                "password": password_hash,
+                "role": user.role,
+                "is_active": True
+            }))
+        else:
+            fields = user.model_dump(exclude_none=True)
+            if password_hash:
+                fields["password"] = password_hash
+            changes.append((number, user.username, user_id, fields))
+
+    def write_errors(error: BulkWriteError, items: list) -> set:
+        failed = set()
+        for write_error in error.details.get("writeErrors", []):
+            failed.add(write_error["index"])
+            number, username = items[write_error["index"]][:2]
+            detail = "already exists" if write_error.get("code") == 11000 else write_error.get("errmsg", "Write failed")
+            errors.append({"row": number, "username": username, "errors": [detail]})
+        return failed
+
+    failed = set()
+    if new_users:
+        try:
+            await get_user_collection().insert_many([document for _, _, document in new_users], ordered=False)
+        except BulkWriteError as e:
+            failed = write_errors(e, new_users)
+    created = [document for index, (_, _, document) in enumerate(new_users) if index not in failed]
+
+    failed = set()
+    if changes:
+        try:
+            await get_user_collection().bulk_write(
+                [UpdateOne({"_id": user_id}, {"$set": fields}) for _, _, user_id, fields in changes],
+                ordered=False
+            )
+        except BulkWriteError as e:
+            failed = write_errors(e, changes)
+    updated = [
+        {"_id": user_id, **{field: value for field, value in fields.items() if field != "password"}}
+        for index, (_, _, user_id, fields) in enumerate(changes) if index not in failed
+    ]
+
+    errors.sort(key=lambda error: error["row"])
+    report = {
+        "received": len(rows),
+        "created": len(created),
+        "updated": len(updated),
+        "failed": len(errors),
+        "user_ids": [str(document["_id"]) for document in created],
+        "updated_ids": [str(user["_id"]) for user in updated],
+        "errors": errors
+    }
+    return report, created, updated
+
+def export_cursor():
+    return get_user_collection().find({}, USER_PROJECTION, batch_size=settings.REPORT_BATCH_SIZE).sort("_id", 1)
+
+def export_row(user: dict) -> dict:
+    return {
+        "id": str(user["_id"]),
+        "username": user["username"],
+        "email": user["email"],
+        "name": user.get("name"),
+        "role": user.get("role", "user"),
+        "is_active": user.get("is_active", True)
+    }
+
+async def export_csv(cursor):
+    """Yield CSV chunks; import_users reads the rows back as updates by id"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    async for user in cursor:
+        writer.writerow(export_row(user))
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+async def export_ndjson(cursor):
+    lines = []
+    size = 0
+    async for user in cursor:
+        line = json.dumps(export_row(user), ensure_ascii=False) + "\n"
+        lines.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield "".join(lines).encode()
+            lines = []
+            size = 0
+    if lines:
+        yield "".join(lines).encode()
+
+# format -> (stream factory, media type)
+USER_EXPORT_FORMATS = {
+    "csv": (export_csv, "text/csv"),
+    "ndjson": (export_ndjson, "application/x-ndjson"),
+}
@@ -0,0 +1,306 @@
+"""In-process search index over username, email and name for the admin console.
+
+Prefix matches come from sorted per-field lists. Substring matches, for
+queries of three characters or more, scan the posting list of the query's
+rarest trigram and confirm each candidate with a substring test.
+
+The worker that takes a write applies it directly and records the
+USERS_SCOPE version it bumped, so it never reprocesses its own writes.
+Other workers' writes are replayed from the user_changes log: when
+USERS_SCOPE moves, the users named in the missing versions are re-read by
+_id and upserted or removed. A full rebuild (in a worker thread) is kept
+for cold start, for gaps larger than MAX_REPLAY versions, and for log
+entries that stay missing (a writer that died between bump and log, or
+entries past the log's TTL).
+"""
+from array import array
+from bisect import bisect_left, insort
+from database import get_user_collection
+from services.versions import USERS_SCOPE, USER_CHANGES_COLLECTION, bump_users_version, current_version, user_changes
+from serialization import USER_PROJECTION, user_dict
+import asyncio
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+GRAM = 3
+SEARCH_FIELDS = ("username", "email", "name")
+# Version gap above which a full rebuild is cheaper than replaying the log
+MAX_REPLAY = 1000
+# How long a missing log entry may hold back replay before forcing a rebuild
+MISSING_CHANGE_SECONDS = 5.0
+# Replaced entries tolerated (as a fraction of live users, and at least
+# COMPACT_MIN) before postings are renumbered without them
+COMPACT_FRACTION = 0.5
+COMPACT_MIN = 1024
+
+def normalize(value) -> str:
+    return (value or "").strip().lower()
+
+def trigrams(text: str) -> set:
+    return {text[i:i + GRAM] for i in range(len(text) - GRAM + 1)}
+
+def sort_keys(entry: tuple):
+    """(list, value) pairs an entry is filed under in the sorted lists"""
+    _, username, email, name = entry
+    if username:
+        yield "username", username
+    if email:
+        yield "email", email
+    if name:
+        yield "name", name
+        for word in name.split()[1:]:
+            yield "word", word
+
+class UserSearchIndex:
+    """Trigram and prefix index of every user's searchable fields
+
+    Results are ranked in tiers: exact username or email, username prefix,
+    email prefix, name prefix, later name word prefix, then any substring.
+    Each tier is read in order from a sorted list (or, for substrings, a
+    posting list) and the search stops as soon as it has `limit` users, so
+    broad queries cost no more than narrow ones.
+    """
+
+    def __init__(self):
+        self._entries = []  # doc number -> (user_id, username, email, name) lowercased; None once replaced
+        self._numbers = {}  # user_id -> current doc number
+        self._grams = {}  # trigram -> array of doc numbers (may hold replaced ones until _compact)
+        self._dead = 0  # replaced entries still referenced by _grams
+        self._sorted = {"username": [], "email": [], "name": [], "word": []}  # sorted [(value, doc number)]
+        self._version = None
+        self._own = set()  # USERS_SCOPE versions this worker bumped and already applied
+        self._missing_since = None
+        self._refresh = None
+        self.rebuilds = 0
+        self.replayed = 0
+        self.last_rebuild_ms = 0.0
+
+    @classmethod
+    def build(cls, users: list) -> "UserSearchIndex":
+        index = cls()
+        for user in users:
+            index._add(user)
+        for values in index._sorted.values():
+            values.sort()
+        return index
+
+    def _add(self, user: dict, keep_sorted: bool = False):
+        number = len(self._entries)
+        entry = (user["_id"], *(normalize(user.get(field)) for field in SEARCH_FIELDS))
+        self._entries.append(entry)
+        self._numbers[user["_id"]] = number
+        for key, value in sort_keys(entry):
+            if keep_sorted:
+                insort(self._sorted[key], (value, number))
+            else:
+                self._sorted[key].append((value, number))
+        grams = self._grams
+        for gram in trigrams("\n".join(entry[1:])):
+            posting = grams.get(gram)
+            if posting is None:
+                posting = grams[gram] = array("I")
+            posting.append(number)
+
+    def _drop(self, user_id):
+        number = self._numbers.pop(user_id, None)
+        if number is None:
+            return None
+        entry = self._entries[number]
+        self._entries[number] = None
+        self._dead += 1
+        for key, value in sort_keys(entry):
+            values = self._sorted[key]
+            position = bisect_left(values, (value, number))
+            if position < len(values) and values[position] == (value, number):
+                del values[position]
+        return entry
+
+    def _compact(self):
+        """Renumber the live entries, dropping replaced ones from every posting
+
+        Runs inline once replaced entries pass COMPACT_FRACTION of the live
+        ones, so its O(users) cost is spread over that many edits.
+        """
+        if self._dead <= max(COMPACT_MIN, len(self._numbers) * COMPACT_FRACTION):
+            return
+        self._adopt(UserSearchIndex.build(
+            {"_id": entry[0], **dict(zip(SEARCH_FIELDS, entry[1:]))}
+            for entry in self._entries if entry is not None
+        ))
+
+    def upsert(self, user: dict):
+        """Apply a created or changed user"""
+        self._drop(user["_id"])
+        self._add(user, keep_sorted=True)
+        self._compact()
+
+    def update(self, user_id, fields: dict):
+        """Apply a partial update to an indexed user"""
+        entry = self._drop(user_id)
+        if entry is None:
+            return
+        user = {"_id": user_id, **dict(zip(SEARCH_FIELDS, entry[1:]))}
+        user.update({field: fields[field] for field in SEARCH_FIELDS if field in fields})
+        self._add(user, keep_sorted=True)
+        self._compact()
+
+    def remove(self, user_id):
+        self._drop(user_id)
+        self._compact()
+
+    def _adopt(self, other: "UserSearchIndex"):
+        self._entries = other._entries
+        self._numbers = other._numbers
+        self._grams = other._grams
+        self._sorted = other._sorted
+        self._dead = other._dead
+
+    async def _rebuild(self, version: int):
+        started = time.perf_counter()
+        users = await get_user_collection().find({}, {field: 1 for field in SEARCH_FIELDS}).to_list(length=None)
+        self._adopt(await asyncio.to_thread(UserSearchIndex.build, users))
+        # Own writes after `version` may predate the read above; replaying
+        # them from the log is harmless, skipping them is not
+        self._own = set()
+        self._version = version
+        self._missing_since = None
+        self.rebuilds += 1
+        self.last_rebuild_ms = (time.perf_counter() - started) * 1000
+        logger.info(f"User search index rebuilt: {len(users)} users in {self.last_rebuild_ms:.0f} ms")
+
+    async def changed(self, user_ids: list, *scopes: str):
+        """Bump USERS_SCOPE for a write this worker has applied to the index"""
+        version = await bump_users_version(user_ids, *scopes)
+        if version is not None and self._version is not None and version > self._version:
+            self._own.add(version)
+
+    async def _replay(self, version: int) -> bool:
+        """Apply logged changes up to version; False when a rebuild is needed
+
+        Stops at the first missing entry (its writer may not have logged it
+        yet) and gives up on it after MISSING_CHANGE_SECONDS.
+        """
+        applied = self._version
+        user_ids = set()
+        for applied, changed_ids in await user_changes(self._version, version):
+            if applied not in self._own:
+                user_ids.update(changed_ids)
+        if user_ids:
+            found = {
+                user["_id"]: user
+                async for user in get_user_collection().find(
+                    {"_id": {"$in": list(user_ids)}}, {field: 1 for field in SEARCH_FIELDS}
+                )
+            }
+            for user_id in user_ids:
+                if user_id in found:
+                    self.upsert(found[user_id])
+                else:
+                    self.remove(user_id)
+            self.replayed += len(user_ids)
+        if applied < version:
+            now = time.monotonic()
+            if self._missing_since is None or applied > self._version:
+                self._missing_since = now
+            elif now - self._missing_since > MISSING_CHANGE_SECONDS:
+                logger.warning(f"User change {applied + 1} missing from {USER_CHANGES_COLLECTION}; rebuilding")
+                return False
+        else:
+            self._missing_since = None
+        self._version = applied
+        self._own = {own for own in self._own if own > applied}
+        return True
+
+    async def refresh(self):
+        """Catch up with USERS_SCOPE; only the first build is awaited
+
+        Small gaps are replayed from the change log. Rebuilds run in the
+        background while searches keep using the current index, so a burst
+        of writes costs one rebuild at a time.
+        """
+        version = await current_version(USERS_SCOPE)
+        if version == self._version:
+            return
+        if self._refresh is not None and not self._refresh.done():
+            if self._version is None:
+                await asyncio.shield(self._refresh)
+            return
+        if self._version is not None and 0 < version - self._version <= MAX_REPLAY:
+            if await self._replay(version):
+                return
+        self._refresh = asyncio.create_task(self._rebuild(version))
+        if self._version is None:
+            await asyncio.shield(self._refresh)
+
+    def _prefixed(self, key: str, query: str, exact: bool = False):
+        """Doc numbers filed under key with a value starting with (or equal to) query"""
+        values = self._sorted[key]
+        position = bisect_left(values, (query, -1))
+        while position < len(values):
+            value, number = values[position]
+            if not (value == query if exact else value.startswith(query)):
+                return
+            yield number
+            position += 1
+
+    def _containing(self, query: str):
+        """Doc numbers with query anywhere in a field, via the rarest trigram"""
+        postings = [self._grams.get(gram) for gram in trigrams(query)]
+        if not all(postings):
+            return
+        for number in min(postings, key=len):
+            entry = self._entries[number]
+            if entry is not None and any(query in value for value in entry[1:]):
+                yield number
+
+    def _tiers(self, query: str):
+        yield self._prefixed("username", query, exact=True)
+        yield self._prefixed("email", query, exact=True)
+        yield self._prefixed("username", query)
+        yield self._prefixed("email", query)
+        yield self._prefixed("name", query)
+        yield self._prefixed("word", query)
+        if len(query) >= GRAM:
+            yield self._containing(query)
+
+    def search_ids(self, query: str, limit: int) -> list:
+        """Ids of the best `limit` matches, best first"""
+        query = normalize(query)
+        found = {}  # doc number -> None, in rank order
+        if query:
+            for tier in self._tiers(query):
+                for number in tier:
+                    found.setdefault(number, None)
+                    if len(found) >= limit:
+                        break
+                if len(found) >= limit:
+                    break
+        return [self._entries[number][0] for number in found]
+
+    async def search(self, query: str, limit: int) -> list:
+        """UserResponse-shaped dicts for the best matches, best first"""
+        await self.refresh()
+        ids = self.search_ids(query, limit)
+        if not ids:
+            return []
+        users = {
+            user["_id"]: user
+            async for user in get_user_collection().find({"_id": {"$in": ids}}, USER_PROJECTION)
+        }
+        return [user_dict(users[user_id]) for user_id in ids if user_id in users]
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self._numbers),
+            "grams": len(self._grams),
+            "replaced": self._dead,
+            "version": self._version,
+            "rebuilds": self.rebuilds,
+            "replayed": self.replayed,
+            "last_rebuild_ms": round(self.last_rebuild_ms, 2)
+        }
+
+# Global user search index
+user_search = UserSearchIndex()
@@ -0,0 +1,116 @@
+"""Change versions behind the ETags of cacheable GET endpoints.
+
+Each scope is a counter document in change_versions, bumped by the write
+paths after they commit. A conditional GET reads one counter by _id and
+answers 304 when the client's If-None-Match still matches, without
+touching the underlying documents.
+
+USERS_SCOPE bumps also append to user_changes, keyed by the new version,
+so the per-worker user search indexes can replay other workers' writes
+instead of rebuilding.
+"""
+from pymongo import UpdateOne, ReturnDocument
+from fastapi import Response
+from database import get_db
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+VERSIONS_COLLECTION = "change_versions"
+USER_CHANGES_COLLECTION = "user_changes"
+
+# Scope for the whole users collection (admin user list)
+USERS_SCOPE = "users"
+
+def user_scope(user_id) -> str:
+    """One user's own document (/profile)"""
+    return f"user:{user_id}"
+
+def user_activity_scope(user_id) -> str:
+    """One user's SOP activities (/sop/activities)"""
+    return f"sop_activities:user:{user_id}"
+
+def get_versions_collection():
+    return get_db()[VERSIONS_COLLECTION]
+
+async def bump_versions(*scopes: str):
+    """Invalidate ETags for scopes; failures are logged, not raised"""
+    if not scopes:
+        return
+    try:
+        await get_versions_collection().bulk_write(
+            [UpdateOne({"_id": scope}, {"$inc": {"version": 1}}, upsert=True) for scope in set(scopes)],
+            ordered=False
+        )
+    except Exception as e:
+        logger.error(f"Change version bump failed for {scopes}: {e}")
+
+async def bump_users_version(user_ids: list, *scopes: str):
+    """Bump USERS_SCOPE (and scopes), logging which users the write touched
+
+    Returns the new USERS_SCOPE version, or None when the bump failed
+    (logged, not raised, like bump_versions).
+    """
+    version = None
+    try:
+        document = await get_versions_collection().find_one_and_update(
+            {"_id": USERS_SCOPE}, {"$inc": {"version": 1}},
+            upsert=True, return_document=ReturnDocument.AFTER
+        )
+        version = document["version"]
+        await get_db()[USER_CHANGES_COLLECTION].insert_one({
+            "_id": version, "user_ids": list(user_ids), "created_at": datetime.utcnow()
+        })
+    except Exception as e:
+        logger.error(f"Users change version bump failed: {e}")
+    await bump_versions(*scopes)
+    return version
+
+async def user_changes(after: int, upto: int) -> list:
+    """Logged (version, user_ids) in (after, upto], oldest first, up to the first missing version"""
+    changes = []
+    async for change in get_db()[USER_CHANGES_COLLECTION].find(
+        {"_id": {"$gt": after, "$lte": upto}}
+    ).sort("_id", 1):
+        if change["_id"] != after + len(changes) + 1:
+            break
+        changes.append((change["_id"], change["user_ids"]))
+    return changes
+
+async def current_version(scope: str) -> int:
+    document = await get_versions_collection().find_one({"_id": scope})
+    return document["version"] if document else 0
+
+def etag(scope: str, version: int) -> str:
+    # The scope names the user, so a shared browser cache cannot hand one
+    # user's 304 to another
+    return f'"{scope}:{version}"'
+
+def etag_matches(if_none_match: str, tag: str) -> bool:
+    """If-None-Match comparison (weak, as RFC 9110 requires for GET)"""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or tag in (
+        candidate[2:] if candidate.startswith("W/") else candidate for candidate in candidates
+    )
+
+CACHE_HEADERS = {"Cache-Control": "private, no-cache"}
+
+async def conditional_get(request, scope: str) -> tuple:
+    """(etag, 304 response or None) for a GET served from scope
+
+    Read the version before the documents: a write landing in between then
+    yields newer data under an older tag, which the next request refreshes.
+    """
+    tag = etag(scope, await current_version(scope))
+    if etag_matches(request.headers.get("if-none-match"), tag):
+        return tag, Response(status_code=304, headers={"ETag": tag, **CACHE_HEADERS})
+    return tag, None
+
+def with_etag(response, tag: str):
+    """Attach the ETag and revalidation headers to a 200 response"""
+    response.headers["ETag"] = tag
+    response.headers.update(CACHE_HEADERS)
+    return response
@@ -0,0 +1,18 @@
+"""Shared fixtures: backend modules on sys.path and an in-memory MongoDB."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mongomock_motor
+import pytest
+
+from database import db_instance
+
+@pytest.fixture
+def db():
+    """Point the global Database at a fresh mongomock client for one test"""
+    db_instance._client = mongomock_motor.AsyncMongoMockClient()
+    db_instance._db = db_instance._client["test"]
+    yield db_instance._db
+    db_instance._forget_client()
@@ -0,0 +1,34 @@
+import asyncio
+
+import httpx
+from bson import ObjectId
+
+from auth import create_access_token
+from services.versions import USERS_SCOPE, current_version
+
+def test_only_real_changes_bump_the_users_version(db):
+    import main
+
+    async def run():
+        await db["users"].insert_many([
+            {"username": "root_admin", "email": "root@example.com", "role": "admin", "is_active": True},
+            {"username": "carol", "email": "carol@example.com", "name": "Carol", "role": "user", "is_active": True},
+        ])
+        carol = await db["users"].find_one({"username": "carol"})
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': 'root_admin'})}"}
+        missing = ObjectId()
+        async with httpx.AsyncClient(app=main.app, base_url="http://test") as client:
+            statuses = [
+                (await client.put(f"/api/v1/admin/users/{missing}", json={"name": "X"}, headers=headers)).status_code,
+                (await client.delete(f"/api/v1/admin/users/{missing}", headers=headers)).status_code,
+                # Same value as stored: matched, not modified
+                (await client.put(f"/api/v1/admin/users/{carol['_id']}", json={"name": "Carol"}, headers=headers)).status_code,
+            ]
+            unchanged = await current_version(USERS_SCOPE)
+            await client.put(f"/api/v1/admin/users/{carol['_id']}", json={"name": "Caroline"}, headers=headers)
+        return statuses, unchanged, await current_version(USERS_SCOPE)
+
+    statuses, unchanged, changed = asyncio.run(run())
+    assert statuses == [404, 404, 200]
+    assert unchanged == 0
+    assert changed == 1
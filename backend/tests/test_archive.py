@@ -0,0 +1,111 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+import services.archive as archive
+from config import settings
+from services.archive import ArchiveManifest, archive_activities, archived_activities
+from services.versions import current_version, user_activity_scope
+
+NOW = datetime(2026, 6, 15, 12, 0, 0)
+
+def activity(user_id, task_id: str, completed_at: datetime) -> dict:
+    return {
+        "user_id": user_id, "username": "u", "sop_type": "gift_sop", "task_id": task_id,
+        "task_description": "d", "completed_at": completed_at, "ip_address": None, "user_agent": None,
+    }
+
+def test_archiving_bumps_the_owners_activity_versions(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "SOP_ARCHIVE_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "SOP_ARCHIVE_HORIZON_DAYS", 30)
+    old_owner, other_owner, recent_owner = ObjectId(), ObjectId(), ObjectId()
+    old = NOW - timedelta(days=60)
+
+    async def run():
+        await db["sop_activities"].insert_many([
+            activity(old_owner, "t1", old),
+            activity(old_owner, "t2", old + timedelta(hours=1)),
+            activity(other_owner, "t1", old),
+            activity(recent_owner, "t1", NOW - timedelta(days=1)),
+        ])
+        result = await archive_activities(NOW)
+        versions = [await current_version(user_activity_scope(owner)) for owner in (old_owner, other_owner, recent_owner)]
+        archived = [row async for row in archived_activities({})]
+        return result, versions, archived, await db["sop_activities"].count_documents({})
+
+    result, versions, archived, remaining = asyncio.run(run())
+    assert sum(result["archived"].values()) == 3
+    assert len(archived) == 3
+    assert remaining == 1
+    assert versions == [1, 1, 0]
+
+def test_recovery_bumps_versions_of_pending_rows(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "SOP_ARCHIVE_DIR", str(tmp_path))
+    owner = ObjectId()
+
+    async def run():
+        result = await db["sop_activities"].insert_one(activity(owner, "t1", NOW - timedelta(days=400)))
+        # A crash after the manifest recorded the batch, before the delete
+        manifest = ArchiveManifest(str(tmp_path))
+        row = await db["sop_activities"].find_one({"_id": result.inserted_id})
+        manifest.pending = {
+            "month": row["completed_at"].strftime("%Y-%m"),
+            "ids": [str(row["_id"])],
+            "completed_at": [row["completed_at"].isoformat()],
+            "users": [str(owner)]
+        }
+        manifest.save()
+        await archive_activities(NOW)
+        return await current_version(user_activity_scope(owner)), await db["sop_activities"].count_documents({})
+
+    version, remaining = asyncio.run(run())
+    assert (version, remaining) == (1, 0)
+
+def test_row_reticked_while_archiving_stays_live_only(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "SOP_ARCHIVE_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "SOP_ARCHIVE_HORIZON_DAYS", 30)
+    owner = ObjectId()
+    old = NOW - timedelta(days=60)
+    finish_batch = archive._finish_batch
+
+    async def retick_then_finish(manifest, collection):
+        # The user ticks t1 again after the frame was written, before the delete
+        await collection.update_one({"task_id": "t1"}, {"$set": {"completed_at": NOW}})
+        return await finish_batch(manifest, collection)
+
+    monkeypatch.setattr(archive, "_finish_batch", retick_then_finish)
+
+    async def run():
+        await db["sop_activities"].insert_many([activity(owner, "t1", old), activity(owner, "t2", old)])
+        result = await archive_activities(NOW)
+        archived = [row["task_id"] async for row in archived_activities({})]
+        live = [row["task_id"] async for row in db["sop_activities"].find({})]
+        return result, archived, live
+
+    result, archived, live = asyncio.run(run())
+    assert sum(result["archived"].values()) == 1
+    assert archived == ["t2"]
+    assert live == ["t1"]
+    manifest = ArchiveManifest.load(str(tmp_path))
+    assert (manifest.pending, [month["rows"] for month in manifest.months.values()]) == (None, [1])
+
+def test_offset_mismatch_is_raised_before_appending(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "SOP_ARCHIVE_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "SOP_ARCHIVE_HORIZON_DAYS", 30)
+    old = NOW - timedelta(days=60)
+    manifest = ArchiveManifest(str(tmp_path))
+    month = manifest.month(old.strftime("%Y-%m"))
+    month["bytes"] = 100  # the file lost its committed frames
+    manifest.save()
+
+    async def run():
+        await db["sop_activities"].insert_one(activity(ObjectId(), "t1", old))
+        with pytest.raises(RuntimeError):
+            await archive_activities(NOW)
+        return await db["sop_activities"].count_documents({})
+
+    assert asyncio.run(run()) == 1
+    assert not os.path.exists(manifest.file_path(month))
@@ -0,0 +1,58 @@
+import asyncio
+
+from bson import ObjectId
+
+from cache import UserCache
+from config import settings
+from services.versions import USERS_SCOPE, bump_users_version, bump_versions
+
+USER = {"_id": ObjectId(), "username": "alice", "is_active": True}
+OTHER = {"_id": ObjectId(), "username": "bob", "is_active": True}
+
+def test_user_change_in_another_worker_clears_the_cache(db, monkeypatch):
+    monkeypatch.setattr(settings, "USER_CACHE_VERSION_CHECK_SECONDS", 0)
+    cache = UserCache(ttl=30, max_size=10)
+
+    async def run():
+        await cache.check_version()
+        cache.set(USER)
+        await cache.check_version()
+        cached = cache.get("alice")
+        # A USERS_SCOPE bump the change log cannot account for clears everything
+        await bump_versions(USERS_SCOPE)
+        await cache.check_version()
+        return cached, cache.get("alice")
+
+    cached, after = asyncio.run(run())
+    assert cached == USER
+    assert after is None
+
+def test_version_is_read_at_most_once_per_interval(db, monkeypatch):
+    monkeypatch.setattr(settings, "USER_CACHE_VERSION_CHECK_SECONDS", 60)
+    cache = UserCache(ttl=30, max_size=10)
+
+    async def run():
+        await cache.check_version()
+        cache.set(USER)
+        await bump_versions(USERS_SCOPE)
+        await cache.check_version()
+        return cache.get("alice")
+
+    assert asyncio.run(run()) == USER
+
+def test_logged_user_changes_drop_only_those_users(db, monkeypatch):
+    monkeypatch.setattr(settings, "USER_CACHE_VERSION_CHECK_SECONDS", 0)
+    cache = UserCache(ttl=30, max_size=10)
+
+    async def run():
+        await cache.check_version()
+        cache.set(USER)
+        cache.set(OTHER)
+        # Another worker deactivates alice and logs it
+        await bump_users_version([USER["_id"]])
+        await cache.check_version()
+        return cache.get("alice"), cache.get("bob")
+
+    alice, bob = asyncio.run(run())
+    assert alice is None
+    assert bob == OTHER
@@ -0,0 +1,74 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from config import settings
+from services.events import ActivityEventBroker
+
+USER_ID = ObjectId()
+
+def activity(task_id: str, completed_at: datetime) -> dict:
+    return {
+        "user_id": USER_ID, "username": "alice", "sop_type": "gift_sop", "task_id": task_id,
+        "task_description": "d", "completed_at": completed_at, "ip_address": None, "user_agent": None,
+    }
+
+def event_ids(frames: list) -> list:
+    return [line[4:] for frame in frames for line in frame.decode().splitlines() if line.startswith("id: ")]
+
+def test_poll_source_feeds_every_worker_the_same_events(db, monkeypatch):
+    monkeypatch.setattr(settings, "SOP_STREAM_SOURCE", "auto")
+    monkeypatch.setattr(settings, "MONGO_REPLICA_SET", None)
+    monkeypatch.setattr(settings, "SERVER_WORKERS", 4)
+    monkeypatch.setattr(settings, "SOP_STREAM_POLL_INTERVAL_MS", 10)
+    monkeypatch.setattr(settings, "SOP_STREAM_POLL_LAG_MS", 2000)
+
+    async def run():
+        # Two workers; the rows are written by neither of them
+        workers = [ActivityEventBroker(), ActivityEventBroker()]
+        subscriptions = [worker.subscribe() for worker in workers]
+        for worker in workers:
+            worker.start()
+        collection = db["sop_activities"]
+        now = datetime.utcnow()
+        await collection.insert_one(activity("t1", now))
+        await asyncio.sleep(0.1)
+        # Committed late: its completed_at is older than the last poll
+        await collection.insert_one(activity("t2", now - timedelta(milliseconds=500)))
+        # Re-ticked: same row, new completed_at
+        await collection.update_one({"task_id": "t1"}, {"$set": {"completed_at": now + timedelta(milliseconds=5)}})
+        await asyncio.sleep(0.1)
+        frames = [await subscription.next_frames(0.01) for subscription in subscriptions]
+        for worker in workers:
+            await worker.stop()
+        return [worker.source for worker in workers], [event_ids(worker_frames) for worker_frames in frames]
+
+    sources, ids = asyncio.run(run())
+    assert sources == ["poll", "poll"]
+    assert len(ids[0]) == 3
+    assert len(set(ids[0])) == 3
+    assert ids[0] == ids[1]
+
+def test_poll_backlog_pages_through_rows_sharing_a_timestamp(db, monkeypatch):
+    monkeypatch.setattr(settings, "SOP_STREAM_SOURCE", "poll")
+    monkeypatch.setattr(settings, "SOP_STREAM_POLL_INTERVAL_MS", 10)
+    monkeypatch.setattr(settings, "SOP_STREAM_POLL_LAG_MS", 2000)
+    monkeypatch.setattr(settings, "SOP_STREAM_POLL_BATCH", 4)
+
+    async def run():
+        worker = ActivityEventBroker()
+        subscription = worker.subscribe()
+        worker.start()
+        await asyncio.sleep(0.05)
+        # One bulk write: more rows than a poll batch, all at one timestamp
+        now = datetime.utcnow()
+        await db["sop_activities"].insert_many([activity(f"t{number}", now) for number in range(10)])
+        await asyncio.sleep(0.1)
+        frames = await subscription.next_frames(0.01)
+        await worker.stop()
+        return event_ids(frames)
+
+    ids = asyncio.run(run())
+    assert len(ids) == 10
+    assert len(set(ids)) == 10
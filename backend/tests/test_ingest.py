@@ -0,0 +1,73 @@
+import asyncio
+
+from bson import ObjectId
+
+import services.ingest as ingest
+from config import settings
+from models import SOPActivityCreate
+from services.ingest import ActivityIngestQueue
+from services.rollups import ROLLUP_COLLECTION
+from services.sop import activity_upsert, bulk_upsert
+from services.versions import current_version, user_activity_scope
+
+USER = {"_id": ObjectId(), "username": "alice"}
+CLIENT = {"ip_address": "10.0.0.1", "user_agent": "pytest", "session_id": None}
+
+def specs(count: int) -> list:
+    return [
+        activity_upsert(USER, SOPActivityCreate(sop_type="gift_sop", task_id=f"t{number}", task_description="d"), CLIENT)
+        for number in range(count)
+    ]
+
+def test_backlog_drains_without_waiting_for_the_interval(db, monkeypatch):
+    monkeypatch.setattr(settings, "SOP_INGEST_QUEUE_ENABLED", True)
+    monkeypatch.setattr(settings, "SOP_INGEST_FLUSH_SIZE", 10)
+    monkeypatch.setattr(settings, "SOP_INGEST_FLUSH_INTERVAL_MS", 60_000)
+    monkeypatch.setattr(settings, "SOP_INGEST_QUEUE_MAX_SIZE", 1000)
+
+    async def run():
+        queue = ActivityIngestQueue()
+        queue.start()
+        queue.enqueue(specs(55))
+        for _ in range(100):
+            if queue.depth < 10:
+                break
+            await asyncio.sleep(0.01)
+        depth, flushes = queue.depth, queue.flushes
+        await queue.drain()
+        return depth, flushes, await db["sop_activities"].count_documents({})
+
+    depth, flushes, count = asyncio.run(run())
+    # Five full batches go out at once; the partial one waits for the interval
+    assert (depth, flushes) == (5, 5)
+    assert count == 55
+
+def test_failed_writes_stay_out_of_rollups_and_versions(db, monkeypatch):
+    monkeypatch.setattr(settings, "SOP_INGEST_FLUSH_SIZE", 10)
+    failing = ObjectId()
+
+    async def fail_one_user(collection, specs):
+        # Every spec for `failing` is rejected by the server
+        errors = {position: "boom" for position, (query, _) in enumerate(specs) if query["user_id"] == failing}
+        await bulk_upsert(collection, [spec for position, spec in enumerate(specs) if position not in errors])
+        return set(), errors
+
+    monkeypatch.setattr(ingest, "bulk_upsert", fail_one_user)
+    other = {"_id": failing, "username": "bob"}
+    ticks = specs(2) + [
+        activity_upsert(other, SOPActivityCreate(sop_type="gift_sop", task_id="t0", task_description="d"), CLIENT)
+        for _ in range(2)
+    ]
+
+    async def run():
+        queue = ActivityIngestQueue()
+        queue.enqueue(ticks)
+        await queue._flush_batch()
+        rollups = await db[ROLLUP_COLLECTION].find({}).to_list(length=None)
+        versions = [await current_version(user_activity_scope(user_id)) for user_id in (USER["_id"], failing)]
+        return queue, rollups, versions
+
+    queue, rollups, versions = asyncio.run(run())
+    assert (queue.written, queue.failed) == (2, 1)
+    assert [(rollup["user_id"], rollup["completions"]) for rollup in rollups] == [(USER["_id"], 2)]
+    assert versions == [1, 0]
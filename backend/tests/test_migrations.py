@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+
+from migrations import create_core_indexes, set_aside_duplicate_users
+
+async def seed(db):
+    await db["users"].insert_many([
+        {"username": "alice", "email": "alice@example.com", "is_active": True},
+        {"username": "alice", "email": "alice2@example.com", "is_active": True},
+        {"username": "bob", "email": "alice@example.com", "is_active": True},
+    ])
+
+def test_duplicates_fail_the_migration_without_touching_users(db):
+    async def run():
+        await seed(db)
+        before = await db["users"].find({}).to_list(length=None)
+        with pytest.raises(RuntimeError) as error:
+            await create_core_indexes(db)
+        return before, await db["users"].find({}).to_list(length=None), str(error.value)
+
+    before, after, message = asyncio.run(run())
+    assert after == before
+    assert "username 'alice'" in message
+    assert "email 'alice@example.com'" in message
+    assert "--set-aside-duplicates" in message
+
+def test_set_aside_lets_the_migration_run(db):
+    async def run():
+        await seed(db)
+        changed = await set_aside_duplicate_users(db["users"])
+        await create_core_indexes(db)
+        users = await db["users"].find({}).sort("_id", 1).to_list(length=None)
+        return changed, users
+
+    changed, users = asyncio.run(run())
+    assert changed == [users[1]["_id"], users[2]["_id"]]
+    assert [user["is_active"] for user in users] == [True, False, False]
+    assert users[1]["username"] == f"alice_{users[1]['_id']}"
+    assert users[2]["email"] == f"alice+{users[2]['_id']}@example.com"
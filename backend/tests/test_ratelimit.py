@@ -0,0 +1,169 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+import ratelimit
+from config import settings
+from ratelimit import LoginRateLimiter, MemoryBucketStore
+
+class Clock:
+    """Stands in for the time module inside ratelimit"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit, "time", clock)
+    return clock
+
+@pytest.fixture
+def limits(monkeypatch):
+    monkeypatch.setattr(settings, "LOGIN_RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(settings, "LOGIN_USERNAME_BURST", 5)
+    monkeypatch.setattr(settings, "LOGIN_USERNAME_PER_MINUTE", 6)
+    monkeypatch.setattr(settings, "LOGIN_IP_BURST", 8)
+    monkeypatch.setattr(settings, "LOGIN_IP_PER_MINUTE", 60)
+
+def attempts(limiter, pairs) -> list:
+    """Reserve (and keep, as a failed login does) each (username, ip); 429s as None"""
+    async def run():
+        results = []
+        for username, ip_address in pairs:
+            try:
+                results.append(await limiter.reserve(username, ip_address))
+            except HTTPException as e:
+                assert e.status_code == 429
+                results.append(None)
+        return results
+    return asyncio.run(run())
+
+def test_burst_then_refuse(clock, limits):
+    limiter = LoginRateLimiter(MemoryBucketStore(100))
+    results = attempts(limiter, [("alice", "10.0.0.1")] * 7)
+    assert [result is not None for result in results] == [True] * 5 + [False] * 2
+
+def test_refill_allows_one_attempt_per_interval(clock, limits):
+    limiter = LoginRateLimiter(MemoryBucketStore(100))
+    attempts(limiter, [("alice", "10.0.0.1")] * 5)
+    clock.now += 9  # 6 per minute: not yet a whole token
+    assert attempts(limiter, [("alice", "10.0.0.1")]) == [None]
+    clock.now += 1
+    assert attempts(limiter, [("alice", "10.0.0.1")])[0] is not None
+    assert attempts(limiter, [("alice", "10.0.0.1")]) == [None]
+
+def test_username_bucket_spans_ips(clock, limits):
+    limiter = LoginRateLimiter(MemoryBucketStore(100))
+    results = attempts(limiter, [("alice", f"10.0.0.{n}") for n in range(6)])
+    assert results[-1] is None
+    # Another user is not affected
+    assert attempts(limiter, [("bob", "10.0.0.99")])[0] is not None
+
+def test_ip_bucket_spans_usernames(clock, limits):
+    limiter = LoginRateLimiter(MemoryBucketStore(100))
+    results = attempts(limiter, [(f"user{n}", "10.0.0.1") for n in range(9)])
+    assert [result is not None for result in results] == [True] * 8 + [False]
+    assert attempts(limiter, [("user0", "10.0.0.2")])[0] is not None
+
+def test_refused_attempt_takes_nothing(clock, limits):
+    limiter = LoginRateLimiter(MemoryBucketStore(100))
+    attempts(limiter, [(f"user{n}", "10.0.0.1") for n in range(8)])
+    # IP bucket is empty: alice is refused without spending her own bucket
+    assert attempts(limiter, [("alice", "10.0.0.1")] * 3) == [None] * 3
+    assert all(attempts(limiter, [("alice", f"10.0.1.{n}") for n in range(5)]))
+
+def test_release_gives_attempts_back(clock, limits):
+    limiter = LoginRateLimiter(MemoryBucketStore(100))
+
+    async def run():
+        for _ in range(20):
+            await limiter.release(await limiter.reserve("alice", "10.0.0.1"))
+
+    asyncio.run(run())
+    assert all(attempts(limiter, [("alice", "10.0.0.1")] * 5))
+
+def test_retry_after_with_zero_refill_rate(clock, limits, monkeypatch):
+    monkeypatch.setattr(settings, "LOGIN_USERNAME_PER_MINUTE", 0)
+    limiter = LoginRateLimiter(MemoryBucketStore(100))
+    attempts(limiter, [("alice", "10.0.0.1")] * 5)
+    with pytest.raises(HTTPException) as refused:
+        asyncio.run(limiter.reserve("alice", "10.0.0.1"))
+    assert int(refused.value.headers["Retry-After"]) >= 1
+
+def test_concurrent_flood_reaches_bcrypt_at_most_burst_times(db, limits, monkeypatch):
+    import main
+    from routes import user as user_routes
+
+    monkeypatch.setattr(ratelimit.login_limiter, "store", MemoryBucketStore(100))
+    verified = []
+
+    async def slow_wrong_password(password, hashed):
+        verified.append(password)
+        await asyncio.sleep(0.05)  # bcrypt
+        return False
+
+    monkeypatch.setattr(user_routes, "verify_password_async", slow_wrong_password)
+
+    async def run():
+        await db["users"].insert_one({"username": "alice", "email": "a@x.com", "password": "hash"})
+        async with httpx.AsyncClient(app=main.app, base_url="http://test") as client:
+            responses = await asyncio.gather(*(
+                client.post("/api/v1/login", json={"username": "alice", "password": "wrong1"})
+                for _ in range(60)
+            ))
+        return sorted(response.status_code for response in responses)
+
+    statuses = asyncio.run(run())
+    assert len(verified) == 5
+    assert statuses == [401] * 5 + [429] * 55
+
+def test_clients_behind_a_trusted_proxy_get_their_own_ip_bucket(db, limits, monkeypatch):
+    import main
+    from routes import user as user_routes
+    from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
+
+    monkeypatch.setattr(settings, "FORWARDED_ALLOW_IPS", "172.28.0.10")
+    monkeypatch.setattr(settings, "LOGIN_IP_BURST", 3)
+    monkeypatch.setattr(ratelimit.login_limiter, "store", MemoryBucketStore(100))
+
+    async def wrong_password(password, hashed):
+        return False
+
+    monkeypatch.setattr(user_routes, "verify_password_async", wrong_password)
+    # What gunicorn/uvicorn wrap the app in with forwarded_allow_ips
+    app = ProxyHeadersMiddleware(main.app, trusted_hosts=settings.FORWARDED_ALLOW_IPS)
+
+    async def logins(peer: str, client_ip: str, count: int) -> list:
+        transport = httpx.ASGITransport(app=app, client=(peer, 40000))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return [
+                (await client.post(
+                    "/api/v1/login",
+                    json={"username": f"user{n}", "password": "wrong1"},
+                    headers={"X-Forwarded-For": client_ip.format(n=n)}
+                )).status_code
+                for n in range(count)
+            ]
+
+    async def run():
+        return (
+            await logins("172.28.0.10", "203.0.113.5", 4),
+            await logins("172.28.0.10", "203.0.113.6", 1),
+            # An untrusted peer's header is ignored: a new forwarded address
+            # per request still lands in the peer's own bucket
+            await logins("198.51.100.7", "203.0.113.{n}", 4),
+        )
+
+    first, second, untrusted = asyncio.run(run())
+    assert first == [401, 401, 401, 429]
+    assert second == [401]
+    assert untrusted == [401, 401, 401, 429]
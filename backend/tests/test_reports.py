@@ -0,0 +1,59 @@
+import asyncio
+import tracemalloc
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from config import settings
+from services.reports import EXPORT_FORMATS, gzip_stream
+
+USER_ID = ObjectId()
+COMPLETED_AT = datetime(2026, 1, 1, 12, 0, 0)
+
+async def rows(count: int):
+    """Report rows made on demand, like a cursor fetching batches"""
+    for number in range(count):
+        yield {
+            "user_id": USER_ID,
+            "username": f"user{number % 500}",
+            "sop_type": "gift_sop",
+            "task_id": f"task{number}",
+            "task_description": "Wrap the gift and attach the card",
+            "completed_at": COMPLETED_AT,
+            "ip_address": "10.0.0.1",
+            "user_agent": "Mozilla/5.0",
+        }
+
+def peak_bytes(stream) -> int:
+    """Peak traced memory while draining a stream whose chunks are discarded"""
+    async def drain():
+        async for _ in stream:
+            pass
+
+    tracemalloc.start()
+    try:
+        asyncio.run(drain())
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+@pytest.mark.parametrize("format", sorted(EXPORT_FORMATS))
+def test_export_memory_is_flat_in_row_count(format, monkeypatch):
+    monkeypatch.setattr(settings, "REPORT_PARQUET_ROW_GROUP_SIZE", 5000)
+    stream_format = EXPORT_FORMATS[format][0]
+    peak_bytes(stream_format(rows(100)))  # imports and first-use caches
+
+    small = peak_bytes(stream_format(rows(10_000)))
+    large = peak_bytes(stream_format(rows(100_000)))
+
+    # 10x the rows must not mean more than a small constant more memory
+    assert large < small * 1.5 + 256 * 1024, (format, small, large)
+
+def test_gzip_export_memory_is_flat_in_row_count():
+    stream_format = EXPORT_FORMATS["csv"][0]
+
+    small = peak_bytes(gzip_stream(stream_format(rows(10_000))))
+    large = peak_bytes(gzip_stream(stream_format(rows(100_000))))
+
+    assert large < small * 1.5 + 256 * 1024, (small, large)
@@ -0,0 +1,49 @@
+import asyncio
+
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from migrations import unique_activity_key
+from models import SOPActivityCreate
+from services import sop
+
+USER = {"_id": ObjectId(), "username": "alice"}
+CLIENT = {"ip_address": "10.0.0.1", "user_agent": "pytest", "session_id": None}
+TICK = SOPActivityCreate(sop_type="gift_sop", task_id="t1", task_description="Wrap gift")
+
+def test_parallel_ticks_leave_one_document(db):
+    async def run():
+        await unique_activity_key(db)
+        created = await asyncio.gather(*(sop.record_activity(USER, TICK, CLIENT) for _ in range(200)))
+        return created, await db["sop_activities"].count_documents({})
+
+    created, count = asyncio.run(run())
+    assert count == 1
+    assert created.count(True) == 1
+
+def test_duplicate_key_race_retries_as_update(db, monkeypatch):
+    collection = db["sop_activities"]
+    update_one = collection.update_one
+    calls = []
+
+    async def racing_update_one(query, update, upsert=False):
+        calls.append(query)
+        if len(calls) == 1:
+            # Another request inserts the row between our match and insert
+            await collection.insert_one({**query, "completed_at": None})
+            raise DuplicateKeyError("E11000 duplicate key error")
+        return await update_one(query, update, upsert=upsert)
+
+    monkeypatch.setattr(collection, "update_one", racing_update_one)
+    monkeypatch.setattr(sop, "get_sop_activity_collection", lambda: collection)
+
+    async def run():
+        await unique_activity_key(db)
+        created = await sop.record_activity(USER, TICK, CLIENT)
+        return created, await collection.find({}).to_list(length=None)
+
+    created, documents = asyncio.run(run())
+    assert created is False
+    assert len(calls) == 2
+    assert len(documents) == 1
+    assert documents[0]["completed_at"] is not None
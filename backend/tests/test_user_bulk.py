@@ -0,0 +1,92 @@
+import asyncio
+import io
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+import services.user_bulk as user_bulk
+from database import get_user_collection
+from services.user_bulk import export_csv, export_cursor, export_ndjson, import_users, read_upload
+
+@pytest.fixture(autouse=True)
+def fake_hashes(monkeypatch):
+    async def hashes(passwords):
+        return [f"hash:{password}" for password in passwords]
+
+    monkeypatch.setattr(user_bulk, "get_password_hashes_async", hashes)
+
+async def export(stream) -> bytes:
+    return b"".join([chunk async for chunk in stream(export_cursor())])
+
+async def seed():
+    await get_user_collection().insert_many([
+        {"username": "alice", "email": "alice@example.com", "name": "Alice", "password": "x", "role": "user", "is_active": True},
+        {"username": "bob", "email": "bob@example.com", "name": None, "password": "y", "role": "admin", "is_active": False},
+    ])
+
+@pytest.mark.parametrize("format, stream", [("csv", export_csv), ("ndjson", export_ndjson)])
+def test_export_imports_back_as_updates(db, format, stream):
+    async def run():
+        await seed()
+        before = await get_user_collection().find({}).sort("_id", 1).to_list(length=None)
+        report, created, updated = await import_users(await export(stream), format)
+        after = await get_user_collection().find({}).sort("_id", 1).to_list(length=None)
+        return report, created, updated, before, after
+
+    report, created, updated, before, after = asyncio.run(run())
+    assert report["errors"] == []
+    assert (report["created"], report["updated"]) == (0, 2)
+    assert created == []
+    assert after == before
+
+def test_edited_export_updates_and_reports_bad_rows(db):
+    async def run():
+        await seed()
+        data = (await export(export_csv)).decode()
+        data = data.replace("Alice,user,True", "Alice Smith,user,False")
+        data += ",carol,carol@example.com,,,\n"  # new user without a password
+        data += ",dave,dave@example.com,Dave,,\n"
+        data += "000000000000000000000000,erin,erin@example.com,,user,True\n"
+        report, created, updated = await import_users(data.encode(), "csv")
+        alice = await get_user_collection().find_one({"username": "alice"})
+        return report, alice
+
+    report, alice = asyncio.run(run())
+    assert (report["created"], report["updated"], report["failed"]) == (0, 2, 3)
+    assert [error["errors"][0] for error in report["errors"]] == [
+        "password: Field required",
+        "password: Field required",
+        "id: user not found",
+    ]
+    assert (alice["name"], alice["is_active"], alice["password"]) == ("Alice Smith", False, "x")
+
+def test_new_rows_and_password_changes_are_hashed(db):
+    async def run():
+        await seed()
+        alice = await get_user_collection().find_one({"username": "alice"})
+        data = (
+            "id,username,email,password\n"
+            f"{alice['_id']},alice,alice@example.com,newpass1\n"
+            ",carol,carol@example.com,secret1\n"
+            ",bob2,bob@example.com,secret1\n"
+        )
+        report, created, updated = await import_users(data.encode(), "csv")
+        users = {user["username"]: user async for user in get_user_collection().find({})}
+        return report, created, updated, users
+
+    report, created, updated, users = asyncio.run(run())
+    assert (report["created"], report["updated"], report["failed"]) == (1, 1, 1)
+    assert report["errors"][0]["errors"] == ["email: already exists"]
+    assert users["alice"]["password"] == "hash:newpass1"
+    assert users["carol"]["password"] == "hash:secret1"
+    assert "password" not in updated[0]
+    assert created[0]["username"] == "carol"
+
+def test_upload_over_the_byte_limit_is_rejected():
+    async def run(size, limit):
+        return await read_upload(UploadFile(io.BytesIO(b"x" * size)), limit)
+
+    assert len(asyncio.run(run(100_000, 100_000))) == 100_000
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(run(100_001, 100_000))
+    assert error.value.status_code == 413
@@ -0,0 +1,94 @@
+import asyncio
+
+from bson import ObjectId
+
+import services.user_search as user_search_module
+from database import get_user_collection
+from services.user_search import UserSearchIndex
+from services.versions import USERS_SCOPE, bump_versions
+
+async def create_user(worker: UserSearchIndex, username: str) -> dict:
+    """A write taken by `worker`, the way the register/admin routes apply it"""
+    user = {"username": username, "email": f"{username}@example.com", "name": username.title()}
+    result = await get_user_collection().insert_one(user)
+    await worker.changed([result.inserted_id])
+    worker.upsert(user)
+    return user
+
+def test_other_workers_replay_writes_without_rebuilding(db):
+    first, second = UserSearchIndex(), UserSearchIndex()
+
+    async def run():
+        await first.refresh()
+        await second.refresh()
+        alice = await create_user(first, "alice")
+        await create_user(first, "bob")
+        await first.refresh()
+        await second.refresh()
+        found = second.search_ids("alice", 10)
+        await get_user_collection().delete_one({"_id": alice["_id"]})
+        await first.changed([alice["_id"]])
+        first.remove(alice["_id"])
+        await first.refresh()
+        await second.refresh()
+        return alice, found, second.search_ids("alice", 10)
+
+    alice, found, after_delete = asyncio.run(run())
+    assert found == [alice["_id"]]
+    assert after_delete == []
+    assert (first.rebuilds, second.rebuilds) == (1, 1)
+    # The writer skips its own versions; the other worker replays all three
+    assert first.replayed == 0
+    assert second.replayed == 3
+    assert first.stats()["version"] == second.stats()["version"] == 3
+
+def test_large_gap_rebuilds(db, monkeypatch):
+    monkeypatch.setattr(user_search_module, "MAX_REPLAY", 2)
+    first, second = UserSearchIndex(), UserSearchIndex()
+
+    async def run():
+        await second.refresh()
+        for username in ("alice", "bob", "carol"):
+            await create_user(first, username)
+        await second.refresh()
+        await second._refresh
+        return second.search_ids("carol", 10)
+
+    found = asyncio.run(run())
+    assert len(found) == 1
+    assert second.rebuilds == 2
+    assert second.replayed == 0
+
+def test_missing_log_entry_waits_then_rebuilds(db, monkeypatch):
+    worker = UserSearchIndex()
+
+    async def run():
+        await worker.refresh()
+        # A bump whose writer never logged it
+        await bump_versions(USERS_SCOPE)
+        await get_user_collection().insert_one({"_id": ObjectId(), "username": "dave"})
+        await worker.refresh()
+        waited = (worker.rebuilds, worker.search_ids("dave", 10))
+        monkeypatch.setattr(user_search_module, "MISSING_CHANGE_SECONDS", 0)
+        await asyncio.sleep(0.01)
+        await worker.refresh()
+        await worker._refresh
+        return waited, worker.search_ids("dave", 10)
+
+    (rebuilds, found_while_waiting), found = asyncio.run(run())
+    assert (rebuilds, found_while_waiting) == (1, [])
+    assert len(found) == 1
+    assert worker.rebuilds == 2
+
+def test_repeated_edits_keep_postings_bounded(monkeypatch):
+    monkeypatch.setattr(user_search_module, "COMPACT_MIN", 16)
+    users = [{"_id": ObjectId(), "username": f"user{n}", "email": f"user{n}@example.com"} for n in range(20)]
+    index = UserSearchIndex.build(users)
+    edited = users[0]["_id"]
+    for n in range(5000):
+        index.update(edited, {"name": f"Edit {n % 7}"})
+
+    assert len(index._entries) <= 20 + 16 + 1
+    assert max(len(posting) for posting in index._grams.values()) <= 20 + 16 + 1
+    assert index.search_ids(f"edit {4999 % 7}", 10) == [edited]
+    assert index.search_ids("user7@", 10) == [users[7]["_id"]]
@@ -6,6 +6,13 @@ class ApiClient {
         const port = hostname === 'localhost' || hostname === '127.0.0.1' ? '8000' : '8000';
         this.baseURL = `${protocol}//${hostname}:${port}/api/v1`;
         this.token = localStorage.getItem('access_token');
+
+        // Pending SOP ticks, flushed together to /sop/activities:batch
+        this.sopQueue = [];
+        this.sopFlushTimer = null;
+        this.sopFlushDelay = 300;
+        this.sopBatchSize = 50;
+        window.addEventListener('pagehide', () => this.flushSOPActivities(true));
     }
 
     setToken(token) {
@@ -98,7 +105,12 @@ class ApiClient {
 
     // Admin methods
     async getUsers() {
-        return await this.request('/admin/users');
+        // unbounded=true keeps the legacy full list until the UI pages through results
+        return await this.request('/admin/users?unbounded=true');
+    }
+
+    async searchUsers(query, limit = 20) {
+        return await this.request(`/admin/users/search?q=${encodeURIComponent(query)}&limit=${limit}`);
     }
 
     async createUser(userData) {
@@ -125,6 +137,38 @@ class ApiClient {
         return await this.request(`/admin/users/${userId}`);
     }
 
+    async importUsers(file) {
+        const formData = new FormData();
+        formData.append('file', file);
+        const headers = this.getHeaders();
+        delete headers['Content-Type']; // Let browser set the multipart boundary
+        return await this.request('/admin/users/import', {
+            method: 'POST',
+            headers,
+            body: formData,
+        });
+    }
+
+    async exportUsers(format = 'csv') {
+        const response = await fetch(`${this.baseURL}/admin/users/export?format=${format}`, {
+            headers: this.getHeaders(),
+        });
+        
+        if (!response.ok) {
+            throw new Error('Failed to export users');
+        }
+        
+        const blob = await response.blob();
+        const downloadUrl = window.URL.createObjectURL(blob);
+        const a = document.createElement('a');
+        a.href = downloadUrl;
+        a.download = `users_${new Date().toISOString().slice(0, 10)}.${format}`;
+        document.body.appendChild(a);
+        a.click();
+        document.body.removeChild(a);
+        window.URL.revokeObjectURL(downloadUrl);
+    }
+
     logout() {
         this.setToken(null);
         localStorage.removeItem('user');
@@ -141,25 +185,61 @@ class ApiClient {
     }
 
     // SOP Activity methods
-    async logSOPActivity(sopType, taskId, taskDescription) {
-        return await this.request('/sop/activity', {
-            method: 'POST',
-            body: JSON.stringify({
-                sop_type: sopType,
-                task_id: taskId,
-                task_description: taskDescription
-            }),
+    logSOPActivity(sopType, taskId, taskDescription) {
+        // Queued and sent in debounced batches; resolves with this item's result
+        return new Promise((resolve, reject) => {
+            this.sopQueue.push({
+                activity: {
+                    sop_type: sopType,
+                    task_id: taskId,
+                    task_description: taskDescription
+                },
+                resolve,
+                reject,
+            });
+
+            if (this.sopQueue.length >= this.sopBatchSize) {
+                this.flushSOPActivities();
+            } else {
+                clearTimeout(this.sopFlushTimer);
+                this.sopFlushTimer = setTimeout(() => this.flushSOPActivities(), this.sopFlushDelay);
+            }
         });
     }
 
+    async flushSOPActivities(keepalive = false) {
+        clearTimeout(this.sopFlushTimer);
+        this.sopFlushTimer = null;
+        const pending = this.sopQueue.splice(0, this.sopQueue.length);
+        if (pending.length === 0) return;
+
+        try {
+            const response = await this.request('/sop/activities:batch', {
+                method: 'POST',
+                body: JSON.stringify(pending.map(item => item.activity)),
+                keepalive,
+            });
+            pending.forEach((item, index) => {
+                const result = response.results[index];
+                if (result.status === 'error') {
+                    item.reject(new Error(result.detail || 'Failed to log SOP activity'));
+                } else {
+                    item.resolve(result);
+                }
+            });
+        } catch (error) {
+            pending.forEach(item => item.reject(error));
+        }
+    }
+
     async getUserSOPActivities(sopType = null) {
-        const endpoint = sopType ? `/sop/activities?sop_type=${sopType}` : '/sop/activities';
+        const endpoint = sopType ? `/sop/activities?unbounded=true&sop_type=${sopType}` : '/sop/activities?unbounded=true';
         return await this.request(endpoint);
     }
 
     // Admin SOP methods
     async getAllSOPActivities(sopType = null, userId = null, days = 30) {
-        let endpoint = `/admin/sop/activities?days=${days}`;
+        let endpoint = `/admin/sop/activities?unbounded=true&days=${days}`;
         if (sopType) endpoint += `&sop_type=${sopType}`;
         if (userId) endpoint += `&user_id=${userId}`;
         return await this.request(endpoint);
@@ -183,7 +263,7 @@ class ApiClient {
         const downloadUrl = window.URL.createObjectURL(blob);
         const a = document.createElement('a');
         a.href = downloadUrl;
-        a.download = `sop_report_${new Date().toISOString().slice(0, 10)}.csv`;
+        a.download = `sop_report_${new Date().toISOString().slice(0, 10)}.${format}`;
         document.body.appendChild(a);
         a.click();
         document.body.removeChild(a);
@@ -195,6 +275,68 @@ class ApiClient {
         if (sopType) endpoint += `&sop_type=${sopType}`;
         return await this.request(endpoint);
     }
+
+    // Live SOP activity feed. Server-Sent Events read through fetch, since
+    // EventSource cannot send the Authorization header; reconnects resume
+    // from the last event id. Returns a function that closes the stream.
+    streamSOPActivities(onEvent, sopType = null) {
+        const controller = new AbortController();
+        let lastEventId = null;
+        let retryDelay = 3000;
+
+        const dispatch = (block) => {
+            let event = 'message';
+            let data = '';
+            for (const line of block.split('\n')) {
+                if (line.startsWith('id: ')) lastEventId = line.slice(4);
+                else if (line.startsWith('event: ')) event = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+                else if (line.startsWith('retry: ')) retryDelay = parseInt(line.slice(7));
+            }
+            if (data) onEvent(event, JSON.parse(data));
+        };
+
+        const connect = async () => {
+            while (!controller.signal.aborted) {
+                try {
+                    const headers = this.getHeaders();
+                    if (lastEventId) headers['Last-Event-ID'] = lastEventId;
+                    let endpoint = '/admin/sop/stream';
+                    if (sopType) endpoint += `?sop_type=${sopType}`;
+                    const response = await fetch(`${this.baseURL}${endpoint}`, { headers, signal: controller.signal });
+
+                    if (response.status === 401) {
+                        this.setToken(null);
+                        window.location.href = '/index.html';
+                        return;
+                    }
+                    if (!response.ok) {
+                        throw new Error(`Activity stream failed: ${response.status}`);
+                    }
+
+                    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+                    let buffer = '';
+                    while (true) {
+                        const { value, done } = await reader.read();
+                        if (done) break;
+                        buffer += value;
+                        let boundary;
+                        while ((boundary = buffer.indexOf('\n\n')) >= 0) {
+                            dispatch(buffer.slice(0, boundary));
+                            buffer = buffer.slice(boundary + 2);
+                        }
+                    }
+                } catch (error) {
+                    if (controller.signal.aborted) return;
+                    console.error('Activity stream error:', error);
+                }
+                await new Promise(resolve => setTimeout(resolve, retryDelay));
+            }
+        };
+
+        connect();
+        return () => controller.abort();
+    }
 }
 
 // Global API client instance